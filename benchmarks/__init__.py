@@ -0,0 +1 @@
+"""Benchmarks for QuAlg, not part of the installed package."""
@@ -0,0 +1,96 @@
+"""
+Runs the benchmarks and compares the results with a baseline.
+
+Run from the root of the repository as (or use `make bench`)::
+
+    python3 -m benchmarks [--save] [--baseline PATH] [--threshold FRACTION] [--filter SUBSTRING]
+
+The results are stored as JSON, mapping the name of each case (with its size) to the time in seconds.
+A case is reported as a regression if it is slower than the baseline by more than the threshold
+(relative), in which case the exit code is non-zero.
+"""
+import sys
+import json
+import timeit
+import argparse
+import platform
+
+from benchmarks.cases import CASES
+
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+
+def run_case(setup, size, min_time=0.2, repeat=5):
+    """Times a case, returning the best time in seconds per call."""
+    timer = timeit.Timer(setup(size))
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(name_filter=None, min_time=0.2, repeat=5):
+    """Runs all (or filtered) cases and returns a dictionary from names to times."""
+    results = {}
+    for name, (setup, sizes) in CASES.items():
+        for size in sizes:
+            key = f"{name}[{size}]"
+            if name_filter is not None and name_filter not in key:
+                continue
+            results[key] = run_case(setup, size, min_time=min_time, repeat=repeat)
+            print(f"{key:<50}{results[key]:>14.6f} s", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compares results with a baseline and returns the names of the regressed cases."""
+    regressions = []
+    print(f"\n{'case':<50}{'baseline (s)':>14}{'current (s)':>14}{'ratio':>10}")
+    for key, time in results.items():
+        if key not in baseline:
+            print(f"{key:<50}{'-':>14}{time:>14.6f}{'-':>10}")
+            continue
+        ratio = time / baseline[key]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<50}{baseline[key]:>14.6f}{time:>14.6f}{ratio:>10.2f}{flag}")
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Runs the QuAlg benchmarks.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="path to the JSON baseline")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slow-down reported as a regression (default: 0.25)")
+    parser.add_argument("--filter", default=None, help="only run cases containing this substring")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum time per measurement (default: 0.2)")
+    parser.add_argument("--repeat", type=int, default=5, help="number of measurements per case (default: 5)")
+    args = parser.parse_args(args)
+
+    results = run(name_filter=args.filter, min_time=args.min_time, repeat=args.repeat)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print(f"\nStored baseline in {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        print(f"\nNo baseline found at {args.baseline}, use --save to create one")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if len(regressions) > 0:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+The benchmark cases.
+
+Each case is a function taking a size and returning a function (without arguments) to be timed.
+Cases are registered with the sizes they should be run for using :func:`~.case`.
+"""
+import os
+import runpy
+from collections import OrderedDict
+
+import numpy as np
+
+from qualg.scalars import SingleVarFunctionScalar, DeltaFunction, SumOfScalars, Variable
+from qualg.states import State
+from qualg.q_state import BaseQubitState
+from qualg.fock_state import BaseFockState, FockOp
+from qualg.operators import Operator, BaseOperator, outer_product, sandwich
+from qualg.toolbox import simplify, replace_var
+from qualg.integrate import integrate
+from qualg.measure import measure, POVM
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+CASES = OrderedDict()
+
+
+def case(*sizes):
+    """Registers a benchmark case to be run for the given sizes."""
+    def decorator(setup):
+        CASES[setup.__name__] = (setup, sizes)
+        return setup
+    return decorator
+
+
+def _qubit_base_states(num_qubits):
+    return [BaseQubitState(format(i, f"0{num_qubits}b")) for i in range(2 ** num_qubits)]
+
+
+def _qubit_state(num_qubits, symbolic=False, seed=0):
+    base_states = _qubit_base_states(num_qubits)
+    if symbolic:
+        scalars = [Variable(f"a{i}") for i in range(len(base_states))]
+    else:
+        scalars = [float(x) for x in np.random.default_rng(seed).normal(size=len(base_states))]
+    return State(base_states, scalars)
+
+
+def _qubit_operator(num_qubits, terms_per_row, symbolic=False, seed=0):
+    rng = np.random.default_rng(seed)
+    base_states = _qubit_base_states(num_qubits)
+    base_ops = []
+    scalars = []
+    for i, left in enumerate(base_states):
+        for j in rng.choice(len(base_states), size=terms_per_row, replace=False):
+            base_ops.append(BaseOperator(left, base_states[j]))
+            scalars.append(Variable(f"u{i}_{j}") if symbolic else complex(rng.normal(), rng.normal()))
+    return Operator(base_ops, scalars)
+
+
+def _fock_state(num_photons, modes="ab", variable="w"):
+    """Sum over which mode each photon is in, with a function of the variable of the photon as amplitude."""
+    state = BaseFockState([]).to_state()
+    for i in range(num_photons):
+        photon = sum((SingleVarFunctionScalar(f"f{mode}", f"{variable}{i}") *
+                      BaseFockState([FockOp(mode, f"{variable}{i}")]).to_state() for mode in modes), State())
+        state = state @ photon
+    return state
+
+
+@case(4, 8)
+def state_add_qubit(num_qubits):
+    s1 = _qubit_state(num_qubits, symbolic=True)
+    s2 = _qubit_state(num_qubits, seed=1)
+    return lambda: s1 + s2
+
+
+@case(2, 4)
+def state_add_fock(num_photons):
+    s1 = _fock_state(num_photons)
+    s2 = _fock_state(num_photons, variable="v")
+    return lambda: s1 + s2
+
+
+@case(4, 8)
+def state_tensor_product_qubit(num_qubits):
+    s = _qubit_state(num_qubits // 2)
+    return lambda: s @ s
+
+
+@case(4, 8)
+def state_tensor_product_qubit_symbolic(num_qubits):
+    s = _qubit_state(num_qubits // 2, symbolic=True)
+    return lambda: s @ s
+
+
+@case(2, 4)
+def state_tensor_product_fock(num_photons):
+    s = _fock_state(num_photons // 2)
+    return lambda: s @ s
+
+
+@case(4, 8)
+def state_inner_product_qubit(num_qubits):
+    s1 = _qubit_state(num_qubits)
+    s2 = _qubit_state(num_qubits, seed=1)
+    return lambda: s1.inner_product(s2)
+
+
+@case(4, 8)
+def state_inner_product_qubit_symbolic(num_qubits):
+    s = _qubit_state(num_qubits, symbolic=True)
+    return lambda: s.inner_product(s)
+
+
+@case(2, 3)
+def state_inner_product_fock(num_photons):
+    s = _fock_state(num_photons)
+    return lambda: integrate(s.inner_product(s))
+
+
+@case(3, 6)
+def operator_product_qubit(num_qubits):
+    op1 = _qubit_operator(num_qubits, 4)
+    op2 = _qubit_operator(num_qubits, 4, seed=1)
+    return lambda: op1 * op2
+
+
+@case(3, 5)
+def operator_product_qubit_symbolic(num_qubits):
+    op1 = _qubit_operator(num_qubits, 2, symbolic=True)
+    op2 = _qubit_operator(num_qubits, 2, symbolic=True, seed=1)
+    return lambda: op1 * op2
+
+
+@case(1, 2)
+def operator_product_fock(num_photons):
+    s = _fock_state(num_photons)
+    op = outer_product(s, s)
+    return lambda: op * replace_var(op)
+
+
+@case(100, 1000)
+def simplify_sum(num_terms):
+    a = Variable("a")
+    terms = [SingleVarFunctionScalar(f"f{i % (num_terms // 4)}", "x") * a * Variable(f"b{i % 3}").conjugate()
+             for i in range(num_terms)]
+    scalar = SumOfScalars(terms)
+    return lambda: simplify(scalar)
+
+
+@case(4, 16)
+def integrate_deltas(num_variables):
+    factors = [SingleVarFunctionScalar("f", "x0")]
+    for i in range(num_variables - 1):
+        factors.append(DeltaFunction(f"x{i}", f"x{i + 1}"))
+    factors.append(SingleVarFunctionScalar("g", f"x{num_variables - 1}").conjugate())
+    scalar = factors[0]
+    for factor in factors[1:]:
+        scalar = scalar * factor
+    return lambda: integrate(scalar)
+
+
+@case(2, 6)
+def measure_qubits(num_qubits):
+    state = _qubit_state(num_qubits)
+    state = state * (1 / np.sqrt(state.inner_product(state)))
+    povm = POVM({i: outer_product(bs.to_state(), bs.to_state()) for i, bs in enumerate(_qubit_base_states(num_qubits))})
+    return lambda: measure(state, povm)
+
+
+@case(1, 2)
+def ll_povm(num_photons):
+    """The LL-POVM elements from `examples/example_ll_povm.py` with the given total number of photons."""
+    members = runpy.run_path(os.path.join(EXAMPLES_DIR, "example_ll_povm.py"))
+    indices = [(i, num_photons - i) for i in range(num_photons + 1)]
+    u = members["construct_beam_splitter"]()
+    projectors = [members["construct_projector"](*index) for index in indices]
+
+    def compute_povm():
+        for p in projectors:
+            simplify(u.dagger() * p * replace_var(u))
+
+    return compute_povm
+
+
+@case(1, 2)
+def ll_povm_sandwich(num_photons):
+    """As :func:`~.ll_povm` but using :func:`~.operators.sandwich` for all the POVM elements at once."""
+    members = runpy.run_path(os.path.join(EXAMPLES_DIR, "example_ll_povm.py"))
+    indices = [(i, num_photons - i) for i in range(num_photons + 1)]
+    u = members["construct_beam_splitter"]()
+    projectors = [members["construct_projector"](*index) for index in indices]
+
+    def compute_povm():
+        for m in sandwich(u, projectors):
+            simplify(m)
+
+    return compute_povm
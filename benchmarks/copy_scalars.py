@@ -0,0 +1,77 @@
+"""
+Compares copying scalars through the interned scalars with the previous copy path,
+i.e. `eval(repr(scalar))`, on the POVM computation in `examples/example_ll_povm.py`.
+
+Run from the root of the repository as::
+
+    python3 -m benchmarks.copy_scalars
+"""
+import os
+import runpy
+from copy import copy
+from contextlib import contextmanager, nullcontext
+from timeit import default_timer as timer
+
+from qualg.scalars import Scalar, ProductOfScalars, SumOfScalars, _AtomicScalar
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples", "example_ll_povm.py")
+
+
+@contextmanager
+def _eval_repr_copies():
+    """Temporarily restores copying scalars through `eval(repr(scalar))`."""
+    classes = [_AtomicScalar, ProductOfScalars, SumOfScalars]
+    originals = [cls.__dict__["__copy__"] for cls in classes]
+    for cls in classes:
+        cls.__copy__ = Scalar.__copy__
+    try:
+        yield
+    finally:
+        for cls, original in zip(classes, originals):
+            cls.__copy__ = original
+
+
+def _collect_scalars(povm):
+    scalars = []
+    for _, scalar in povm:
+        if isinstance(scalar, Scalar):
+            scalars.append(scalar)
+            if hasattr(scalar, "atoms"):
+                scalars += [s for s in scalar.atoms() if isinstance(s, Scalar)]
+    return scalars
+
+
+def _time(function, repeat):
+    t1 = timer()
+    for _ in range(repeat):
+        function()
+    return (timer() - t1) / repeat
+
+
+def main(repeat=20):
+    members = runpy.run_path(EXAMPLE)
+    u = members["construct_beam_splitter"]()
+    p = members["construct_projector"](1, 0)
+    povm = members["simplify"](u.dagger() * p * members["replace_var"](u))
+    scalars = _collect_scalars(povm)
+
+    def copy_all():
+        for scalar in scalars:
+            copy(scalar)
+
+    def compute_povm():
+        members["ultimate_example"]((1, 0), no_output=True)
+
+    results = {}
+    for name, context in [("eval(repr())", _eval_repr_copies), ("interned", nullcontext)]:
+        with context():
+            results[name] = (_time(copy_all, repeat), _time(compute_povm, repeat))
+
+    print(f"{len(scalars)} scalars in the POVM, averaged over {repeat} repetitions")
+    print(f"{'copy path':<15}{'copy scalars (s)':>20}{'LL-POVM (s)':>20}")
+    for name, (t_copy, t_povm) in results.items():
+        print(f"{name:<15}{t_copy:>20.6f}{t_povm:>20.6f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures the memory used per term of large operators, using :mod:`tracemalloc`.
+
+Run from the root of the repository as::
+
+    python3 -m benchmarks.memory
+"""
+import gc
+import tracemalloc
+
+from qualg.scalars import SingleVarFunctionScalar, DeltaFunction, ProductOfScalars
+from qualg.q_state import BaseQubitState
+from qualg.fock_state import BaseFockState, FockOp
+from qualg.operators import Operator, BaseOperator
+
+
+def _fock_operator(num_terms, num_variables=100):
+    """Two-photon operator where each term has different modes and the variables are shared among terms."""
+    base_ops = []
+    scalars = []
+    for i in range(num_terms):
+        left_vars = [f"w{i % num_variables}", f"w{(i + 1) % num_variables}"]
+        right_vars = [f"v{i % num_variables}", f"v{(i + 1) % num_variables}"]
+        left = BaseFockState([FockOp(f"a{i}", left_vars[0]), FockOp(f"b{i}", left_vars[1])])
+        right = BaseFockState([FockOp(f"a{i}", right_vars[0]), FockOp(f"b{i}", right_vars[1])])
+        base_ops.append(BaseOperator(left, right))
+        scalars.append(ProductOfScalars([
+            SingleVarFunctionScalar("f", left_vars[0]),
+            SingleVarFunctionScalar("f", right_vars[0], conjugate=True),
+            DeltaFunction(left_vars[1], right_vars[1]),
+        ]))
+    return Operator(base_ops, scalars)
+
+
+def _qubit_operator(num_terms, num_qubits=20):
+    base_ops = []
+    for i in range(num_terms):
+        digits = format(i, f"0{num_qubits}b")
+        base_ops.append(BaseOperator(BaseQubitState(digits), BaseQubitState(digits[::-1])))
+    return Operator(base_ops, [0.5] * num_terms)
+
+
+CASES = [
+    ("fock operator", _fock_operator),
+    ("qubit operator", _qubit_operator),
+]
+
+
+def bytes_per_term(construct, num_terms):
+    """Returns the memory allocated (and still alive) per term when constructing an object with `num_terms` terms."""
+    gc.collect()
+    tracemalloc.start()
+    obj = construct(num_terms)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(obj) == num_terms
+    return size / num_terms
+
+
+def main(num_terms=10 ** 5):
+    print(f"{'case':<20}{'bytes per term':>16}")
+    for name, construct in CASES:
+        print(f"{name:<20}{bytes_per_term(construct, num_terms):>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
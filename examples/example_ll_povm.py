@@ -9,7 +9,7 @@ from qualg.scalars import SingleVarFunctionScalar, InnerProductFunction, Product
     SumOfScalars, is_number
 from qualg.q_state import BaseQubitState
 from qualg.fock_state import BaseFockState, FockOp
-from qualg.operators import Operator, outer_product
+from qualg.operators import Operator, outer_product, sandwich
 from qualg.toolbox import simplify, replace_var
 from qualg.integrate import integrate
 
@@ -136,7 +136,7 @@ def ultimate_example(indices, no_output=False):
             if isinstance(scalar, sequenced_class):
                 return simplify(sequenced_class([convert_scalars(s) for s in scalar]))
         if isinstance(scalar, InnerProductFunction):
-            if set(scalar._func_names) == set(['phi', 'psi']):
+            if scalar == InnerProductFunction('phi', 'psi'):
                 return visibility
         raise RuntimeError(f"unknown scalar {scalar} of type {type(scalar)}")
 
@@ -144,7 +144,8 @@ def ultimate_example(indices, no_output=False):
 
     u = construct_beam_splitter()
     p = construct_projector(*indices)
-    m = u.dagger() * p * replace_var(u)
+    # Same as u.dagger() * p * replace_var(u) but in a single pass
+    m = sandwich(u, p)
     m = simplify(m)
     if not no_output:
         # print(m)
@@ -1 +1,4 @@
 __version__ = "0.1.0"
+
+from qualg.parallel import set_executor  # noqa: F401
+from qualg.numeric import lambdify  # noqa: F401
@@ -0,0 +1,139 @@
+"""
+Array-backed numeric fast path for states and operators.
+
+When all scalars of a :class:`~.states.State` or :class:`~.operators.Operator` are numbers and
+the base states are part of a finite orthonormal basis (see :meth:`~.states.BaseState._from_vector_index`),
+e.g. :class:`~.q_state.BaseQuditState`, products and inner products are computed using (sparse)
+arrays instead of term by term.
+The functions converting to arrays return `None` when this is not the case and the symbolic
+implementation is then used instead.
+"""
+import numpy as np
+from collections import namedtuple
+from scipy import sparse
+
+from qualg.scalars import is_number
+
+StateArrays = namedtuple("StateArrays", ["template", "indices", "amplitudes"])
+OperatorArrays = namedtuple("OperatorArrays", ["left", "right", "rows", "cols", "amplitudes"])
+
+# Dimensions need to fit in the indices of the arrays
+_MAX_DIMENSION = 2 ** 62
+
+
+def state_arrays(state):
+    """Converts a state to :class:`~.StateArrays` or returns `None` if not possible."""
+    if len(state) == 0 or not _all_numbers(state._terms.values()):
+        return None
+    template = next(iter(state._terms))
+    if not _supports_arrays(template):
+        return None
+    indices = np.fromiter((base_state._vector_index() for base_state in state._terms), dtype=np.int64,
+                          count=len(state))
+
+    return StateArrays(template, indices, np.array(list(state._terms.values())))
+
+
+def operator_arrays(operator):
+    """Converts an operator to :class:`~.OperatorArrays` or returns `None` if not possible."""
+    if len(operator) == 0 or not _all_numbers(operator._terms.values()):
+        return None
+    template = next(iter(operator._terms))
+    if not (_supports_arrays(template._left) and _supports_arrays(template._right)):
+        return None
+    rows = np.fromiter((base_op._left._vector_index() for base_op in operator._terms), dtype=np.int64,
+                       count=len(operator))
+    cols = np.fromiter((base_op._right._vector_index() for base_op in operator._terms), dtype=np.int64,
+                       count=len(operator))
+
+    return OperatorArrays(template._left, template._right, rows, cols, np.array(list(operator._terms.values())))
+
+
+def inner_product(arrays1, arrays2):
+    """Inner product of two states given as :class:`~.StateArrays`."""
+    _, i1, i2 = np.intersect1d(arrays1.indices, arrays2.indices, assume_unique=True, return_indices=True)
+
+    return np.sum(np.conj(arrays1.amplitudes[i1]) * arrays2.amplitudes[i2]).item()
+
+
+def expectation(operator_arrays, state_arrays):
+    """Expectation value <psi|A|psi> of an operator given as :class:`~.OperatorArrays`
+    in a state given as :class:`~.StateArrays`."""
+    order = np.argsort(state_arrays.indices)
+    indices = state_arrays.indices[order]
+    amplitudes = state_arrays.amplitudes[order]
+    # Only the entries of the operator with both the row and column in the state contribute
+    rows = np.minimum(np.searchsorted(indices, operator_arrays.rows), len(indices) - 1)
+    cols = np.minimum(np.searchsorted(indices, operator_arrays.cols), len(indices) - 1)
+    found = (indices[rows] == operator_arrays.rows) & (indices[cols] == operator_arrays.cols)
+
+    return np.sum(np.conj(amplitudes[rows[found]]) * operator_arrays.amplitudes[found] * amplitudes[cols[found]]).item()
+
+
+def tensor_product(arrays1, arrays2):
+    """Tensor product of two states given as :class:`~.StateArrays`, or `None` if not possible."""
+    template = arrays1.template @ arrays2.template
+    if not _supports_arrays(template):
+        return None
+    dimension2 = arrays2.template.shape[0]
+    indices = (arrays1.indices[:, np.newaxis] * dimension2 + arrays2.indices[np.newaxis, :]).ravel()
+    amplitudes = np.outer(arrays1.amplitudes, arrays2.amplitudes).ravel()
+
+    return StateArrays(template, indices, amplitudes)
+
+
+def mul_state(operator_arrays, state_arrays):
+    """Applies an operator given as :class:`~.OperatorArrays` to a state given as :class:`~.StateArrays`."""
+    rows, _, amplitudes = _product(
+        (operator_arrays.rows, operator_arrays.cols, operator_arrays.amplitudes),
+        (state_arrays.indices, np.zeros(len(state_arrays.indices), dtype=np.int64), state_arrays.amplitudes),
+    )
+
+    return StateArrays(operator_arrays.left, rows, amplitudes)
+
+
+def mul_operator(arrays1, arrays2):
+    """Product of two operators given as :class:`~.OperatorArrays`."""
+    rows, cols, amplitudes = _product(
+        (arrays1.rows, arrays1.cols, arrays1.amplitudes),
+        (arrays2.rows, arrays2.cols, arrays2.amplitudes),
+    )
+
+    return OperatorArrays(arrays1.left, arrays2.right, rows, cols, amplitudes)
+
+
+def _product(entries1, entries2):
+    """Product of two matrices given by the (rows, cols, values) of their entries.
+
+    The indices are relabelled to the distinct ones occurring, such that the size of the sparse matrices
+    depends on the number of entries and not on the dimension (which is exponential in the number of qudits).
+    """
+    rows1, cols1, values1 = entries1
+    rows2, cols2, values2 = entries2
+    out_rows, rows1 = np.unique(rows1, return_inverse=True)
+    contracted, contracted_inverse = np.unique(np.concatenate([cols1, rows2]), return_inverse=True)
+    out_cols, cols2 = np.unique(cols2, return_inverse=True)
+    matrix1 = sparse.csr_matrix((values1, (rows1, contracted_inverse[:len(cols1)])),
+                                shape=(len(out_rows), len(contracted)))
+    matrix2 = sparse.csr_matrix((values2, (contracted_inverse[len(cols1):], cols2)),
+                                shape=(len(contracted), len(out_cols)))
+    result = _nonzero_coo(matrix1 @ matrix2)
+
+    return out_rows[result.row], out_cols[result.col], result.data
+
+
+def _nonzero_coo(matrix):
+    matrix = matrix.tocoo()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def _all_numbers(scalars):
+    return all(is_number(scalar) for scalar in scalars)
+
+
+def _supports_arrays(base_state):
+    shape = base_state.shape
+    if shape is None or shape[0] >= _MAX_DIMENSION:
+        return False
+    return base_state._from_vector_index(0) is not None
@@ -0,0 +1,187 @@
+"""
+Opt-in memoization of simplifying and integrating scalars.
+
+When enabled (see :func:`~.enable_cache` or :func:`~.cached`), the results of
+:meth:`~.scalars.ProductOfScalars.simplify`, :meth:`~.scalars.SumOfScalars.simplify` and
+:func:`~.integrate.integrate` are stored in size-bounded LRU caches.
+The caches are keyed on a canonical form of the scalar where the variables are renamed
+(in order of appearance), such that for example the same integrand with primed variables
+(see :func:`~.toolbox.replace_var`) hits the cache.
+The caches are thread-safe, such that they can be used with a thread executor (see :func:`~.parallel.set_executor`).
+Returned results are equal to the non-cached results, however the factors and terms may come in a
+different order.
+
+Note
+----
+Variables starting with '%' are reserved for the canonical form and should not be used.
+"""
+import functools
+import threading
+from copy import copy
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from qualg.symbols import symbol
+from qualg.toolbox import replace_var
+
+CacheStats = namedtuple("CacheStats", ["hits", "misses", "evictions", "size", "maxsize"])
+
+_CANONICAL_PREFIX = "%"
+_CACHES = OrderedDict()
+_ENABLED = False
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        """A cache which evicts the least recently used entry when full.
+
+        Parameters
+        ----------
+        maxsize (optional) : int
+            The maximum number of entries in the cache.
+        """
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Returns the value for the key (marking it as recently used) or `default` if missing."""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Adds an entry to the cache, evicting the least recently used entries if needed."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        """Changes the maximum number of entries, evicting the least recently used entries if needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Returns the :class:`~.CacheStats` of the cache."""
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._entries), self.maxsize)
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+def enable_cache(maxsize=1024):
+    """Enables the caches, each holding at most `maxsize` entries."""
+    global _ENABLED
+    for cache in _CACHES.values():
+        cache.resize(maxsize)
+    _ENABLED = True
+
+
+def disable_cache():
+    """Disables the caches (the entries are kept until :func:`~.clear_cache` is called)."""
+    global _ENABLED
+    _ENABLED = False
+
+
+def clear_cache():
+    """Removes all entries from the caches and resets the counters."""
+    for cache in _CACHES.values():
+        cache.clear()
+
+
+def cache_stats():
+    """Returns a dictionary with the :class:`~.CacheStats` of each cache, e.g. 'simplify' and 'integrate'."""
+    return {name: cache.stats() for name, cache in _CACHES.items()}
+
+
+@contextmanager
+def cached(maxsize=1024):
+    """Context manager which enables the caches within its scope.
+
+    Example
+    -------
+    >>> with cached(maxsize=4096):
+    ...     m = u.dagger() * p * replace_var(u)
+    >>> print(cache_stats())
+    """
+    was_enabled = _ENABLED
+    enable_cache(maxsize=maxsize)
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable_cache()
+
+
+def memoize(name, canonical_args=None):
+    """Decorator adding a cache for a function (or method) taking a scalar as its first argument.
+
+    Parameters
+    ----------
+    name : str
+        The name of the cache.
+    canonical_args (optional) : function
+        Function taking the scalar, the renaming of variables to the canonical ones and the
+        remaining arguments of the function and returns the hashable canonical form of the arguments.
+        If `None` the remaining arguments are used as they are.
+    """
+    cache = _CACHES.setdefault(name, LRUCache())
+    if canonical_args is None:
+        def canonical_args(scalar, renaming, *args, **kwargs):
+            return (args, frozenset(kwargs.items()))
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(scalar, *args, **kwargs):
+            if not _ENABLED or not hasattr(scalar, "_ordered_variables"):
+                return function(scalar, *args, **kwargs)
+            renaming = {variable: symbol(f"{_CANONICAL_PREFIX}{i}")
+                        for i, variable in enumerate(_unique(scalar._ordered_variables()))}
+            key = (_rename(scalar, renaming), canonical_args(scalar, renaming, *args, **kwargs))
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = function(scalar, *args, **kwargs)
+                cache.put(key, _rename(result, renaming))
+                return result
+            return _rename(result, {new: old for old, new in renaming.items()})
+        return wrapper
+
+    return decorator
+
+
+_MISSING = object()
+
+
+def _unique(variables):
+    return list(OrderedDict.fromkeys(variables))
+
+
+def _rename(obj, renaming):
+    """Renames the variables of an object, always returning a new object."""
+    if len(renaming) == 0:
+        return copy(obj)
+    for old_variable, new_variable in renaming.items():
+        obj = replace_var(obj, old_variable, new_variable)
+    return obj
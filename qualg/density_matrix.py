@@ -0,0 +1,202 @@
+"""
+Module for representing mixed states as density matrices.
+
+A :class:`~.DensityMatrix` is an :class:`~.operators.Operator` which can be constructed from pure states
+(:meth:`~.DensityMatrix.from_state`) or mixtures thereof (:meth:`~.DensityMatrix.mix`), evolved by
+channels given by Kraus operators (:meth:`~.DensityMatrix.apply_channel`) and reduced to some of its
+subsystems (:meth:`~.DensityMatrix.partial_trace`).
+
+Note that the arithmetic of :class:`~.operators.Operator` (e.g. `+` and `*`) gives operators, which can be
+converted back using :meth:`~.DensityMatrix.from_operator`.
+"""
+from collections import defaultdict
+from collections.abc import Mapping
+
+from qualg.scalars import sum_scalars
+from qualg.states import State
+from qualg.operators import BaseOperator, Operator, outer_product, sandwich, _integrate_terms
+from qualg.toolbox import replace_var, simplify, is_zero, assert_list_or_tuple
+from qualg.integrate import integrate
+
+
+class DensityMatrix(Operator):
+    __slots__ = ()
+
+    @classmethod
+    def from_operator(cls, operator):
+        """Converts an operator to a density matrix (with the same terms).
+
+        Parameters
+        ----------
+        operator : :class:`~.operators.Operator`
+
+        Returns
+        -------
+        :class:`~.DensityMatrix`
+        """
+        if not isinstance(operator, Operator):
+            raise TypeError(f"operator should be an Operator, not {type(operator)}")
+        density_matrix = cls()
+        density_matrix._terms.update(operator._terms)
+        return density_matrix
+
+    @classmethod
+    def from_state(cls, state):
+        """The density matrix \\|state><state\\| of a pure state.
+
+        The variables of the right hand side are replaced by new ones, such that they are integrated
+        independently of the left hand side.
+
+        Parameters
+        ----------
+        state : :class:`~.states.State`
+
+        Returns
+        -------
+        :class:`~.DensityMatrix`
+        """
+        if not isinstance(state, State):
+            raise TypeError(f"state should be a State, not {type(state)}")
+        return cls.from_operator(outer_product(state, replace_var(state)))
+
+    @classmethod
+    def mix(cls, components, probabilities):
+        """The mixture of some states or density matrices with given probabilities.
+
+        Parameters
+        ----------
+        components : list of :class:`~.states.State` or :class:`~.operators.Operator`
+            The pure states or density matrices to mix.
+        probabilities : list of scalars
+            The probability of each component.
+
+        Returns
+        -------
+        :class:`~.DensityMatrix`
+        """
+        assert_list_or_tuple(components)
+        assert_list_or_tuple(probabilities)
+        if len(components) != len(probabilities):
+            raise ValueError(f"number of components ({len(components)}) and probabilities ({len(probabilities)}) "
+                             "are not equal")
+        mixture = cls()
+        for component, probability in zip(components, probabilities):
+            if isinstance(component, State):
+                component = cls.from_state(component)
+            elif not isinstance(component, Operator):
+                raise TypeError(f"components should be states or operators, not {type(component)}")
+            if len(mixture) > 0 and not mixture._add_compatible(component):
+                raise ValueError(f"component {component} is not compatible with the others")
+            for base_op, scalar in component._terms.items():
+                mixture._terms[base_op] += probability * scalar
+        mixture._prune_zero_terms()
+
+        return mixture
+
+    def apply_channel(self, kraus_ops):
+        """Applies a channel given by Kraus operators, i.e. computes sum_k K_k * rho * K_k^dagger.
+
+        Each term is computed in a single pass using :func:`~.operators.sandwich`, where the variables
+        of the two occurrences of a Kraus operator are integrated independently.
+
+        Parameters
+        ----------
+        kraus_ops : list or dict of :class:`~.operators.Operator`
+            The Kraus operators (the values if a dict or :class:`~.measure.POVM`).
+
+        Returns
+        -------
+        :class:`~.DensityMatrix`
+        """
+        if isinstance(kraus_ops, Mapping):
+            kraus_ops = list(kraus_ops.values())
+        assert_list_or_tuple(kraus_ops)
+        result = DensityMatrix()
+        for kraus_op in kraus_ops:
+            if not isinstance(kraus_op, Operator):
+                raise TypeError(f"Kraus operators should be of type Operator, not {type(kraus_op)}")
+            for base_op, scalar in sandwich(kraus_op.dagger(), self)._terms.items():
+                result._terms[base_op] += scalar
+        result._prune_zero_terms()
+
+        return result
+
+    def trace(self):
+        """The trace of the density matrix (integrated over all variables).
+
+        Returns
+        -------
+        scalar
+        """
+        return _trace(self)
+
+    def expectation(self, operator):
+        """The expectation value of an operator, i.e. Tr(operator * rho).
+
+        Parameters
+        ----------
+        operator : :class:`~.operators.Operator`
+
+        Returns
+        -------
+        scalar
+        """
+        if not isinstance(operator, Operator):
+            raise TypeError(f"operator should be an Operator, not {type(operator)}")
+        return _trace(operator * self)
+
+    def partial_trace(self, subsystems):
+        """Traces out some of the subsystems.
+
+        The terms are reduced in a single pass: each base state is split into the kept and traced parts
+        (see :meth:`~.states.BaseState._split_subsystems`) and the inner product of the traced parts is taken,
+        after which the variables which are no longer in the base operators (e.g. of traced modes) are
+        integrated out.
+
+        Parameters
+        ----------
+        subsystems : int or str or iterable
+            The subsystems to trace out, i.e. positions of qudits (from 0) for
+            :class:`~.q_state.BaseQuditState` or modes for :class:`~.fock_state.BaseFockState`.
+
+        Returns
+        -------
+        :class:`~.DensityMatrix`
+        """
+        if isinstance(subsystems, (int, str)):
+            subsystems = [subsystems]
+        subsystems = frozenset(subsystems)
+        splits = {}
+
+        def split(base_state):
+            if base_state not in splits:
+                splits[base_state] = base_state._split_subsystems(subsystems)
+            return splits[base_state]
+
+        contracted = defaultdict(list)
+        for base_op, scalar in self._terms.items():
+            left_kept, left_traced = split(base_op._left)
+            right_kept, right_traced = split(base_op._right)
+            left_key = left_traced._orthogonality_key()
+            right_key = right_traced._orthogonality_key()
+            if left_key is not None and right_key is not None and left_key != right_key:
+                continue
+            inner = right_traced.inner_product(left_traced)
+            if is_zero(inner):
+                continue
+            contracted[BaseOperator(left_kept, right_kept)].append(inner * scalar)
+
+        reduced = DensityMatrix()
+        reduced._terms.update(_integrate_terms(list(contracted.items())))
+
+        return reduced
+
+
+def _trace(operator):
+    """The trace of an operator, integrated over all variables."""
+    terms = []
+    for base_op, scalar in operator._terms.items():
+        inner = base_op._right.inner_product(base_op._left)
+        if not is_zero(inner):
+            terms.append(scalar * inner)
+    return simplify(integrate(sum_scalars(terms)))
@@ -3,15 +3,19 @@ Contains classes for representing in excited states of some bosonic mode.
 The creation/annihilation operators have a symbolic variable which can for example
 be the frequency of the excited state.
 """
-from collections import defaultdict
-from itertools import permutations
+from math import factorial
+from collections import defaultdict, Counter
 
-from qualg.scalars import DeltaFunction
+from qualg.scalars import DeltaFunction, ProductOfScalars, SumOfScalars
+from qualg.profiling import profiled
 from qualg.states import BaseState
+from qualg.symbols import symbol
 from qualg.toolbox import assert_str, assert_list_or_tuple, replace_var
 
 
 class FockOp:
+    __slots__ = ("_mode", "_variable", "_creation", "_hash")
+
     def __init__(self, mode, variable, creation=True):
         """
         Represents an creation/annihilation operator in a given mode with a given variable
@@ -29,9 +33,10 @@ class FockOp:
         """
         assert_str(mode)
         assert_str(variable)
-        self._mode = mode
-        self._variable = variable
+        self._mode = symbol(mode)
+        self._variable = symbol(variable)
         self._creation = creation
+        self._hash = hash(self._key())
 
     def _key(self):
         return self._mode, self._variable, self._creation
@@ -42,7 +47,15 @@ class FockOp:
         return self._key() == other._key()
 
     def __hash__(self):
-        return hash(self._key())
+        return self._hash
+
+    def __copy__(self):
+        # Immutable
+        return self
+
+    def __reduce__(self):
+        # The hash is not pickled since symbols differ between processes
+        return (self.__class__, self._key())
 
     def __str__(self):
         dag = "+" if self._creation else ""
@@ -62,7 +75,7 @@ class FockOp:
         Replaces a variable with another.
         """
         var = self._variable
-        if old_variable == var:
+        if symbol(old_variable) == var:
             var = new_variable
         return self.__class__(self._mode, var, creation=self._creation)
 
@@ -74,6 +87,8 @@ class FockOp:
 
 
 class FockOpProduct:
+    __slots__ = ("_fock_ops", "_hash")
+
     def __init__(self, fock_ops=None):
         """
         A product of excitation operators (:class:`~.FockOp`).
@@ -83,65 +98,78 @@ class FockOpProduct:
         fock_ops : list of :class:`~.FockOp`
             The product of fock operators.
         """
-        self._fock_ops = defaultdict(int)
-        if fock_ops is None:
-            return
-        assert_list_or_tuple(fock_ops)
-        for fock_op in fock_ops:
-            assert_fock_op(fock_op)
-            # TODO we only allow these to be creation ops for now
-            if not fock_op._creation:
-                raise NotImplementedError
-            self._fock_ops[fock_op] += 1
+        counts = Counter()
+        if fock_ops is not None:
+            assert_list_or_tuple(fock_ops)
+            for fock_op in fock_ops:
+                assert_fock_op(fock_op)
+                # TODO we only allow these to be creation ops for now
+                if not fock_op._creation:
+                    raise NotImplementedError
+                counts[fock_op] += 1
+        self._set_counts(counts)
+
+    @classmethod
+    def _from_counts(cls, counts):
+        """Constructs the product from a dictionary of fock operators and their counts."""
+        new_op = cls.__new__(cls)
+        new_op._set_counts(counts)
+        return new_op
+
+    def _set_counts(self, counts):
+        # Tuple of pairs of fock operators and their counts, sorted such that it is also the key
+        self._fock_ops = tuple(sorted(counts.items(), key=lambda x: x[0]._key()))
+        self._hash = hash(self._fock_ops)
 
     def __mul__(self, other):
-        new_op = FockOpProduct()
+        counts = Counter(dict(self._fock_ops))
         if isinstance(other, FockOp):
-            for fock_op, count in self._fock_ops.items():
-                new_op._fock_ops[fock_op] += count
-            new_op._fock_ops[other] += 1
-            return new_op
+            counts[other] += 1
         elif isinstance(other, FockOpProduct):
-            for fock_op, count in self._fock_ops.items():
-                new_op._fock_ops[fock_op] += count
-            for fock_op, count in other._fock_ops.items():
-                new_op._fock_ops[fock_op] += count
+            counts.update(dict(other._fock_ops))
+        else:
+            return NotImplemented
 
-        return new_op
+        return FockOpProduct._from_counts(counts)
 
     def __str__(self):
         to_print = ""
-        for fock_op, count in self._fock_ops.items():
+        for fock_op, count in self._fock_ops:
             to_print += f"{fock_op}^{count} * "
         return to_print[:-3]
 
     def _key(self):
-        return tuple(sorted(self._fock_ops.items(), key=lambda x: x[0]._key()))
+        return self._fock_ops
 
     def __hash__(self):
-        return hash(self._key())
+        return self._hash
 
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
             return NotImplemented
         return self._key() == other._key()
 
+    def __copy__(self):
+        # Immutable
+        return self
+
+    def __reduce__(self):
+        # The hash is not pickled since symbols differ between processes
+        return (self._from_counts, (dict(self._fock_ops),))
+
     def dagger(self):
         """
         Complex conjugate of the operator.
         """
-        new_op = FockOpProduct()
-        for fock_op, count in self._fock_ops.items():
-            new_op._fock_ops[fock_op.dagger()] = count
-
-        return new_op
+        return FockOpProduct._from_counts({fock_op.dagger(): count for fock_op, count in self._fock_ops})
 
     def variables_in_mode(self, mode):
         """
         Get the variables in a given mode.
         """
+        mode = symbol(mode)
         variables = []
-        for fock_op, count in self._fock_ops.items():
+        for fock_op, count in self._fock_ops:
             if fock_op._mode == mode:
                 for _ in range(count):
                     variables.append(fock_op._variable)
@@ -153,7 +181,7 @@ class FockOpProduct:
         Get a dictionay of variables per modes.
         """
         variables = defaultdict(list)
-        for fock_op, count in self._fock_ops.items():
+        for fock_op, count in self._fock_ops:
             mode = fock_op._mode
             for _ in range(count):
                 variables[mode].append(fock_op._variable)
@@ -164,23 +192,25 @@ class FockOpProduct:
         """
         Replaces a variable with another.
         """
-        new_fock_op_product = FockOpProduct()
-        for fock_op, count in self._fock_ops.items():
-            new_fock_op_product._fock_ops[replace_var(fock_op, old_variable, new_variable)] = count
-        return new_fock_op_product
+        counts = Counter()
+        for fock_op, count in self._fock_ops:
+            counts[replace_var(fock_op, old_variable, new_variable)] += count
+        return FockOpProduct._from_counts(counts)
 
     def get_variables(self):
         """
         Returns the variable of this operator.
         """
         vars = set([])
-        for fock_op in self._fock_ops:
+        for fock_op, _ in self._fock_ops:
             vars |= fock_op.get_variables()
 
         return vars
 
 
 class BaseFockState(BaseState):
+    __slots__ = ("_fock_op_product",)
+
     def __init__(self, fock_ops=None):
         """
         A base state represented by excitations from vacuum.
@@ -204,11 +234,15 @@ class BaseFockState(BaseState):
         return self._key() == other._key()
 
     def __hash__(self):
-        return hash(self._key())
+        return self._fock_op_product._hash
+
+    def __copy__(self):
+        # Immutable
+        return self
 
     def __str__(self):
         to_print = ""
-        for fock_op, count in self._fock_op_product._fock_ops.items():
+        for fock_op, count in self._fock_op_product._fock_ops:
             to_print += f"{fock_op}^{count}"
         return to_print + "|0>"
 
@@ -216,9 +250,12 @@ class BaseFockState(BaseState):
     def shape(self):
         return None
 
+    @profiled("BaseFockState.inner_product")
     def inner_product(self, other):
         if not isinstance(other, self.__class__):
             raise TypeError()
+        if self._orthogonality_key() != other._orthogonality_key():
+            return 0
         l_vars_by_mode = self._fock_op_product.variables_by_modes()
         r_vars_by_mode = other._fock_op_product.variables_by_modes()
         all_modes = set(l_vars_by_mode.keys()) | set(r_vars_by_mode.keys())
@@ -228,18 +265,32 @@ class BaseFockState(BaseState):
             r_vars = r_vars_by_mode.get(mode, [])
             if len(l_vars) != len(r_vars):
                 return 0
-            factor = 0
-            for perm_r_vars in permutations(r_vars):
-                term = 1
-                for l_var, r_var in zip(l_vars, perm_r_vars):
-                    term *= DeltaFunction(l_var, r_var)
-                factor += term
-            scalar *= factor
+            scalar *= _sum_of_delta_pairings(l_vars, r_vars)
 
         return scalar
 
+    def _orthogonality_key(self):
+        # Base states with different number of excitations in some mode are orthogonal
+        counts = defaultdict(int)
+        for fock_op, count in self._fock_op_product._fock_ops:
+            counts[fock_op._mode] += count
+        return tuple(sorted(counts.items()))
+
+    def _split_subsystems(self, subsystems):
+        """The subsystems are the modes."""
+        subsystems = set(symbol(mode) for mode in subsystems)
+        kept = {}
+        traced = {}
+        for fock_op, count in self._fock_op_product._fock_ops:
+            if fock_op._mode in subsystems:
+                traced[fock_op] = count
+            else:
+                kept[fock_op] = count
+        return (BaseFockState(FockOpProduct._from_counts(kept)),
+                BaseFockState(FockOpProduct._from_counts(traced)))
+
     def tensor_product(self, other):
-        if not isinstance(other, self.__class__):
+        if not isinstance(other, BaseFockState):
             raise NotImplementedError(f"fock tensor product is not implemented for {type(other)}")
         prod = self._fock_op_product * other._fock_op_product
         return BaseFockState(fock_ops=prod)
@@ -263,11 +314,71 @@ class BaseFockState(BaseState):
 
     def _bra_str(self):
         to_print = ""
-        for fock_op, count in self._fock_op_product._fock_ops.items():
+        for fock_op, count in self._fock_op_product._fock_ops:
             to_print += f"{fock_op.dagger()}^{count}"
         return "<0|" + to_print
 
 
+def _sum_of_delta_pairings(l_vars, r_vars):
+    """Sum over all permutations of the right variables of the product of delta functions
+    between the left and permuted right variables.
+
+    Instead of enumerating all n! permutations, the distinct ways to pair up the (possibly repeated)
+    variables are enumerated, each with its multiplicity as coefficient.
+    """
+    l_counts = Counter(l_vars)
+    r_counts = Counter(r_vars)
+    num_permutations = 1
+    for count in list(l_counts.values()) + list(r_counts.values()):
+        num_permutations *= factorial(count)
+    deltas = {(l_var, r_var): DeltaFunction(l_var, r_var) for l_var in l_counts for r_var in r_counts}
+    terms = []
+    for pairing in _pairings(list(l_counts.items()), r_counts):
+        coefficient = num_permutations
+        factors = []
+        for pair, multiplicity in pairing:
+            coefficient //= factorial(multiplicity)
+            factors += [deltas[pair]] * multiplicity
+        if coefficient == 1 and len(factors) == 1:
+            terms.append(factors[0])
+        else:
+            terms.append(ProductOfScalars([coefficient] + factors))
+    if len(terms) == 1:
+        return terms[0]
+    return SumOfScalars(terms)
+
+
+def _pairings(l_counts, r_counts):
+    """Yields the distinct ways to pair up left and right variables (given by their counts),
+    as lists of ((l_var, r_var), multiplicity)."""
+    if len(l_counts) == 0:
+        yield []
+        return
+    (l_var, count), l_rest = l_counts[0], l_counts[1:]
+    for distribution in _distributions(count, list(r_counts.items())):
+        r_rest = Counter(r_counts)
+        r_rest.subtract(dict(distribution))
+        r_rest = Counter({r_var: c for r_var, c in r_rest.items() if c > 0})
+        for pairing in _pairings(l_rest, r_rest):
+            yield [((l_var, r_var), multiplicity) for r_var, multiplicity in distribution] + pairing
+
+
+def _distributions(count, r_counts):
+    """Yields the ways to distribute `count` among the right variables, bounded by their counts."""
+    if count == 0:
+        yield []
+        return
+    if len(r_counts) == 0:
+        return
+    (r_var, available), r_rest = r_counts[0], r_counts[1:]
+    for multiplicity in range(min(count, available), -1, -1):
+        for distribution in _distributions(count - multiplicity, r_rest):
+            if multiplicity > 0:
+                yield [(r_var, multiplicity)] + distribution
+            else:
+                yield distribution
+
+
 def assert_fock_op(op):
     """
     Asserts that an object is a fock operator.
@@ -4,13 +4,18 @@ Module for performing integration of scalars (:func:`~.scalar.Scalar`).
 Main function is :func:`~.integrate` which takes a scalar and the variables to integrate over.
 """
 from copy import copy
+from collections import defaultdict, Counter
 
+from qualg.cache import memoize
+from qualg.profiling import profiled, apply_rule
+from qualg.symbols import Symbol, symbol
 from qualg.toolbox import assert_str, replace_var, simplify, get_variables, has_variable
 from qualg.scalars import is_number, DeltaFunction, SumOfScalars, ProductOfScalars,\
     InnerProductFunction, SingleVarFunctionScalar, Scalar, assert_is_scalar
 
 
 class _Integration(Scalar):
+    __slots__ = ("_scalar", "_variable", "_variables")
 
     def __init__(self, scalar, variable):
         assert_is_scalar(scalar)
@@ -20,7 +25,8 @@ class _Integration(Scalar):
         if not all(has_variable(factor, variable) for factor in scalar):
             raise ValueError("all factors should have the integration term")
         self._scalar = scalar
-        self._variable = variable
+        self._variable = symbol(variable)
+        self._variables = None
 
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
@@ -38,29 +44,54 @@ class _Integration(Scalar):
         return f"{self.__class__.__name__}({repr(self._scalar)}, {repr(self._variable)}"
 
     def __copy__(self):
-        return self.__class__(self._scalar, self._variable)
+        return self.__class__(copy(self._scalar), self._variable)
 
     def conjugate(self):
         return self.__class__(self._scalar.conjugate(), self._variable)
 
     def simplify(self):
         new_scalar = copy(self)
-        for evaluation in EVALUATIONS:
-            new_scalar = evaluation(new_scalar)
-            if not isinstance(new_scalar, _Integration):
-                return new_scalar
+        factors = _index_factors(new_scalar._scalar)
+        for rule in _dispatch(factors):
+            result = apply_rule(rule, new_scalar, factors)
+            if result is not new_scalar:
+                if isinstance(result, _Integration):
+                    # The integrand changed so other rules might apply
+                    return result.simplify()
+                return result
         return new_scalar
 
     def has_variable(self, variable):
-        # raise NotImplementedError()
-        if variable == self._variable:
-            return False
-        return has_variable(self._scalar, variable)
+        return symbol(variable) in self.get_variables()
+
+    def get_variables(self):
+        if self._variables is None:
+            self._variables = get_variables(self._scalar) - {self._variable}
+        return self._variables
+
+    def replace_var(self, old_variable, new_variable):
+        variable = new_variable if symbol(old_variable) == self._variable else self._variable
+        return self.__class__(replace_var(self._scalar, old_variable, new_variable), variable)
+
+    def _ordered_variables(self):
+        return self._scalar._ordered_variables()
 
     def _key(self):
         return (self._scalar, self._variable)
 
 
+def _canonical_variables(scalar, renaming, variable=None):
+    """The variables to integrate over in the canonical form of the scalar (see :mod:`~.cache`)."""
+    if variable is None:
+        return None
+    if isinstance(variable, (str, Symbol)):
+        variable = set([variable])
+    variable = (symbol(v) for v in variable)
+    return frozenset(renaming[v] for v in variable if v in renaming)
+
+
+@profiled("integrate")
+@memoize("integrate", canonical_args=_canonical_variables)
 def integrate(scalar, variable=None):
     """
     Integrates a scalar over a given variable or variables.
@@ -74,7 +105,7 @@ def integrate(scalar, variable=None):
         Can be:
         * `None`: Then all variables in the scalar are integrated out.
         * `str`: Then a single variable is integrated out.
-        * `set` of `str`: Then all the variables in the set are integrated out.
+        * `set` (or `frozenset`) of `str`: Then all the variables in the set are integrated out.
 
     Returns
     -------
@@ -85,12 +116,18 @@ def integrate(scalar, variable=None):
     scalar = simplify(scalar)
     if variable is None:
         return integrate(scalar, get_variables(scalar))
-    if isinstance(variable, set):
+    if isinstance(variable, (set, frozenset)):
+        variable = frozenset(symbol(v) for v in variable)
+        if isinstance(scalar, SumOfScalars):
+            return simplify(sum(integrate(term, variable) for term in scalar._terms))
+        if isinstance(scalar, ProductOfScalars):
+            scalar, variable = _resolve_delta_functions(scalar, variable)
         new_scalar = scalar
         for v in variable:
             new_scalar = integrate(new_scalar, v)
         return new_scalar
     assert_str(variable)
+    variable = symbol(variable)
     if isinstance(scalar, SumOfScalars):
         new_scalar = sum(integrate(s, variable) for s in scalar._terms)
     # elif isinstance(scalar, ProductOfScalars):
@@ -121,53 +158,220 @@ def integrate(scalar, variable=None):
     return simplify(new_scalar)
 
 
-def _evaluate_delta_function(integration_scalar):
+def _resolve_delta_functions(product, variables):
+    """Integrates out the variables of a product which are fixed by its delta functions, all at once.
+
+    The variables connected by delta functions are grouped into equivalence classes using union-find.
+    Each class gets a representative, being its first variable which is not integrated over (if any),
+    all variables of a class which are integrated over are replaced by its representative in one pass and
+    the delta functions used to join classes are removed.
+    If a class has multiple variables which are not integrated over, the delta functions between the
+    representative and the other ones are kept.
+
+    Parameters
+    ----------
+    product : :class:`~.scalars.ProductOfScalars`
+        The scalar to integrate.
+    variables : set of str
+        The variables to integrate over.
+
+    Returns
+    -------
+    tuple
+        The new scalar and the variables which still needs to be integrated over.
+    """
+    factors = list(product)
+    parent = {}
+
+    def find(v):
+        root = v
+        while parent[root] != root:
+            root = parent[root]
+        # Compress the path
+        while parent[v] != root:
+            parent[v], v = root, parent[v]
+        return root
+
+    used_deltas = set()
+    for i, factor in enumerate(factors):
+        if not isinstance(factor, DeltaFunction) or variables.isdisjoint(factor._vars):
+            continue
+        var1, var2 = factor._vars
+        parent.setdefault(var1, var1)
+        parent.setdefault(var2, var2)
+        root1, root2 = find(var1), find(var2)
+        if root1 != root2:
+            parent[root2] = root1
+            used_deltas.add(i)
+    if len(used_deltas) == 0:
+        return product, variables
+
+    # NOTE the variables of parent are in the order they are encountered
+    classes = defaultdict(list)
+    for v in parent:
+        classes[find(v)].append(v)
+    substitutions = {}
+    new_factors = []
+    for members in classes.values():
+        free_vars = [v for v in members if v not in variables]
+        representative = free_vars[0] if len(free_vars) > 0 else members[0]
+        for v in free_vars[1:]:
+            new_factors.append(DeltaFunction(representative, v))
+        for v in members:
+            if v != representative and v in variables:
+                substitutions[v] = representative
+
+    for i, factor in enumerate(factors):
+        if i in used_deltas:
+            continue
+        if isinstance(factor, DeltaFunction):
+            var1, var2 = (substitutions.get(v, v) for v in factor._vars)
+            if var1 == var2:
+                raise ValueError(f"delta functions form a cycle, {factor} would become {var1} = {var2}")
+        if isinstance(factor, Scalar):
+            for old_variable in get_variables(factor) & substitutions.keys():
+                factor = replace_var(factor, old_variable, substitutions[old_variable])
+        new_factors.append(factor)
+
+    return simplify(ProductOfScalars(new_factors)), set(variables) - substitutions.keys()
+
+
+# The registered integration rules, indexed by the first type of their signature, where each entry is
+# (order, signature, exact, rule) and order is the order of registration
+_RULES = defaultdict(list)
+_NUM_RULES = 0
+# The rules to try (and aliased types) for each signature of integrands, computed when needed
+_DISPATCH = {}
+
+
+def register_integration_rule(*factor_types, exact=False):
+    """Decorator registering an integration rule, which is tried when simplifying integrals whose integrand
+    has factors of the given types.
+
+    The rule is called as `rule(integral, factors)` where `integral` is the (single variable) integral and
+    `factors` is a dictionary from types to the factors of the integrand of that type.
+    It should return the evaluated integral or the integral itself if the rule does not apply.
+    Rules are tried in the order they are registered, until one applies.
+
+    Parameters
+    ----------
+    *factor_types : type
+        The signature of the rule, i.e. the types of factors the integrand should contain (where a type can
+        be given multiple times). If no types are given, the rule is tried for all integrals.
+    exact : bool
+        If `True` the integrand should have exactly the factors of the signature.
+
+    Examples
+    --------
+    >>> @register_integration_rule(SingleVarFunctionScalar, exact=True)
+    ... def _integrate_unit_function(integral, factors):
+    ...     if factors[SingleVarFunctionScalar][0]._func_name == symbol("unit"):
+    ...         return 1
+    ...     return integral
+    """
+    for factor_type in factor_types:
+        if not isinstance(factor_type, type):
+            raise TypeError(f"factor types should be types, not {type(factor_type)}")
+
+    def decorator(rule):
+        global _NUM_RULES
+        key = factor_types[0] if len(factor_types) > 0 else None
+        _RULES[key].append((_NUM_RULES, Counter(factor_types), exact, rule))
+        _NUM_RULES += 1
+        _DISPATCH.clear()
+        return rule
+
+    return decorator
+
+
+def _index_factors(integrand):
+    """Groups the factors of a product by their type."""
+    factors = defaultdict(list)
+    for factor in integrand:
+        factors[type(factor)].append(factor)
+    return factors
+
+
+def _dispatch(factors):
+    """The rules to try (in order) for an integrand with the given factors (see :func:`~._index_factors`).
+
+    A rule registered for a type also applies to factors of its subclasses, which are therefore added to
+    `factors` under the registered type.
+    """
+    signature = frozenset((factor_type, len(fs)) for factor_type, fs in factors.items())
+    entry = _DISPATCH.get(signature)
+    if entry is None:
+        entry = _DISPATCH[signature] = _resolve_rules(signature)
+    rules, aliases = entry
+    for registered_type, factor_types in aliases:
+        factors[registered_type] = [factor for factor_type in factor_types for factor in factors[factor_type]]
+    return rules
+
+
+def _resolve_rules(signature):
+    """The rules to try for a signature and the registered types which are base classes of the factor types,
+    together with these factor types."""
+    # The number of factors and the types of factors of each type or base class thereof
+    counts = defaultdict(int)
+    factor_types = defaultdict(list)
+    for factor_type, count in signature:
+        for base_type in factor_type.__mro__:
+            counts[base_type] += count
+            if base_type is factor_type:
+                factor_types[base_type].insert(0, factor_type)
+            else:
+                factor_types[base_type].append(factor_type)
+    num_factors = sum(count for _, count in signature)
+
+    candidates = list(_RULES[None])
+    for base_type in counts:
+        candidates += _RULES.get(base_type, [])
+    rules = []
+    registered_types = set()
+    for _, required, exact, rule in sorted(candidates, key=lambda candidate: candidate[0]):
+        if any(counts.get(factor_type, 0) < count for factor_type, count in required.items()):
+            continue
+        if exact and sum(required.values()) != num_factors:
+            continue
+        rules.append(rule)
+        registered_types |= required.keys()
+    aliases = [(registered_type, factor_types[registered_type]) for registered_type in registered_types
+               if factor_types[registered_type] != [registered_type]]
+
+    return rules, aliases
+
+
+@register_integration_rule(DeltaFunction)
+def _evaluate_delta_function(integration_scalar, factors):
     integrand = integration_scalar._scalar
     variable = integration_scalar._variable
-    # Find the delta functions containing this variable
-    deltas = [(i, d) for (i, d) in enumerate(integrand._factors)
-              if isinstance(d, DeltaFunction) and variable in d._vars]
-    if len(deltas) == 0:
-        return integration_scalar
-    # Replace variables with the variable to the other variable in the delta function
-    i, delta = deltas[0]
+    # All factors contain the variable, so in particular the delta functions
+    delta = factors[DeltaFunction][0]
     # Get the other variable in the delta function
     try:
         other_var = next(v for v in delta._vars if v != variable)
     except StopIteration:
         # TODO This should not happen anymore
         raise RuntimeError(f"Encountered delta function with the same variable: {delta}")
-    # Replace the delta function with 1 (recall that replace_var creates a copy)
-    integrand._factors[i] = 1
+    # Replace the delta function with 1 (without modifying the integrand which might be shared)
+    i = integrand._factors.index(delta)
+    integrand = ProductOfScalars(integrand._factors[:i] + integrand._factors[i + 1:])
     integrand = replace_var(integrand, old_variable=variable, new_variable=other_var)
 
     return integrand
 
 
-def _find_norm_identities(integration_scalar):
+@register_integration_rule(SingleVarFunctionScalar, SingleVarFunctionScalar, exact=True)
+def _find_norm_identities(integration_scalar, factors):
     """Finds integrals which are the norm of a function, i.e. 1"""
-    integrand = integration_scalar._scalar
-    # TODO generalise this
-    if len(integrand) == 2:
-        if all(isinstance(s, SingleVarFunctionScalar) for s in integrand):
-            if integrand[0] == integrand[1].conjugate():
-                return 1
+    f1, f2 = factors[SingleVarFunctionScalar]
+    if f1 == f2.conjugate():
+        return 1
     return integration_scalar
 
 
-def _find_function_inner_products(integration_scalar):
+@register_integration_rule(SingleVarFunctionScalar, SingleVarFunctionScalar, exact=True)
+def _find_function_inner_products(integration_scalar, factors):
     """Finds integrals which evaluate to the inner product of functions."""
-    integrand = integration_scalar._scalar
-    # TODO generalise this
-    if len(integrand) == 2:
-        if all(isinstance(s, SingleVarFunctionScalar) for s in integrand):
-            return InnerProductFunction(integrand[0]._func_name, integrand[1]._func_name)
-    return integration_scalar
-
-
-# These evaluations are used when integrating
-EVALUATIONS = [
-    _evaluate_delta_function,
-    _find_norm_identities,
-    _find_function_inner_products,
-]
+    f1, f2 = factors[SingleVarFunctionScalar]
+    return InnerProductFunction(f1._func_name, f2._func_name)
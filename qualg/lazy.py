@@ -0,0 +1,270 @@
+"""
+Lazy arithmetic of states and operators.
+
+Wrapping a :class:`~.states.State` or :class:`~.operators.Operator` using :func:`~.lazy` gives a
+:class:`~.LazyExpression` for which `+`, `-`, `*` (by operators, states or scalars), `@` and `dagger()`
+build an expression graph instead of computing the result.
+The result is computed when calling :meth:`~.LazyExpression.evaluate` (or :meth:`~.LazyExpression.simplify`,
+:meth:`~.LazyExpression.to_numpy_matrix` etc.), which:
+
+* fuses nested sums into a single accumulation of terms,
+* reorders chains of products to minimize the estimated number of intermediate terms,
+* evaluates subexpressions which are used more than once only once.
+
+Example
+-------
+>>> from qualg.lazy import lazy
+>>> beam_splitter = sum(lazy(outer_product(f, q)) for f, q in zip(fock_states, qubit_states))
+>>> m = (beam_splitter.dagger() * lazy(p) * lazy(replace_var(beam_splitter.evaluate()))).simplify()
+"""
+from qualg.scalars import is_scalar
+from qualg.states import State
+from qualg.operators import Operator
+
+
+def lazy(obj):
+    """Wraps a state or operator as a :class:`~.LazyExpression` (does nothing for a lazy expression).
+
+    Parameters
+    ----------
+    obj : :class:`~.states.State` or :class:`~.operators.Operator` or :class:`~.LazyExpression`
+        The object to wrap.
+
+    Returns
+    -------
+    :class:`~.LazyExpression`
+    """
+    if isinstance(obj, LazyExpression):
+        return obj
+    if not isinstance(obj, (State, Operator)):
+        raise TypeError(f"can only make states and operators lazy, not {type(obj)}")
+    return LazyExpression("leaf", value=obj)
+
+
+class LazyExpression:
+    __slots__ = ("_kind", "_children", "_value")
+
+    def __init__(self, kind, children=(), value=None):
+        """A node in an expression graph of states and operators, see :func:`~.lazy`.
+
+        Parameters
+        ----------
+        kind : str
+            One of "leaf" (`value` is a state or operator), "sum", "product", "tensor", "dagger"
+            or "scale" (`value` is the scalar).
+        children : tuple of :class:`~.LazyExpression`
+            The operands.
+        value (optional) : state, operator or scalar
+            See `kind`.
+        """
+        self._kind = kind
+        self._children = tuple(children)
+        self._value = value
+
+    def __add__(self, other):
+        if not isinstance(other, (LazyExpression, State, Operator)):
+            if other == 0:
+                return self
+            return NotImplemented
+        return LazyExpression("sum", (self, lazy(other)))
+
+    def __radd__(self, other):
+        if not isinstance(other, (LazyExpression, State, Operator)):
+            if other == 0:
+                return self
+            return NotImplemented
+        return LazyExpression("sum", (lazy(other), self))
+
+    def __sub__(self, other):
+        return self + (-1) * lazy(other)
+
+    def __rsub__(self, other):
+        return lazy(other) + (-1) * self
+
+    def __mul__(self, other):
+        if isinstance(other, (LazyExpression, State, Operator)):
+            return LazyExpression("product", (self, lazy(other)))
+        if is_scalar(other):
+            return LazyExpression("scale", (self,), other)
+        return NotImplemented
+
+    def __rmul__(self, other):
+        if isinstance(other, (State, Operator)):
+            return LazyExpression("product", (lazy(other), self))
+        if is_scalar(other):
+            return LazyExpression("scale", (self,), other)
+        return NotImplemented
+
+    def __truediv__(self, other):
+        if not is_scalar(other):
+            return NotImplemented
+        return self * (1 / other)
+
+    def __matmul__(self, other):
+        return LazyExpression("tensor", (self, lazy(other)))
+
+    def __rmatmul__(self, other):
+        return LazyExpression("tensor", (lazy(other), self))
+
+    def __str__(self):
+        if self._kind == "leaf":
+            return f"<{self._value.__class__.__name__} with {len(self._value)} terms>"
+        if self._kind == "scale":
+            return f"{self._value}*{self._children[0]}"
+        if self._kind == "dagger":
+            return f"({self._children[0]})^dagger"
+        separator = {"sum": " + ", "product": " * ", "tensor": " @ "}[self._kind]
+        return "(" + separator.join(str(operand) for operand in self._flatten(self._kind)) + ")"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self})"
+
+    def dagger(self):
+        """Complex conjugate (lazy)."""
+        return LazyExpression("dagger", (self,))
+
+    def evaluate(self):
+        """Computes the state or operator of the expression.
+
+        Returns
+        -------
+        :class:`~.states.State` or :class:`~.operators.Operator`
+        """
+        return _Planner().evaluate(self)
+
+    def simplify(self):
+        """Evaluates and simplifies the expression."""
+        return self.evaluate().simplify()
+
+    def to_numpy_matrix(self, convert_scalars=None, **kwargs):
+        """Evaluates the expression and converts it to a matrix, see :meth:`~.operators.Operator.to_numpy_matrix`."""
+        return self.evaluate().to_numpy_matrix(convert_scalars=convert_scalars, **kwargs)
+
+    def to_sparse_matrix(self, convert_scalars=None, format="csr", **kwargs):
+        """Evaluates the expression and converts it to a matrix, see :meth:`~.operators.Operator.to_sparse_matrix`."""
+        return self.evaluate().to_sparse_matrix(convert_scalars=convert_scalars, format=format, **kwargs)
+
+    def to_numpy_vector(self, convert_scalars=None, **kwargs):
+        """Evaluates the expression and converts it to a vector, see :meth:`~.states.State.to_numpy_vector`."""
+        return self.evaluate().to_numpy_vector(convert_scalars=convert_scalars, **kwargs)
+
+    def _flatten(self, kind):
+        """The operands of consecutive nodes of the given kind, e.g. the terms of nested sums."""
+        # NOTE not recursive since e.g. sum() gives deep expressions
+        operands = []
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node._kind == kind:
+                stack += reversed(node._children)
+            else:
+                operands.append(node)
+        return operands
+
+
+class _Planner:
+    def __init__(self):
+        """Evaluates expression graphs, evaluating each node (object) at most once."""
+        self._evaluated = {}
+
+    def evaluate(self, node):
+        key = id(node)
+        if key not in self._evaluated:
+            # The node is kept to make sure the id is not reused
+            self._evaluated[key] = (node, self._evaluate(node))
+        return self._evaluated[key][1]
+
+    def _evaluate(self, node):
+        kind = node._kind
+        if kind == "leaf":
+            return node._value
+        if kind == "scale":
+            return self.evaluate(node._children[0]) * node._value
+        if kind == "dagger":
+            return self.evaluate(node._children[0]).dagger()
+        if kind == "sum":
+            return self._evaluate_sum([self.evaluate(operand) for operand in node._flatten("sum")])
+        if kind == "product":
+            return self._evaluate_chain([self.evaluate(operand) for operand in node._flatten("product")])
+        if kind == "tensor":
+            operands = [self.evaluate(operand) for operand in node._flatten("tensor")]
+            result = operands[0]
+            for operand in operands[1:]:
+                result = result @ operand
+            return result
+        raise ValueError(f"unknown kind of node {kind}")
+
+    @staticmethod
+    def _evaluate_sum(operands):
+        """Accumulates the terms of all operands in one go."""
+        first = operands[0]
+        if isinstance(first, Operator):
+            new_obj = Operator()
+            compatible = first._add_compatible
+        else:
+            new_obj = State()
+            compatible = first._compatible
+        for operand in operands:
+            if not isinstance(operand, first.__class__):
+                raise TypeError(f"cannot add {type(operand)} to {type(first)}")
+            if len(operand) > 0 and len(first) > 0 and not compatible(operand):
+                raise ValueError(f"{operand} is not compatible with {first}")
+            for base, scalar in operand._terms.items():
+                new_obj._terms[base] += scalar
+        new_obj._prune_zero_terms()
+
+        return new_obj
+
+    @staticmethod
+    def _evaluate_chain(operands):
+        """Multiplies a chain of operators (possibly ending with a state) in the order found by
+        :func:`~._chain_order`."""
+        split = _chain_order([_dimensions(operand) for operand in operands])
+
+        def multiply(i, j):
+            if i == j:
+                return operands[i]
+            k = split[i][j]
+            return multiply(i, k) * multiply(k + 1, j)
+
+        return multiply(0, len(operands) - 1)
+
+
+def _dimensions(obj):
+    """The dimensions used to estimate the number of terms of products, i.e. the number of distinct left and
+    right base states (a state being a column)."""
+    if isinstance(obj, State):
+        return (len(obj), 1)
+    return (len(set(base_op._left for base_op in obj._terms)), len(set(base_op._right for base_op in obj._terms)))
+
+
+def _chain_order(dimensions):
+    """Finds the order to multiply a chain of operators such that the (estimated) number of multiplied
+    pairs of terms is minimal, using the dynamic program for matrix-chain multiplication.
+
+    Parameters
+    ----------
+    dimensions : list of tuple
+        The number of (distinct) left and right base states of each operator.
+
+    Returns
+    -------
+    list of list
+        Where element [i][j] is the index k at which the chain i..j should be split, i.e. (i..k) * (k+1..j).
+    """
+    n = len(dimensions)
+    cost = [[0] * n for _ in range(n)]
+    split = [[None] * n for _ in range(n)]
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length - 1
+            cost[i][j] = None
+            for k in range(i, j):
+                # Terms of the product (i..k) * (k+1..j) for dense operators
+                contracted = max(dimensions[k][1], dimensions[k + 1][0])
+                c = cost[i][k] + cost[k + 1][j] + dimensions[i][0] * contracted * dimensions[j][1]
+                if cost[i][j] is None or c < cost[i][j]:
+                    cost[i][j] = c
+                    split[i][j] = k
+
+    return split
@@ -1,14 +1,104 @@
-"""Contains function :func:`~.measure` for measuring states"""
+"""Contains function :func:`~.measure` for measuring states, :func:`~.measure_many` for sampling many
+measurements, :func:`~.measurement_distribution` for computing all outcomes at once and
+:func:`~.sweep_probabilities` for computing the probabilities of the outcomes over a grid of parameters.
+
+The Kraus operators describing a measurement are given either as a dict from outcomes to operators or as a
+:class:`~.POVM`, which also caches the effects (K^dagger * K) and whether they form a valid POVM.
+The probabilities of the outcomes are computed from the effects as <psi|E|psi> and a dict is converted to a
+:class:`~.POVM` on each call, so a :class:`~.POVM` should be used when measuring many states."""
 import random
 import numpy as np
 from collections import namedtuple
+from collections.abc import Mapping
 
+from qualg import arrays
 from qualg.scalars import is_number
+from qualg.toolbox import simplify
+from qualg.numeric import lambdify, DEFAULT_CHUNK_SIZE
 from qualg.states import State
 from qualg.operators import Operator
 
 
 MeasurementResult = namedtuple("MeasurementResult", ["outcome", "probability", "post_meas_state"])
+MeasurementSamples = namedtuple("MeasurementSamples", ["samples", "counts", "probabilities", "post_meas_states"])
+
+
+class POVM(Mapping):
+    def __init__(self, kraus_ops):
+        """A measurement described by Kraus operators, which can be used instead of a dict of Kraus operators.
+
+        The effects (K^dagger * K) and whether the POVM is valid are computed once, when first needed.
+
+        Parameters
+        ----------
+        kraus_ops : dict
+            Dictionary containing the Kraus operators describing the POVM as values and
+            the outcomes as keys.
+        """
+        if not isinstance(kraus_ops, dict):
+            raise TypeError("kraus_ops should be a dict")
+        for kraus_op in kraus_ops.values():
+            if not isinstance(kraus_op, Operator):
+                raise TypeError("the values of kraus_ops should be Operator")
+        self._kraus_ops = dict(kraus_ops)
+        self._effects = None
+        self._effect_arrays = None
+        self._valid = None
+
+    def __getitem__(self, outcome):
+        return self._kraus_ops[outcome]
+
+    def __iter__(self):
+        return iter(self._kraus_ops)
+
+    def __len__(self):
+        return len(self._kraus_ops)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._kraus_ops})"
+
+    @property
+    def effects(self):
+        """dict: The effect K^dagger * K of each outcome."""
+        if self._effects is None:
+            self._effects = {
+                outcome: simplify(kraus_op.dagger() * kraus_op)
+                for outcome, kraus_op in self._kraus_ops.items()
+            }
+        return self._effects
+
+    def _arrays(self):
+        """The effects as :class:`~.arrays.OperatorArrays` (or `None` if not possible), computed once."""
+        if self._effect_arrays is None:
+            self._effect_arrays = {outcome: arrays.operator_arrays(effect) for outcome, effect in self.effects.items()}
+        return self._effect_arrays
+
+    def is_valid(self, atol=1e-8):
+        """Checks (once) if the effects sum up to the identity.
+
+        This is only possible for operators with defined shape and number scalars.
+
+        Parameters
+        ----------
+        atol (optional) : float
+            The absolute tolerance of the entries of the sum.
+
+        Returns
+        -------
+        bool
+        """
+        if self._valid is None:
+            total = simplify(sum(self.effects.values(), Operator()))
+            if total.shape is None or not all(is_number(scalar) for scalar in total._terms.values()):
+                raise NotImplementedError("can only validate POVMs of operators with a shape and number scalars")
+            matrix = total.to_numpy_matrix()
+            self._valid = matrix.shape[0] == matrix.shape[1] and np.allclose(matrix, np.eye(len(matrix)), atol=atol)
+        return self._valid
+
+    def validate(self):
+        """Raises a `ValueError` if the effects do not sum up to the identity, see :meth:`~.POVM.is_valid`."""
+        if not self.is_valid():
+            raise ValueError("The effects of the Kraus operators do not sum up to the identity")
 
 
 def measure(state, kraus_ops):
@@ -18,9 +108,8 @@ def measure(state, kraus_ops):
     ----------
     state : :class:`~.states.State`
         The state to be measured.
-    kraus_ops : dict
-        Dictionary containing the Kraus operators describing the POVM as values and
-        the outcomes as keys.
+    kraus_ops : dict or :class:`~.POVM`
+        The Kraus operators describing the POVM as values and the outcomes as keys.
 
     Returns
     -------
@@ -34,24 +123,188 @@ def measure(state, kraus_ops):
     -------
     There is no check that the given Kraus operators are actually a valid POVM.
     """
-    if not isinstance(state, State):
-        raise TypeError("state should be a State")
-    if not isinstance(kraus_ops, dict):
-        raise TypeError("kraus_ops should be a dict")
+    povm = _as_povm(state, kraus_ops)
     r = random.random()
     offset = 0
-    for outcome, kraus_op in kraus_ops.items():
-        if not isinstance(kraus_op, Operator):
-            raise TypeError("the values of kraus_ops should be Operator")
-        post_state = kraus_op * state
-        p = post_state.inner_product(post_state)
-        if not is_number(p):
-            raise NotImplementedError("Cannot perform measurement when inner product are not numbers")
-        if p < 0:
-            # NOTE: should not happen
-            raise ValueError("Seems the Kraus operators does not form positive operators")
+    state_arrays = arrays.state_arrays(state)
+    for outcome, effect in povm.effects.items():
+        p = _probability(state, state_arrays, effect, povm._arrays()[outcome])
         if offset <= r <= offset + p:
-            post_state = post_state * (1 / np.sqrt(p))
+            post_state = povm[outcome] * state * (1 / np.sqrt(p))
             return MeasurementResult(outcome, p, post_state)
         offset += p
     raise ValueError("Seems the Kraus operators does not sum up to one")
+
+
+def measurement_distribution(state, kraus_ops, validate=False):
+    """Computes the probability and post-measurement state of all outcomes when measuring a state.
+
+    Parameters
+    ----------
+    state : :class:`~.states.State`
+        The state to be measured.
+    kraus_ops : dict or :class:`~.POVM`
+        The Kraus operators describing the POVM as values and the outcomes as keys.
+    validate (optional) : bool
+        Whether to check that the Kraus operators form a valid POVM, see :meth:`~.POVM.validate`.
+        The check is cached when `kraus_ops` is a :class:`~.POVM`.
+
+    Returns
+    -------
+    dict
+        With the outcomes as keys and :class:`~.MeasurementResult` as values, where the post-measurement state is
+        `None` for outcomes with zero probability.
+    """
+    povm = _as_povm(state, kraus_ops)
+    if validate:
+        povm.validate()
+    distribution = {}
+    for outcome, p in _outcome_probabilities(state, povm).items():
+        post_state = povm[outcome] * state * (1 / np.sqrt(p)) if p > 0 else None
+        distribution[outcome] = MeasurementResult(outcome, p, post_state)
+    return distribution
+
+
+def measure_many(state, kraus_ops, shots, rng=None):
+    """Measures many copies of a state with a given list of Kraus operators describing a POVM.
+
+    The probabilities of the outcomes are computed once, after which all shots are sampled at once.
+
+    Parameters
+    ----------
+    state : :class:`~.states.State`
+        The state to be measured.
+    kraus_ops : dict or :class:`~.POVM`
+        The Kraus operators describing the POVM as values and the outcomes as keys.
+    shots : int
+        The number of measurements.
+    rng (optional) : :class:`numpy.random.Generator`
+        The random number generator to use, by default a new one is created.
+
+    Returns
+    -------
+    :class:`~.MeasurementSamples`
+        The namedtuple returned contains:
+        * `samples`: Array with the outcome of each shot.
+        * `counts`: Dictionary with the number of times each outcome occurred.
+        * `probabilities`: Dictionary with the probability of each outcome.
+        * `post_meas_states`: Mapping from the outcomes with non-zero probability to the post-measurement
+          states, which are only normalized when accessed.
+    """
+    if shots < 0:
+        raise ValueError(f"shots should be non-negative, not {shots}")
+    if rng is None:
+        rng = np.random.default_rng()
+    povm = _as_povm(state, kraus_ops)
+    probabilities = _outcome_probabilities(state, povm)
+    outcomes = list(probabilities)
+    if not np.isclose(sum(probabilities.values()), 1):
+        raise ValueError("Seems the Kraus operators does not sum up to one")
+    p = np.array(list(probabilities.values()), dtype=float)
+    indices = rng.choice(len(outcomes), size=shots, p=p / p.sum())
+    outcome_array = np.empty(len(outcomes), dtype=object)
+    outcome_array[:] = outcomes
+    counts = np.bincount(indices, minlength=len(outcomes))
+
+    return MeasurementSamples(
+        samples=outcome_array[indices],
+        counts={outcome: int(count) for outcome, count in zip(outcomes, counts)},
+        probabilities=probabilities,
+        post_meas_states=_PostMeasurementStates(state, povm, probabilities),
+    )
+
+
+def _as_povm(state, kraus_ops):
+    """Checks the arguments of a measurement and converts a dict of Kraus operators to a :class:`~.POVM`."""
+    if not isinstance(state, State):
+        raise TypeError("state should be a State")
+    if isinstance(kraus_ops, POVM):
+        return kraus_ops
+    if not isinstance(kraus_ops, dict):
+        raise TypeError("kraus_ops should be a dict or POVM")
+    return POVM(kraus_ops)
+
+
+def _probability(state, state_arrays, effect, effect_arrays):
+    """Computes the probability <psi|E|psi> of the outcome with effect E, using the arrays if possible."""
+    if state_arrays is not None and effect_arrays is not None and effect._mul_compatible(state):
+        p = arrays.expectation(effect_arrays, state_arrays)
+    else:
+        p = state.inner_product(effect * state)
+    if not is_number(p):
+        raise NotImplementedError("Cannot perform measurement when inner product are not numbers")
+    p = np.real(p)
+    if p < 0:
+        if not np.isclose(p, 0):
+            # NOTE: should not happen
+            raise ValueError("Seems the Kraus operators does not form positive operators")
+        p = 0
+    return p
+
+
+def _outcome_probabilities(state, povm):
+    """Computes the probability of each outcome from the (cached) effects of a :class:`~.POVM`.
+
+    Returns
+    -------
+    dict
+        With the outcomes as keys and the probabilities as values.
+    """
+    state_arrays = arrays.state_arrays(state)
+    effect_arrays = povm._arrays()
+    return {
+        outcome: _probability(state, state_arrays, effect, effect_arrays[outcome])
+        for outcome, effect in povm.effects.items()
+    }
+
+
+class _PostMeasurementStates(Mapping):
+    def __init__(self, state, povm, probabilities):
+        """Maps outcomes (with non-zero probability) to the normalized post-measurement states,
+        which are computed when first accessed."""
+        self._state = state
+        self._povm = povm
+        self._probabilities = {outcome: p for outcome, p in probabilities.items() if p > 0}
+        self._normalized = {}
+
+    def __getitem__(self, outcome):
+        if outcome not in self._normalized:
+            p = self._probabilities[outcome]
+            self._normalized[outcome] = self._povm[outcome] * self._state * (1 / np.sqrt(p))
+        return self._normalized[outcome]
+
+    def __iter__(self):
+        return iter(self._probabilities)
+
+    def __len__(self):
+        return len(self._probabilities)
+
+
+def sweep_probabilities(state, kraus_ops, param_grid, bindings=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Computes the probabilities of the outcomes of a measurement on all points of a grid of parameters.
+
+    The probabilities are computed symbolically once and then compiled using :func:`~.numeric.lambdify`,
+    see :meth:`~.numeric.CompiledExpression.sweep` for the order of the points.
+
+    Parameters
+    ----------
+    state : :class:`~.states.State`
+        The state to be measured.
+    kraus_ops : dict or :class:`~.POVM`
+        The Kraus operators describing the POVM as values and the outcomes as keys.
+    param_grid : dict
+        The values (1D array_like) of each parameter.
+    bindings (optional) : dict
+        Maps non-number scalars to parameters or numbers, see :func:`~.numeric.lambdify`.
+    chunk_size (optional) : int
+        The number of points evaluated at once.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Of shape `(n_points, n_outcomes)`, where the columns are the outcomes in the order of `kraus_ops`.
+    """
+    povm = _as_povm(state, kraus_ops)
+    probabilities = [state.inner_product(effect * state) for effect in povm.effects.values()]
+
+    return lambdify(probabilities, bindings).sweep(param_grid, chunk_size=chunk_size).real
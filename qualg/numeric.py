@@ -0,0 +1,229 @@
+"""
+Numerical evaluation of scalars, states and operators depending on parameters.
+
+:func:`~.lambdify` compiles a scalar, state or operator into a :class:`~.CompiledExpression`, which is a
+function of the parameters (e.g. the visibility). The scalars are expanded once into polynomials of the
+parameters, such that evaluating the function for arrays of parameters (e.g. a sweep over a grid) does not
+walk the expressions again but only evaluates the monomials using numpy broadcasting.
+
+Example
+-------
+>>> f = lambdify(m, {InnerProductFunction("phi", "psi"): "visibility"})
+>>> f(visibility=np.linspace(0, 1, 10 ** 4)).shape
+(10000, 4, 4)
+>>> f.sweep({"visibility": np.linspace(0, 1, 100), "eta": np.linspace(0.5, 1, 20)}).shape
+(2000, 4, 4)
+"""
+from collections import Counter
+
+import numpy as np
+
+from qualg.scalars import is_number, Variable, AbsoluteVariable, ProductOfScalars, SumOfScalars, Scalar
+from qualg.toolbox import get_variables
+from qualg.integrate import integrate
+
+
+# The number of points evaluated at once when sweeping
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def lambdify(obj, bindings=None):
+    """Compiles a scalar, state or operator into a function of parameters.
+
+    The non-number scalars are first integrated over all their variables and should then be products and
+    sums of numbers, :class:`~.scalars.Variable`, :class:`~.scalars.AbsoluteVariable` and other scalars
+    which are bound to a parameter or number by `bindings` (e.g. :class:`~.scalars.InnerProductFunction`).
+
+    Parameters
+    ----------
+    obj : scalar or list of scalars or :class:`~.states.State` or :class:`~.operators.Operator`
+        The object to compile. States and operators need to have a defined shape.
+    bindings (optional) : dict
+        Maps scalars to the name of a parameter (str) or to a number.
+        A (conjugated) :class:`~.scalars.Variable` or :class:`~.scalars.AbsoluteVariable` which is not bound
+        uses the binding of the (unconjugated) variable, or else is the parameter with the same name as the variable.
+
+    Returns
+    -------
+    :class:`~.CompiledExpression`
+    """
+    if bindings is None:
+        bindings = {}
+    if is_number(obj) or isinstance(obj, Scalar):
+        shape = ()
+        entries = [(0, obj)]
+    elif isinstance(obj, (list, tuple)):
+        shape = (len(obj),)
+        entries = list(enumerate(obj))
+    elif hasattr(obj, "_flat_entries"):
+        shape, entries = obj._flat_entries()
+    else:
+        raise TypeError(f"cannot compile an object of type {type(obj)}")
+
+    # The coefficient of each monomial of each entry
+    monomials = {}
+    coefficients = []
+    for index, scalar in entries:
+        if len(get_variables(scalar)) > 0:
+            scalar = integrate(scalar)
+        for monomial, coefficient in _expand(scalar, bindings).items():
+            if monomial not in monomials:
+                monomials[monomial] = len(monomials)
+            coefficients.append((monomials[monomial], index, coefficient))
+
+    matrix = np.zeros((len(monomials), int(np.prod(shape))), dtype=complex)
+    for i, index, coefficient in coefficients:
+        matrix[i, index] += coefficient
+
+    return CompiledExpression(list(monomials), matrix, shape)
+
+
+class CompiledExpression:
+    def __init__(self, monomials, coefficients, shape):
+        """A scalar, state or operator compiled into a function of parameters, see :func:`~.lambdify`.
+
+        Parameters
+        ----------
+        monomials : list of tuple
+            The monomials, as tuples of ((parameter, transform), power).
+        coefficients : :class:`numpy.ndarray`
+            The coefficients of each monomial (rows) for each (flattened) entry (columns).
+        shape : tuple
+            The shape of the output for a single point, i.e. () for a scalar.
+        """
+        self._monomials = monomials
+        self._coefficients = coefficients
+        self._shape = tuple(shape)
+        self.parameters = tuple(sorted(set(name for monomial in monomials for (name, _), _ in monomial)))
+
+    @property
+    def shape(self):
+        """The shape of the output for a single point."""
+        return self._shape
+
+    def __call__(self, **parameters):
+        """Evaluates the expression.
+
+        Parameters
+        ----------
+        **parameters : number or array_like
+            The value of each parameter, which are broadcast against each other.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            Of shape `broadcast_shape + self.shape` (complex).
+        """
+        missing = set(self.parameters) - set(parameters)
+        if len(missing) > 0:
+            raise TypeError(f"missing values for the parameters {sorted(missing)}")
+        unknown = set(parameters) - set(self.parameters)
+        if len(unknown) > 0:
+            raise TypeError(f"unknown parameters {sorted(unknown)}")
+        values = {name: np.asarray(value) for name, value in parameters.items()}
+        points_shape = np.broadcast_shapes(*(value.shape for value in values.values()))
+
+        factors = {}
+        monomial_values = np.empty(points_shape + (len(self._monomials),), dtype=complex)
+        for i, monomial in enumerate(self._monomials):
+            value = np.ones(points_shape, dtype=complex)
+            for factor, power in monomial:
+                if factor not in factors:
+                    factors[factor] = _TRANSFORMS[factor[1]](values[factor[0]])
+                value = value * factors[factor] ** power
+            monomial_values[..., i] = value
+
+        return (monomial_values @ self._coefficients).reshape(points_shape + self._shape)
+
+    def sweep(self, param_grid, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Evaluates the expression on all points of a grid of parameters.
+
+        Parameters
+        ----------
+        param_grid : dict
+            The values (1D array_like) of each parameter. The points are all combinations of these values, in the
+            order of :func:`itertools.product` (i.e. the last parameter varies the fastest).
+        chunk_size (optional) : int
+            The number of points evaluated at once, which bounds the memory used for the intermediate values.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            Of shape `(n_points,) + self.shape` (complex).
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size should be at least 1, not {chunk_size}")
+        names = list(param_grid)
+        values = [np.ravel(param_grid[name]) for name in names]
+        grid_shape = tuple(len(value) for value in values)
+        num_points = int(np.prod(grid_shape))
+        output = np.empty((num_points,) + self._shape, dtype=complex)
+        for start in range(0, num_points, chunk_size):
+            stop = min(start + chunk_size, num_points)
+            # Only the points of this chunk are constructed, such that the memory is bounded by the chunk size
+            indices = np.unravel_index(np.arange(start, stop), grid_shape) if len(names) > 0 else ()
+            output[start:stop] = self(**{name: value[index] for name, value, index in zip(names, values, indices)})
+        return output
+
+
+_TRANSFORMS = {
+    "identity": lambda value: value,
+    "conjugate": np.conj,
+    "absolute_squared": lambda value: np.abs(value) ** 2,
+}
+
+
+def _factor(scalar, bindings):
+    """The factor (parameter, transform) or number an atomic scalar is evaluated to."""
+    if scalar in bindings:
+        value = bindings[scalar]
+        if is_number(value):
+            return value
+        return (value, "identity")
+    if isinstance(scalar, Variable):
+        transform = "conjugate" if scalar._conjugate else "identity"
+    elif isinstance(scalar, AbsoluteVariable):
+        transform = "absolute_squared"
+    else:
+        raise ValueError(f"no binding for the scalar {scalar}")
+    # The conjugate and absolute value of a variable which is not bound itself use the binding of the variable
+    value = bindings.get(Variable(scalar._variable), str(scalar._variable))
+    if is_number(value):
+        return complex(_TRANSFORMS[transform](value))
+    return (value, transform)
+
+
+def _expand(scalar, bindings):
+    """Expands a scalar into a polynomial of the parameters.
+
+    Returns
+    -------
+    dict
+        Mapping monomials (tuple of ((parameter, transform), power)) to coefficients.
+    """
+    if is_number(scalar):
+        return {(): scalar}
+    if isinstance(scalar, SumOfScalars):
+        polynomial = Counter()
+        for term in scalar._terms:
+            polynomial.update(_expand(term, bindings))
+        return dict(polynomial)
+    if isinstance(scalar, ProductOfScalars):
+        polynomial = {(): 1}
+        for factor in scalar._factors:
+            polynomial = _multiply(polynomial, _expand(factor, bindings))
+        return polynomial
+    factor = _factor(scalar, bindings)
+    if is_number(factor):
+        return {(): factor}
+    return {((factor, 1),): 1}
+
+
+def _multiply(polynomial1, polynomial2):
+    product = Counter()
+    for monomial1, coefficient1 in polynomial1.items():
+        for monomial2, coefficient2 in polynomial2.items():
+            powers = Counter(dict(monomial1))
+            powers.update(dict(monomial2))
+            product[tuple(sorted(powers.items()))] += coefficient1 * coefficient2
+    return dict(product)
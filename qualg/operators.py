@@ -9,18 +9,30 @@ where left and right are :class:`~.states.BaseState`'s. The :class:`~.BaseOperat
 agnostic to which subclass of :class:`~.states.BaseState` is used.
 
 The :class:`~.Operator`-class is then a sum of :class:`~.BaseOperator`.
+
+A :class:`~.LocalOperator` (see :meth:`~.Operator.on`) is an operator on some of the qudits of
+:class:`~.q_state.BaseQuditState`'s, tensored with the identity on the other qudits, which is applied to
+states without expanding it to all qudits.
 """
 
+import itertools
 import numpy as np
 from collections import defaultdict
+from scipy import sparse
 
-from qualg.scalars import is_scalar, is_number
-from qualg.states import BaseState, State
-from qualg.toolbox import assert_list_or_tuple, simplify, replace_var, get_variables, is_zero
+from qualg import arrays, parallel
+from qualg.scalars import is_scalar, to_numbers, SumOfScalars
+from qualg.states import BaseState, State, non_orthogonal_pairs, _simplify_terms
+from qualg.q_state import BaseQuditState
+from qualg.toolbox import assert_list_or_tuple, replace_var, get_variables, is_zero
 from qualg.integrate import integrate
+from qualg.numeric import lambdify, DEFAULT_CHUNK_SIZE
+from qualg.profiling import profiled
 
 
 class BaseOperator:
+    __slots__ = ("_left", "_right", "_hash")
+
     def __init__(self, left, right):
         r"""Represents a single term of an operator, i.e. \|left><right\|,
         where left and right are :class:`~.states.BaseState`'s.
@@ -36,6 +48,7 @@ class BaseOperator:
             raise TypeError(f"Both left and right should be of type BaseState, not {type(left)} or {type(right)}")
         self._left = left
         self._right = right
+        self._hash = hash(self._key())
 
     def _key(self):
         return (self._left, self._right)
@@ -46,7 +59,15 @@ class BaseOperator:
         return self._key() == other._key()
 
     def __hash__(self):
-        return hash(self._key())
+        return self._hash
+
+    def __copy__(self):
+        # Immutable
+        return self
+
+    def __reduce__(self):
+        # The hash is not pickled since hashes of strings differ between processes
+        return (self.__class__, self._key())
 
     def __mul__(self, other):
         if not isinstance(other, State):
@@ -54,8 +75,8 @@ class BaseOperator:
         if not self._mul_compatible(other):
             raise TypeError(f"other ({other}) is not multiplication compatible with self ({self})")
         new_state = State([])
-        for base_state, scalar in other._terms.items():
-            new_state._terms[self._left] += self._right.inner_product(base_state) * scalar
+        for _, base_state in non_orthogonal_pairs([self._right], other._terms):
+            new_state._terms[self._left] += self._right.inner_product(base_state) * other._terms[base_state]
 
         return new_state
 
@@ -71,6 +92,8 @@ class BaseOperator:
 
         `None` means that the shape is undefined, e.g. if the state is infinite-dimensional.
         """
+        if self._left.shape is None or self._right.shape is None:
+            return None
         return (self._left.shape[0], self._right.shape[0])
 
     def _mul_compatible(self, other):
@@ -121,6 +144,8 @@ class BaseOperator:
 
 
 class Operator:
+    __slots__ = ("_terms",)
+
     def __init__(self, base_ops=None, scalars=None):
         """
         An operator represented as a sum of :class:`~.BaseOperator` of a subclass thereof.
@@ -154,13 +179,13 @@ class Operator:
                 raise TypeError(f"elements of scalars should be instances of Scalar, not {type(op_term)}")
             self._terms[op_term] += scalar
 
-        base_ops = list(self._terms.keys())
-        # Check that all base_ops are pairwise compatible
-        for i, bo1 in enumerate(base_ops):
-            for j in range(i + 1, len(base_ops)):
-                bo2 = base_ops[j]
-                if not bo1._add_compatible(bo2):
-                    raise ValueError(f"Base operators {bo1} and {bo2} are not compatible terms")
+        # Check that all base_ops are compatible, since compatibility is an equivalence relation
+        # (e.g. same number of qubits) it's enough to compare to the first
+        base_ops = iter(self._terms.keys())
+        bo1 = next(base_ops, None)
+        for bo2 in base_ops:
+            if not bo1._add_compatible(bo2):
+                raise ValueError(f"Base operators {bo1} and {bo2} are not compatible terms")
 
     def _key(self):
         return set((base_op, scalar) for base_op, scalar in self._terms.items())
@@ -185,12 +210,23 @@ class Operator:
         return NotImplemented
 
     def _mul_state(self, state):
-        # compute output state for each term of the operator
+        self_arrays = arrays.operator_arrays(self)
+        if self_arrays is not None:
+            state_arrays = arrays.state_arrays(state)
+            if state_arrays is not None:
+                return State._from_arrays(arrays.mul_state(self_arrays, state_arrays))
+        # compute output state for each term of the operator, only for the pairs of base states which
+        # are not orthogonal
         new_state = State([])
-        for base_op, scalar in self._terms.items():
-            if is_zero(scalar):
+        self_by_right = _group_terms(self, by_right=True)
+        for right, base_state in non_orthogonal_pairs(self_by_right, state._terms):
+            inner = right.inner_product(base_state) * state._terms[base_state]
+            if is_zero(inner):
                 continue
-            new_state += scalar * (base_op * state)
+            for left, scalar in self_by_right[right]:
+                new_state._terms[left] += scalar * inner
+
+        new_state._prune_zero_terms()
 
         return new_state
 
@@ -201,21 +237,31 @@ class Operator:
 
         return new_op
 
+    @profiled("Operator._mul_operator")
     def _mul_operator(self, operator):
+        self_arrays = arrays.operator_arrays(self)
+        if self_arrays is not None:
+            other_arrays = arrays.operator_arrays(operator)
+            if other_arrays is not None:
+                return Operator._from_arrays(arrays.mul_operator(self_arrays, other_arrays))
+        # Group the terms by the base states that are contracted, such that the inner product
+        # of each pair of base states is only computed once (and zero ones skipped)
+        self_by_right = _group_terms(self, by_right=True)
+        other_by_left = _group_terms(operator, by_right=False)
+        pairs = [
+            (self_right, self_by_right[self_right], other_left, other_by_left[other_left])
+            for self_right, other_left in non_orthogonal_pairs(self_by_right, other_by_left)
+        ]
+        contracted = defaultdict(list)
+        for partial in parallel.map_chunks(_contract_pairs, pairs):
+            for base_op, scalars in partial.items():
+                contracted[base_op] += scalars
+
+        # Integrate out variables which are not in base operator, once per output term
+        # TODO, should this be optional?
         new_op = Operator()
-        for self_base_op, self_scalar in self._terms.items():
-            for other_base_op, other_scalar in operator._terms.items():
-                new_base_op = BaseOperator(self_base_op._left, other_base_op._right)
-                new_scalar = self_base_op._right.inner_product(other_base_op._left) * self_scalar * other_scalar
-
-                # Integrate out variables which are not in base operator
-                # TODO, should this be optional?
-                scalar_variables = get_variables(new_scalar) - get_variables(new_base_op)
-                new_scalar = integrate(new_scalar, scalar_variables)
-
-                if is_zero(new_scalar):
-                    continue
-                new_op._terms[new_base_op] += new_scalar
+        for partial in parallel.map_chunks(_integrate_terms, list(contracted.items())):
+            new_op._terms.update(partial)
 
         return new_op
 
@@ -281,13 +327,25 @@ class Operator:
             new_op._terms[new_base_op] += new_scalar
         return new_op
 
+    def conjugate_by(self, u):
+        """
+        Conjugates the operator by another, i.e. computes U^dagger * self * U, see :func:`~.sandwich`.
+        """
+        return sandwich(u, self)
+
+    def on(self, targets, num_qudits=None):
+        """
+        The operator acting on the given qudits (positions) of qudit states, see :class:`~.LocalOperator`.
+        """
+        return LocalOperator(self, targets, num_qudits=num_qudits)
+
     def simplify(self):
         """
         Tries to simplify the operator, returning a new one.
         """
         new_op = Operator()
-        for base_op, scalar in self._terms.items():
-            new_op._terms[base_op] = simplify(scalar)
+        for partial in parallel.map_chunks(_simplify_terms, list(self._terms.items())):
+            new_op._terms.update(partial)
 
         new_op._prune_zero_terms()
 
@@ -317,11 +375,12 @@ class Operator:
         return vars
 
     def to_numpy_matrix(self, convert_scalars=None, **kwargs):
-        """Converts the operator to a numpy matrix.
+        """Converts the operator to a (complex) numpy matrix.
 
         If there are non-number scalars then the provided function `convert_scalars`
         is used to convert a non-number scalar to a number.
         This function should then take a scalar (plus optional keyword arguments) and return a number.
+        The function is called once for each unique scalar.
 
         Parameters
         ----------
@@ -335,18 +394,92 @@ class Operator:
         :class:`numpy.ndarray`
             The operator in numerical matrix form.
         """
-        matrix = np.zeros(self.shape)
-        for base_op, scalar in self:
-            index = base_op._matrix_index()
-            if not is_number(scalar):
-                if convert_scalars is None:
-                    raise ValueError("If the operator contains non-numbers, "
-                                     "the function `convert_scalars` needs to be provided")
-                scalar = convert_scalars(scalar, **kwargs)
-            matrix[index] = scalar
+        rows, cols, values = self._matrix_entries(convert_scalars, **kwargs)
+        matrix = np.zeros(self.shape, dtype=complex)
+        matrix[rows, cols] = values
 
         return matrix
 
+    def to_sparse_matrix(self, convert_scalars=None, format="csr", **kwargs):
+        """Converts the operator to a (complex) sparse matrix.
+
+        See :meth:`~.Operator.to_numpy_matrix` for how non-number scalars are handled.
+
+        Parameters
+        ----------
+        convert_scalars : function
+            Function to convert a non-number scalar to a number.
+        format (optional) : str
+            The sparse format of the matrix, e.g. "csr" (default) or "coo".
+        **kwargs:
+            Keyword-arguments to be passed to `convert_scalars`.
+
+        Returns
+        -------
+        :class:`scipy.sparse.spmatrix`
+            The operator in numerical sparse matrix form.
+        """
+        rows, cols, values = self._matrix_entries(convert_scalars, **kwargs)
+        matrix = sparse.coo_matrix((np.array(values, dtype=complex), (rows, cols)), shape=self.shape)
+
+        return matrix.asformat(format)
+
+    def sweep(self, param_grid, bindings=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Evaluates the operator as a matrix on all points of a grid of parameters.
+
+        The operator is compiled once using :func:`~.numeric.lambdify`, see also
+        :meth:`~.numeric.CompiledExpression.sweep`.
+
+        Parameters
+        ----------
+        param_grid : dict
+            The values (1D array_like) of each parameter.
+        bindings (optional) : dict
+            Maps non-number scalars to parameters or numbers, see :func:`~.numeric.lambdify`.
+        chunk_size (optional) : int
+            The number of points evaluated at once.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            Of shape `(n_points, d, d)` (complex).
+        """
+        return lambdify(self, bindings).sweep(param_grid, chunk_size=chunk_size)
+
+    def _matrix_entries(self, convert_scalars=None, **kwargs):
+        """Returns the row indices, column indices and values (numbers) of the terms."""
+        if self.shape is None:
+            raise ValueError("Cannot convert an operator with undefined shape to a matrix")
+        base_ops = list(self._terms.keys())
+        values = to_numbers([self._terms[base_op] for base_op in base_ops], convert_scalars, **kwargs)
+        indices = [base_op._matrix_index() for base_op in base_ops]
+        rows = np.array([index[0] for index in indices], dtype=int)
+        cols = np.array([index[1] for index in indices], dtype=int)
+
+        return rows, cols, values
+
+    def _flat_entries(self):
+        """Returns the shape and the (flattened index, scalar) of each term (used by :func:`~.numeric.lambdify`)."""
+        if self.shape is None:
+            raise ValueError("Cannot convert an operator with undefined shape to a matrix")
+        num_cols = self.shape[1]
+        entries = []
+        for base_op, scalar in self._terms.items():
+            row, col = base_op._matrix_index()
+            entries.append((row * num_cols + col, scalar))
+        return self.shape, entries
+
+    @classmethod
+    def _from_arrays(cls, operator_arrays):
+        """Constructs an operator from :class:`~.arrays.OperatorArrays`."""
+        new_op = cls()
+        left, right = operator_arrays.left, operator_arrays.right
+        for row, col, amplitude in zip(operator_arrays.rows.tolist(), operator_arrays.cols.tolist(),
+                                       operator_arrays.amplitudes.tolist()):
+            new_op._terms[BaseOperator(left._from_vector_index(row), right._from_vector_index(col))] = amplitude
+
+        return new_op
+
     def _prune_zero_terms(self):
         to_remove = []
         for base_op, scalar in list(self._terms.items()):
@@ -361,7 +494,7 @@ class Operator:
 
         For example if they act on the same number of qubits.
         """
-        if isinstance(other, self.__class__) or isinstance(other, State):
+        if isinstance(other, (Operator, State)):
             if len(self) == 0 or len(other) == 0:
                 return True
 
@@ -378,7 +511,7 @@ class Operator:
 
         For example if they act on the same number of qubits.
         """
-        if not isinstance(other, self.__class__):
+        if not isinstance(other, Operator):
             return False
         if len(self) == 0 or len(other) == 0:
             return True
@@ -389,6 +522,142 @@ class Operator:
         return self_term._add_compatible(other_term)
 
 
+def _group_terms(operator, by_right):
+    """Groups the terms of an operator by the right (or left) base states.
+
+    Returns a dictionary with the base states as keys and lists of the other base state and scalar as values.
+    """
+    groups = defaultdict(list)
+    for base_op, scalar in operator._terms.items():
+        if is_zero(scalar):
+            continue
+        if by_right:
+            groups[base_op._right].append((base_op._left, scalar))
+        else:
+            groups[base_op._left].append((base_op._right, scalar))
+
+    return groups
+
+
+def _contract_pairs(pairs):
+    """Contracts pairs of groups of terms (see :func:`~._group_terms`) of two operators.
+
+    Returns a dictionary with the new base operators as keys and lists of the scalars to sum as values.
+    """
+    contracted = defaultdict(list)
+    for self_right, self_group, other_left, other_group in pairs:
+        inner = self_right.inner_product(other_left)
+        if is_zero(inner):
+            continue
+        for left, self_scalar in self_group:
+            for right, other_scalar in other_group:
+                contracted[BaseOperator(left, right)].append(inner * self_scalar * other_scalar)
+
+    return contracted
+
+
+def _integrate_terms(terms):
+    """Sums the scalars of each base operator and integrates out the variables not in the base operator.
+
+    Returns a list of the base operators and scalars, where the scalar is non-zero.
+    """
+    new_terms = []
+    for base_op, scalars in terms:
+        scalar = scalars[0] if len(scalars) == 1 else SumOfScalars(scalars)
+        scalar_variables = get_variables(scalar) - get_variables(base_op)
+        scalar = integrate(scalar, scalar_variables)
+        if not is_zero(scalar):
+            new_terms.append((base_op, scalar))
+
+    return new_terms
+
+
+def sandwich(u, projectors):
+    """Computes U^dagger * P * U for one or more operators P (e.g. the projectors of a measurement).
+
+    The result is the same as `u.dagger() * p * replace_var(u)`, i.e. the variables of the two
+    occurrences of U are integrated separately, but computed in a single pass: the inner products
+    of both sides are contracted together and each output term is integrated once, without
+    constructing U^dagger * P.
+    The inner products between the base states of U and of the projectors are shared among the projectors.
+
+    Parameters
+    ----------
+    u : :class:`~.Operator`
+        The operator to conjugate by.
+    projectors : :class:`~.Operator` or list of :class:`~.Operator`
+        The operator(s) to conjugate.
+
+    Returns
+    -------
+    :class:`~.Operator` or list of :class:`~.Operator`
+        U^dagger * P * U for each P, a list if `projectors` is a list.
+    """
+    if isinstance(projectors, Operator):
+        return sandwich(u, [projectors])[0]
+    assert_list_or_tuple(projectors)
+    for p in projectors:
+        if not isinstance(p, Operator):
+            raise TypeError(f"projectors should be of type Operator, not {type(p)}")
+        if not p._mul_compatible(u):
+            raise ValueError(f"operator {p} not multiplication compatible with {u}")
+    if arrays.operator_arrays(u) is not None:
+        if all(arrays.operator_arrays(p) is not None for p in projectors):
+            # No variables, so the products are computed using arrays
+            u_dagger = u.dagger()
+            return [u_dagger * p * u for p in projectors]
+
+    u_by_left = _group_terms(u, by_right=False)
+    u_right_by_left = _group_terms(replace_var(u), by_right=False)
+    left_contractions = {}
+    right_contractions = {}
+
+    # The contractions of U with the base states of the projectors are integrated over the variables
+    # of U (but not of the projector), such that they are computed once for all the terms and projectors
+    def contract_left(base_state):
+        # Terms of U^dagger * |base_state> as pairs of the left base state and scalar
+        if base_state not in left_contractions:
+            contracted = defaultdict(list)
+            for u_left, _ in non_orthogonal_pairs(u_by_left, [base_state]):
+                inner = u_left.inner_product(base_state)
+                if not is_zero(inner):
+                    for right, scalar in u_by_left[u_left]:
+                        contracted[BaseOperator(right, base_state)].append(scalar.conjugate() * inner)
+            terms = _integrate_terms(list(contracted.items()))
+            left_contractions[base_state] = [(base_op._left, scalar) for base_op, scalar in terms]
+        return left_contractions[base_state]
+
+    def contract_right(base_state):
+        # Terms of <base_state| * U as pairs of the right base state and scalar
+        if base_state not in right_contractions:
+            contracted = defaultdict(list)
+            for _, u_left in non_orthogonal_pairs([base_state], u_right_by_left):
+                inner = base_state.inner_product(u_left)
+                if not is_zero(inner):
+                    for right, scalar in u_right_by_left[u_left]:
+                        contracted[BaseOperator(base_state, right)].append(inner * scalar)
+            terms = _integrate_terms(list(contracted.items()))
+            right_contractions[base_state] = [(base_op._right, scalar) for base_op, scalar in terms]
+        return right_contractions[base_state]
+
+    new_ops = []
+    for p in projectors:
+        contracted = defaultdict(list)
+        for base_op, p_scalar in p._terms.items():
+            if is_zero(p_scalar):
+                continue
+            right_terms = contract_right(base_op._right)
+            for left, left_scalar in contract_left(base_op._left):
+                for right, right_scalar in right_terms:
+                    contracted[BaseOperator(left, right)].append(left_scalar * p_scalar * right_scalar)
+        new_op = Operator()
+        for partial in parallel.map_chunks(_integrate_terms, list(contracted.items())):
+            new_op._terms.update(partial)
+        new_ops.append(new_op)
+
+    return new_ops
+
+
 def outer_product(left, right):
     r"""Creates an opertor based on the outer product of left and right, i.e. \|left><right\|.
 
@@ -412,3 +681,253 @@ def outer_product(left, right):
             base_ops.append(BaseOperator(l_base_state, r_base_state))
 
     return Operator(base_ops, scalars)
+
+
+class LocalOperator:
+    __slots__ = ("_op", "_targets", "_num_qudits", "_base", "_by_right")
+
+    def __init__(self, op, targets, num_qudits=None):
+        """
+        An operator acting on some of the qudits of :class:`~.q_state.BaseQuditState`'s, i.e. `op` tensored
+        with the identity on the other qudits.
+
+        Multiplying a state only maps the digits at the targets of each term, such that the time is
+        proportional to the number of terms of the state and not the dimension of all qudits.
+        The operator on all qudits is only constructed by :meth:`~.LocalOperator.to_operator` and
+        :meth:`~.LocalOperator.to_sparse_matrix`.
+
+        Parameters
+        ----------
+        op : :class:`~.Operator`
+            Operator on `len(targets)` qudits, where the i-th qudit is the qudit at `targets[i]`.
+        targets : int or list of int
+            The positions of the qudits (from 0) the operator acts on.
+        num_qudits (optional) : int
+            The total number of qudits. If `None`, the operator acts on states of any number of qudits
+            (larger than the targets) but has no defined shape.
+        """
+        if not isinstance(op, Operator):
+            raise TypeError(f"op should be an Operator, not {type(op)}")
+        if isinstance(targets, int):
+            targets = [targets]
+        targets = tuple(targets)
+        if not all(isinstance(target, int) and target >= 0 for target in targets):
+            raise ValueError(f"targets should be non-negative integers, not {targets}")
+        if len(set(targets)) != len(targets):
+            raise ValueError(f"targets should be distinct, not {targets}")
+        if num_qudits is not None and any(target >= num_qudits for target in targets):
+            raise ValueError(f"targets {targets} are not all smaller than the number of qudits {num_qudits}")
+        base = None
+        for base_op in op._terms:
+            for base_state in (base_op._left, base_op._right):
+                if not isinstance(base_state, BaseQuditState):
+                    raise TypeError(f"op should act on qudit states, not {type(base_state)}")
+                if len(base_state) != len(targets):
+                    raise ValueError(f"op acts on {len(base_state)} qudits but there are {len(targets)} targets")
+            base = base_op._left._base
+        self._op = op
+        self._targets = targets
+        self._num_qudits = num_qudits
+        self._base = base
+        self._by_right = {right._digits: [(left._digits, scalar) for left, scalar in terms]
+                          for right, terms in _group_terms(op, by_right=True).items()}
+
+    def __mul__(self, other):
+        if isinstance(other, State):
+            return self._mul_state(other)
+        elif isinstance(other, LocalOperator):
+            return self._mul_local_operator(other)
+        elif is_scalar(other):
+            return LocalOperator(self._op * other, self._targets, num_qudits=self._num_qudits)
+        return NotImplemented
+
+    def __rmul__(self, other):
+        if is_scalar(other):
+            return LocalOperator(self._op * other, self._targets, num_qudits=self._num_qudits)
+        return NotImplemented
+
+    def __matmul__(self, other):
+        """Tensor product of local operators acting on disjoint qudits."""
+        if not isinstance(other, LocalOperator):
+            return NotImplemented
+        if len(set(self._targets) & set(other._targets)) > 0:
+            raise ValueError(f"targets {self._targets} and {other._targets} are not disjoint")
+        new_op = Operator()
+        for base_op1, scalar1 in self._op._terms.items():
+            for base_op2, scalar2 in other._op._terms.items():
+                left = base_op1._left.tensor_product(base_op2._left)
+                right = base_op1._right.tensor_product(base_op2._right)
+                new_op._terms[BaseOperator(left, right)] += scalar1 * scalar2
+        return LocalOperator(new_op, self._targets + other._targets, num_qudits=self._joint_num_qudits(other))
+
+    def __add__(self, other):
+        if other == 0:
+            return self
+        if not isinstance(other, LocalOperator):
+            raise ValueError(f"local operator not addition compatible with {other}")
+        targets = self._joint_targets(other)
+        return LocalOperator(self._extend(targets) + other._extend(targets), targets,
+                             num_qudits=self._joint_num_qudits(other))
+
+    def __radd__(self, other):
+        return self + other
+
+    def __len__(self):
+        return len(self._op)
+
+    def __str__(self):
+        return f"({self._op}) on {list(self._targets)}"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({repr(self._op)}, {repr(list(self._targets))}, {repr(self._num_qudits)})"
+
+    @property
+    def targets(self):
+        """The positions of the qudits the operator acts on."""
+        return self._targets
+
+    @property
+    def shape(self):
+        """The shape of the operator on all qudits, `None` if the number of qudits is not given."""
+        if self._num_qudits is None or self._base is None:
+            return None
+        dimension = self._base ** self._num_qudits
+        return (dimension, dimension)
+
+    def dagger(self):
+        """
+        Complex conjugate of the operator.
+        """
+        return LocalOperator(self._op.dagger(), self._targets, num_qudits=self._num_qudits)
+
+    def to_operator(self):
+        """Expands the local operator to an :class:`~.Operator` on all qudits.
+
+        Returns
+        -------
+        :class:`~.Operator`
+        """
+        if self._num_qudits is None:
+            raise ValueError("Cannot expand a local operator without the number of qudits")
+        return self._extend(tuple(range(self._num_qudits)))
+
+    def to_numpy_matrix(self, convert_scalars=None, **kwargs):
+        """Converts the operator on all qudits to a (complex) numpy matrix, see :meth:`~.Operator.to_numpy_matrix`."""
+        return self.to_sparse_matrix(convert_scalars, **kwargs).toarray()
+
+    def to_sparse_matrix(self, convert_scalars=None, format="csr", **kwargs):
+        """Converts the operator on all qudits to a (complex) sparse matrix.
+
+        The matrix is the Kronecker product of the matrix of `op` with the identity on the other qudits,
+        permuted to the targets, which is constructed from the entries of `op` without going through the
+        base states of all qudits. See :meth:`~.Operator.to_numpy_matrix` for how non-number scalars are handled.
+
+        Parameters
+        ----------
+        convert_scalars : function
+            Function to convert a non-number scalar to a number.
+        format (optional) : str
+            The sparse format of the matrix, e.g. "csr" (default) or "coo".
+        **kwargs:
+            Keyword-arguments to be passed to `convert_scalars`.
+
+        Returns
+        -------
+        :class:`scipy.sparse.spmatrix`
+        """
+        if self.shape is None:
+            raise ValueError("Cannot convert an operator with undefined shape to a matrix")
+        local_rows, local_cols, local_values = self._op._matrix_entries(convert_scalars, **kwargs)
+        others = [i for i in range(self._num_qudits) if i not in self._targets]
+        local_offsets = _index_offsets(self._targets, self._num_qudits, self._base)
+        other_offsets = _index_offsets(others, self._num_qudits, self._base)
+        rows = (local_offsets[local_rows][:, None] + other_offsets[None, :]).ravel()
+        cols = (local_offsets[local_cols][:, None] + other_offsets[None, :]).ravel()
+        values = np.repeat(np.array(local_values, dtype=complex), len(other_offsets))
+        matrix = sparse.coo_matrix((values, (rows, cols)), shape=self.shape)
+
+        return matrix.asformat(format)
+
+    def _mul_state(self, state):
+        targets = self._targets
+        new_state = State([])
+        for base_state, amplitude in state._terms.items():
+            self._assert_acts_on(base_state)
+            digits = base_state._digits
+            terms = self._by_right.get("".join(digits[target] for target in targets))
+            if terms is None:
+                continue
+            for left, scalar in terms:
+                new_digits = list(digits)
+                for target, digit in zip(targets, left):
+                    new_digits[target] = digit
+                new_state._terms[base_state._with_digits("".join(new_digits))] += scalar * amplitude
+
+        new_state._prune_zero_terms()
+
+        return new_state
+
+    def _mul_local_operator(self, other):
+        targets = self._joint_targets(other)
+        return LocalOperator(self._extend(targets) * other._extend(targets), targets,
+                             num_qudits=self._joint_num_qudits(other))
+
+    def _joint_targets(self, other):
+        """The targets of self followed by the other targets of other."""
+        if None not in (self._base, other._base) and self._base != other._base:
+            raise ValueError(f"local operators act on qudits of different bases ({self._base} and {other._base})")
+        return self._targets + tuple(target for target in other._targets if target not in self._targets)
+
+    def _joint_num_qudits(self, other):
+        if self._num_qudits is None:
+            return other._num_qudits
+        if other._num_qudits is not None and other._num_qudits != self._num_qudits:
+            raise ValueError(f"local operators act on different numbers of qudits "
+                             f"({self._num_qudits} and {other._num_qudits})")
+        return self._num_qudits
+
+    def _extend(self, targets):
+        """The operator tensored with the identity on the qudits in `targets` which are not targeted by self,
+        as an operator on the qudits `targets` (in that order)."""
+        if targets == self._targets or len(self._op) == 0:
+            return self._op
+        positions = [targets.index(target) for target in self._targets]
+        others = [i for i, target in enumerate(targets) if target not in self._targets]
+        extended = Operator()
+        for other_digits in itertools.product(range(self._base), repeat=len(others)):
+            new_digits = [None] * len(targets)
+            for i, digit in zip(others, other_digits):
+                new_digits[i] = str(digit)
+            for base_op, scalar in self._op._terms.items():
+                left_digits = list(new_digits)
+                right_digits = list(new_digits)
+                for i, left, right in zip(positions, base_op._left._digits, base_op._right._digits):
+                    left_digits[i] = left
+                    right_digits[i] = right
+                left = base_op._left._with_digits("".join(left_digits))
+                right = base_op._right._with_digits("".join(right_digits))
+                extended._terms[BaseOperator(left, right)] += scalar
+
+        return extended
+
+    def _assert_acts_on(self, base_state):
+        if not isinstance(base_state, BaseQuditState):
+            raise TypeError(f"local operators act on qudit states, not {type(base_state)}")
+        if self._base is not None and base_state._base != self._base:
+            raise ValueError(f"local operator acts on qudits of base {self._base}, not {base_state._base}")
+        if self._num_qudits is not None and len(base_state) != self._num_qudits:
+            raise ValueError(f"local operator acts on {self._num_qudits} qudits, not {len(base_state)}")
+        if len(base_state) <= max(self._targets, default=-1):
+            raise ValueError(f"targets {self._targets} are not all qudits of {base_state}")
+
+
+def _index_offsets(positions, num_qudits, base):
+    """The contribution to the vector index of all qudits of each assignment of digits to the qudits at
+    `positions`, where the assignments are ordered by their index as a number (in the order of `positions`)."""
+    indices = np.arange(base ** len(positions))
+    offsets = np.zeros(len(indices), dtype=int)
+    for j, position in enumerate(positions):
+        digits = (indices // base ** (len(positions) - 1 - j)) % base
+        offsets += digits * base ** (num_qudits - 1 - position)
+
+    return offsets
@@ -0,0 +1,92 @@
+"""
+Opt-in parallel computation of products and simplification.
+
+When an executor is set (see :func:`~.set_executor` or :func:`~.using_executor`), products of
+operators, :meth:`~.operators.Operator.simplify`, :meth:`~.states.State.simplify` and
+:meth:`~.states.State.inner_product` split their (independent) terms into chunks which are
+computed by the executor, for example a :class:`concurrent.futures.ProcessPoolExecutor`.
+The partial results are merged in order, such that the result is the same as when computed serially.
+
+Note
+----
+The caches (see :mod:`~.cache`) and the tracking (see :mod:`~.profiling`) are local to each process,
+so when using a process pool, the work done by the workers is not cached or tracked by the main process.
+"""
+import os
+from contextlib import contextmanager
+
+_EXECUTOR = None
+_NUM_CHUNKS = None
+_MIN_ITEMS = 64
+
+
+def set_executor(executor, num_chunks=None, min_items=64):
+    """Sets the executor to use for the computations, or `None` to compute serially.
+
+    Parameters
+    ----------
+    executor : None or :class:`concurrent.futures.Executor`
+        The executor to submit the chunks to.
+    num_chunks (optional) : None or int
+        The number of chunks to split the terms into. If `None`, the number of CPUs is used.
+    min_items (optional) : int
+        Computations with less terms than this are computed serially, since then the overhead
+        of sending the terms to the workers is larger than the gain.
+    """
+    global _EXECUTOR, _NUM_CHUNKS, _MIN_ITEMS
+    if num_chunks is not None and num_chunks < 1:
+        raise ValueError(f"num_chunks should be positive, not {num_chunks}")
+    _EXECUTOR = executor
+    _NUM_CHUNKS = num_chunks
+    _MIN_ITEMS = min_items
+
+
+def get_executor():
+    """Returns the executor currently used, or `None` if computing serially."""
+    return _EXECUTOR
+
+
+@contextmanager
+def using_executor(executor, num_chunks=None, min_items=64):
+    """Context manager which sets the executor within its scope (see :func:`~.set_executor`).
+
+    Example
+    -------
+    >>> from concurrent.futures import ProcessPoolExecutor
+    >>> with ProcessPoolExecutor() as executor, using_executor(executor):
+    ...     m = u.dagger() * p * replace_var(u)
+    """
+    previous = (_EXECUTOR, _NUM_CHUNKS, _MIN_ITEMS)
+    set_executor(executor, num_chunks=num_chunks, min_items=min_items)
+    try:
+        yield
+    finally:
+        set_executor(*previous)
+
+
+def map_chunks(function, items):
+    """Applies a function to contiguous chunks of a list of items.
+
+    If no executor is set or the there are few items, the function is applied to all
+    the items at once in the current process.
+
+    Parameters
+    ----------
+    function : callable
+        Taking a list of items. Needs to be picklable, i.e. a module-level function,
+        if the executor uses other processes.
+    items : list
+        The items to split into chunks.
+
+    Returns
+    -------
+    list
+        The results of the function for each chunk, in order.
+    """
+    executor = _EXECUTOR
+    if executor is None or len(items) < max(_MIN_ITEMS, 2):
+        return [function(items)]
+    num_chunks = min(_NUM_CHUNKS or os.cpu_count() or 1, len(items))
+    chunk_size = -(-len(items) // num_chunks)
+    chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+    return list(executor.map(function, chunks))
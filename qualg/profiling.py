@@ -0,0 +1,153 @@
+"""
+Opt-in instrumentation of the symbolic computations.
+
+Within :func:`~.track`, calls to the instrumented functions (e.g. :func:`~.toolbox.simplify`,
+:func:`~.integrate.integrate` and products of operators) are counted together with their (inclusive)
+wall time and the size of their input and output expressions.
+Furthermore, for each integration rule (see :func:`~.integrate.register_integration_rule`), identified by its
+qualified name (e.g. "qualg.integrate._evaluate_delta_function"), it is recorded how often it is tried, how often it
+fires and how much it shrinks the integral.
+When not tracking, the instrumented functions only check a global before being called.
+
+Example
+-------
+>>> from qualg.profiling import track
+>>> with track() as tracker:
+...     m = u.dagger() * p * replace_var(u)
+>>> print(tracker.report())
+"""
+import functools
+from collections import defaultdict
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+_TRACKER = None
+
+
+class CallStats:
+    def __init__(self):
+        """Statistics of the calls to an instrumented function."""
+        self.calls = 0
+        self.time = 0
+        self.size_in = 0
+        self.size_out = 0
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(calls={self.calls}, time={self.time}, "
+                f"size_in={self.size_in}, size_out={self.size_out})")
+
+
+class RuleStats:
+    def __init__(self):
+        """Statistics of an integration rule (see :func:`~.integrate.register_integration_rule`).
+
+        The sizes are summed over the times the rule fired.
+        """
+        self.calls = 0
+        self.fired = 0
+        self.time = 0
+        self.size_in = 0
+        self.size_out = 0
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(calls={self.calls}, fired={self.fired}, time={self.time}, "
+                f"size_in={self.size_in}, size_out={self.size_out})")
+
+
+class Tracker:
+    def __init__(self):
+        """Collects the statistics while tracking, see :func:`~.track`."""
+        self.calls = defaultdict(CallStats)
+        self.rules = defaultdict(RuleStats)
+
+    def report(self):
+        """Returns a table of the statistics as a string."""
+        lines = [f"{'function':<32}{'calls':>10}{'time (s)':>12}{'mean size in':>14}{'mean size out':>15}"]
+        for name, stats in sorted(self.calls.items(), key=lambda item: -item[1].time):
+            lines.append(f"{name:<32}{stats.calls:>10}{stats.time:>12.4f}"
+                         f"{stats.size_in / stats.calls:>14.1f}{stats.size_out / stats.calls:>15.1f}")
+        if len(self.rules) > 0:
+            lines.append("")
+            lines.append(f"{'integration rule':<48}{'calls':>10}{'fired':>8}{'time (s)':>12}{'size in -> out':>18}")
+            for name, stats in self.rules.items():
+                shrink = f"{stats.size_in} -> {stats.size_out}" if stats.fired > 0 else "-"
+                lines.append(f"{name:<48}{stats.calls:>10}{stats.fired:>8}{stats.time:>12.4f}{shrink:>18}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def track():
+    """Context manager which tracks the instrumented functions within its scope.
+
+    Yields
+    ------
+    :class:`~.Tracker`
+        Holding the statistics.
+    """
+    global _TRACKER
+    previous = _TRACKER
+    tracker = Tracker()
+    _TRACKER = tracker
+    try:
+        yield tracker
+    finally:
+        _TRACKER = previous
+
+
+def profiled(name):
+    """Decorator instrumenting a function (or method) under the given name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            tracker = _TRACKER
+            if tracker is None:
+                return function(*args, **kwargs)
+            size_in = sum(expression_size(arg) for arg in args)
+            t_start = timer()
+            result = function(*args, **kwargs)
+            stats = tracker.calls[name]
+            stats.time += timer() - t_start
+            stats.calls += 1
+            stats.size_in += size_in
+            stats.size_out += expression_size(result)
+            return result
+        return wrapper
+
+    return decorator
+
+
+def apply_rule(rule, integration, *args):
+    """Applies an integration rule to an integral, recording its statistics if tracking."""
+    tracker = _TRACKER
+    if tracker is None:
+        return rule(integration, *args)
+    t_start = timer()
+    result = rule(integration, *args)
+    # Keyed by the qualified name, since rules of different modules (or scopes) can have the same name
+    stats = tracker.rules[f"{rule.__module__}.{rule.__qualname__}"]
+    stats.time += timer() - t_start
+    stats.calls += 1
+    if result is not integration:
+        stats.fired += 1
+        stats.size_in += expression_size(integration)
+        stats.size_out += expression_size(result)
+    return result
+
+
+def expression_size(obj):
+    """The size of an expression.
+
+    That is the number of atoms of a scalar or the number of terms of a state or operator (1 for base states).
+    Objects which are not expressions (e.g. the variables to integrate over) have size 0.
+    """
+    if hasattr(obj, "atoms"):
+        return sum(expression_size(atom) for atom in obj.atoms())
+    if hasattr(obj, "_scalar"):
+        # Unevaluated integral
+        return 1 + expression_size(obj._scalar)
+    if isinstance(getattr(obj, "_terms", None), dict):
+        return len(obj._terms)
+    if hasattr(obj, "conjugate") or hasattr(obj, "_orthogonality_key"):
+        # Number, atomic scalar or base state
+        return 1
+    return 0
@@ -1,10 +1,14 @@
 """
 Contains classes for qubit and qubit base states.
 """
+import numpy as np
+
 from qualg.states import BaseState
 
 
 class BaseQuditState(BaseState):
+    __slots__ = ("_base", "_digits")
+
     def __init__(self, digits, base=2):
         """
         A qudit base state.
@@ -32,8 +36,13 @@ class BaseQuditState(BaseState):
         return self._digits == other._digits
 
     def __hash__(self):
+        # NOTE the hash of the digits is cached by the string itself
         return hash(self._digits)
 
+    def __copy__(self):
+        # Immutable
+        return self
+
     def __str__(self):
         return f"|{self._digits}>"
 
@@ -62,16 +71,43 @@ class BaseQuditState(BaseState):
             return 0
 
     def tensor_product(self, other):
-        self._assert_class(other)
-        if not self._compatible(other):
+        # The other base state can also be of a superclass (e.g. a qudit for a qubit), giving the superclass
+        if isinstance(self, other.__class__):
+            general = other
+        else:
+            self._assert_class(other)
+            general = self
+        if not self._base == other._base:
             # TODO should actually be allowed. To enable this, self._base should perhaps be made into an array
-            raise ValueError("Can only do tensor product between states on the same number of qubits")
-        return self.__class__(self._digits + other._digits, base=self._base)
+            raise ValueError("Can only do tensor product between states with the same base")
+        return general._with_digits(self._digits + other._digits)
 
     def _vector_index(self):
         """Specifies the index in an actual vector."""
         return int(self._digits, base=self._base)
 
+    def _orthogonality_key(self):
+        return self._digits
+
+    def _from_vector_index(self, index):
+        return self._with_digits(np.base_repr(index, base=self._base).zfill(len(self)))
+
+    def _split_subsystems(self, subsystems):
+        """The subsystems are the positions of the qudits (from 0)."""
+        if not all(isinstance(i, int) and 0 <= i < len(self) for i in subsystems):
+            raise ValueError(f"subsystems should be positions of qudits in {self}, not {subsystems}")
+        if len(subsystems) == len(self):
+            raise ValueError("cannot split off all qudits")
+        kept = "".join(d for i, d in enumerate(self._digits) if i not in subsystems)
+        traced = "".join(d for i, d in enumerate(self._digits) if i in subsystems)
+        return self._with_digits(kept), self._with_digits(traced)
+
+    def _with_digits(self, digits):
+        """Returns a new base state of the same class and base but with other digits."""
+        new_state = self.__class__.__new__(self.__class__)
+        BaseQuditState.__init__(new_state, digits, base=self._base)
+        return new_state
+
     def _bra_str(self):
         return f"<{self._digits}|"
 
@@ -88,6 +124,8 @@ class BaseQuditState(BaseState):
 
 
 class BaseQubitState(BaseQuditState):
+    __slots__ = ()
+
     def __init__(self, digits):
         """
         A qubit base state. (same as :class:`~.BaseQuditState` except that 'base' is fixed to 2)
@@ -6,12 +6,15 @@ In particular when the output is not a number but a symbolic variable of functio
 
 import abc
 import math
+import weakref
 from copy import copy
 from collections import defaultdict
 from itertools import product
 
 from sympy.core.expr import Expr
 
+from qualg.cache import memoize
+from qualg.symbols import symbol
 from qualg.toolbox import (
     assert_list_or_tuple,
     assert_str,
@@ -21,18 +24,20 @@ from qualg.toolbox import (
     replace_var,
     is_one,
     get_variables,
-    has_variable,
 )
 
 
 def is_number(n):
     """Check if something is a number (int, float or complex)"""
-    return any(isinstance(n, tp) for tp in [int, float, complex])
+    return isinstance(n, (int, float, complex))
 
 
 def is_scalar(n):
     """Check if something is considered a scalar (number of :class:`~.Scalar`)"""
-    return is_number(n) or isinstance(n, Scalar) or isinstance(n, Expr)
+    return is_number(n) or isinstance(n, (Scalar, Expr))
+
+
+_NO_VARIABLES = frozenset()
 
 
 class Scalar(abc.ABC):
@@ -41,6 +46,8 @@ class Scalar(abc.ABC):
 
     Meant to be subclassed.
     """
+    __slots__ = ()
+
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
             return NotImplemented
@@ -87,7 +94,6 @@ class Scalar(abc.ABC):
 
     def __copy__(self):
         return eval(repr(self))
-        pass
 
     def has_variable(self, variable):
         """Checks if scalar depends on a given variable."""
@@ -97,7 +103,11 @@ class Scalar(abc.ABC):
         """
         Returns the variable of this operator.
         """
-        return set([])
+        return _NO_VARIABLES
+
+    def _ordered_variables(self):
+        """Returns the variables in a deterministic order (used for the canonical form when caching)."""
+        return sorted(self.get_variables(), key=str)
 
     @abc.abstractmethod
     def conjugate(self):
@@ -109,7 +119,67 @@ class Scalar(abc.ABC):
         pass
 
 
-class Variable(Scalar):
+class _InternedScalarMeta(abc.ABCMeta):
+    """Metaclass for scalars which are hash-consed.
+
+    Constructing a scalar which is structurally equal to an already existing one returns
+    the existing object, such that equal scalars are the same (immutable) object.
+    """
+    _interned = weakref.WeakValueDictionary()
+    # The interned scalars by the arguments of the calls constructing them (which are not canonical, e.g.
+    # names as strings or symbols), such that constructing an existing scalar again does not construct it
+    _by_call = weakref.WeakValueDictionary()
+
+    def __call__(cls, *args, **kwargs):
+        call_key = (cls, args, tuple(kwargs.items()))
+        try:
+            interned = cls._by_call.get(call_key)
+        except TypeError:
+            # Unhashable arguments, which the constructor rejects
+            return super().__call__(*args, **kwargs)
+        if interned is not None:
+            return interned
+        scalar = super().__call__(*args, **kwargs)
+        key = (cls, scalar._args())
+        interned = cls._interned.get(key)
+        if interned is None:
+            scalar._hash = hash(scalar._key())
+            cls._interned[key] = scalar
+            interned = scalar
+        cls._by_call[call_key] = interned
+        return interned
+
+
+class _AtomicScalar(Scalar, metaclass=_InternedScalarMeta):
+    """Base-class for immutable scalars which are not composed of other scalars.
+
+    Instances are interned, so copies are free and equality is (mostly) an identity check.
+    """
+    __slots__ = ("_hash", "__weakref__")
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return self._hash
+
+    def __copy__(self):
+        return self
+
+    def __reduce__(self):
+        return (self.__class__, self._args())
+
+    @abc.abstractmethod
+    def _args(self):
+        """The arguments used to construct the scalar, also used to intern it."""
+        pass
+
+
+class Variable(_AtomicScalar):
+    __slots__ = ("_variable", "_conjugate")
+
     def __init__(self, variable, conjugate=False):
         """Represents a number as a variable
 
@@ -121,14 +191,14 @@ class Variable(Scalar):
             If the variable is conjugated (default: `False`)
         """
         assert_str(variable)
-        self._variable = variable
+        self._variable = symbol(variable)
         self._conjugate = conjugate
 
     def __str__(self):
         if self._conjugate:
             return f"({self._variable}*)"
         else:
-            return self._variable
+            return str(self._variable)
 
     def __repr__(self):
         return f"{self.__class__.__name__}({repr(self._variable)}, {self._conjugate})"
@@ -151,8 +221,13 @@ class Variable(Scalar):
     def _key(self):
         return (self._variable, self._conjugate)
 
+    def _args(self):
+        return (self._variable, self._conjugate)
+
+
+class AbsoluteVariable(_AtomicScalar):
+    __slots__ = ("_variable",)
 
-class AbsoluteVariable(Scalar):
     def __init__(self, variable):
         """Represents the absolute value squared of a variable
 
@@ -162,7 +237,7 @@ class AbsoluteVariable(Scalar):
             Name of variable.
         """
         assert_str(variable)
-        self._variable = variable
+        self._variable = symbol(variable)
 
     def __str__(self):
         return f"|{self._variable}|^2"
@@ -182,8 +257,13 @@ class AbsoluteVariable(Scalar):
     def _key(self):
         return self._variable
 
+    def _args(self):
+        return (self._variable,)
+
+
+class SingleVarFunctionScalar(_AtomicScalar):
+    __slots__ = ("_func_name", "_variable", "_conjugate", "_variables")
 
-class SingleVarFunctionScalar(Scalar):
     def __init__(self, func_name, variable, conjugate=False):
         """Represents a function with a single symbolic variable, e.g. f(x).
 
@@ -198,9 +278,10 @@ class SingleVarFunctionScalar(Scalar):
         """
         assert_str(func_name)
         assert_str(variable)
-        self._func_name = func_name
-        self._variable = variable
+        self._func_name = symbol(func_name)
+        self._variable = symbol(variable)
         self._conjugate = conjugate
+        self._variables = frozenset([self._variable])
 
     def __str__(self):
         conj = "*" if self._conjugate else ""
@@ -214,12 +295,12 @@ class SingleVarFunctionScalar(Scalar):
 
     def replace_var(self, old_variable, new_variable):
         var = self._variable
-        if old_variable == var:
+        if symbol(old_variable) == var:
             var = new_variable
         return self.__class__(self._func_name, var, conjugate=self._conjugate)
 
     def get_variables(self):
-        return set([self._variable])
+        return self._variables
 
     def is_zero(self):
         return False
@@ -228,13 +309,18 @@ class SingleVarFunctionScalar(Scalar):
         return False
 
     def has_variable(self, variable):
-        return variable == self._variable
+        return symbol(variable) == self._variable
 
     def _key(self):
         return (self._func_name, self._variable, self._conjugate)
 
+    def _args(self):
+        return (self._func_name, self._variable, self._conjugate)
+
+
+class InnerProductFunction(_AtomicScalar):
+    __slots__ = ("_func_names",)
 
-class InnerProductFunction(Scalar):
     def __init__(self, func_name1, func_name2):
         """Represents the inner product of two functions.
 
@@ -247,7 +333,7 @@ class InnerProductFunction(Scalar):
         """
         assert_str(func_name1)
         assert_str(func_name2)
-        self._func_names = sorted([func_name1, func_name2])
+        self._func_names = tuple(sorted([symbol(func_name1), symbol(func_name2)], key=str))
 
     def __str__(self):
         return f"<{self._func_names[0]}|{self._func_names[1]}>"
@@ -265,10 +351,15 @@ class InnerProductFunction(Scalar):
         return False
 
     def _key(self):
-        return tuple(self._func_names)
+        return self._func_names
+
+    def _args(self):
+        return self._func_names
+
 
+class DeltaFunction(_AtomicScalar):
+    __slots__ = ("_vars", "_variables")
 
-class DeltaFunction(Scalar):
     def __init__(self, var1, var2):
         """Delta function between two variables, e.g. d(x - y)
 
@@ -281,8 +372,9 @@ class DeltaFunction(Scalar):
         """
         assert_str(var1)
         assert_str(var2)
-        self._assert_different(var1, var2)
-        self._vars = [var1, var2]
+        self._vars = (symbol(var1), symbol(var2))
+        self._assert_different(*self._vars)
+        self._variables = frozenset(self._vars)
 
     def conjugate(self):
         return DeltaFunction(*self._vars)
@@ -297,14 +389,18 @@ class DeltaFunction(Scalar):
 
     def replace_var(self, old_variable, new_variable):
         new_vars = list(self._vars)
+        old_variable = symbol(old_variable)
         if old_variable in new_vars:
             new_vars.remove(old_variable)
-            new_vars.append(new_variable)
+            new_vars.append(symbol(new_variable))
         self._assert_different(*new_vars)
         return self.__class__(*new_vars)
 
     def get_variables(self):
-        return set(self._vars)
+        return self._variables
+
+    def _ordered_variables(self):
+        return list(self._vars)
 
     def is_zero(self):
         return False
@@ -313,11 +409,14 @@ class DeltaFunction(Scalar):
         return False
 
     def has_variable(self, variable):
-        return variable in self._vars
+        return symbol(variable) in self._vars
 
     def _key(self):
         return frozenset(self._vars)
 
+    def _args(self):
+        return self._vars
+
     @staticmethod
     def _assert_different(var1, var2):
         if var1 == var2:
@@ -325,6 +424,8 @@ class DeltaFunction(Scalar):
 
 
 class ProductOfScalars(Scalar):
+    __slots__ = ("_factors", "_variables")
+
     def __init__(self, scalars=None):
         """Product of some number of scalars.
 
@@ -334,6 +435,9 @@ class ProductOfScalars(Scalar):
             The factors of the product.
         """
         self._factors = [1]
+        # The variables are computed when needed and cached, the factors are not modified after construction
+        # except by __setitem__
+        self._variables = None
         if scalars is None:
             return
         assert_list_or_tuple(scalars)
@@ -350,6 +454,13 @@ class ProductOfScalars(Scalar):
             to_print += f"{scalar}*"
         return to_print[:-1]
 
+    def __copy__(self):
+        # Numbers and atomic (interned) scalars are shared, other factors can be modified and are copied
+        new_scalar = self.__class__()
+        new_scalar._factors = [_copy_mutable(factor) for factor in self._factors]
+        new_scalar._variables = self._variables
+        return new_scalar
+
     def __repr__(self):
         return f"{self.__class__.__name__}({repr(list(iter(self)))})"
 
@@ -390,6 +501,7 @@ class ProductOfScalars(Scalar):
     def __setitem__(self, i, value):
         start = self._start_index()
         self._factors[start + i] = value
+        self._variables = None
 
     def conjugate(self):
         return ProductOfScalars([scalar.conjugate() for scalar in self])
@@ -410,11 +522,12 @@ class ProductOfScalars(Scalar):
         return self.__class__(new_factors)
 
     def get_variables(self):
-        vars = set([])
-        for factor in self:
-            vars |= get_variables(factor)
+        if self._variables is None:
+            self._variables = frozenset().union(*(get_variables(factor) for factor in self))
+        return self._variables
 
-        return vars
+    def _ordered_variables(self):
+        return _ordered_variables(self)
 
     def expand(self):
         if not any(isinstance(s, SumOfScalars) for s in self._factors):
@@ -443,52 +556,37 @@ class ProductOfScalars(Scalar):
     def is_one(self):
         return all(is_one(s) for s in self._factors)
 
+    @memoize("simplify")
     def simplify(self, full=True):
-        new_scalar = 1
+        coefficient = 1
+        factors = []
+        has_sum = False
         for factor in self:
-            if is_zero(factor):
-                return 0
-            if not is_one(factor):
-                new_scalar *= simplify(factor)
-        new_scalar = expand(new_scalar)
-        if isinstance(new_scalar, SumOfScalars):
-            return simplify(new_scalar)
-
-        if _is_sequenced_scalar(new_scalar):
-            if len(new_scalar) == 0:
+            factor = simplify(factor)
+            if is_number(factor):
+                if is_zero(factor):
+                    return 0
+                coefficient *= factor
+            elif isinstance(factor, ProductOfScalars):
+                coefficient *= factor._factors[0]
+                factors += factor._factors[1:]
+            else:
+                has_sum = has_sum or isinstance(factor, SumOfScalars)
+                factors.append(factor)
+        if has_sum:
+            return simplify(ProductOfScalars([coefficient] + factors).expand())
+        if full:
+            coefficient, factors = _combine_factors(coefficient, factors)
+            if is_zero(coefficient):
                 return 0
-            if len(new_scalar) == 1:
-                return simplify(new_scalar[0])
-
-        if isinstance(new_scalar, ProductOfScalars):
-            if any(isinstance(s, ProductOfScalars) for s in new_scalar):
-                raise RuntimeError("factors of product should not be products")
-            if full:
-                changed = True
-                while changed:
-                    changed = new_scalar._combine_factors()
-        return new_scalar
-
-    def _combine_factors(self):
-        """Test if factors can be combined"""
-        for i, factor1 in enumerate(self._factors):
-            if i == 0:
-                continue
-            if is_number(factor1):
-                self._factors[0] += factor1
-                self._factors.pop(i)
-                return True
-            for j in range(i + 1, len(self._factors)):
-                factor2 = self._factors[j]
-                prod = factor1 * factor2
-                if not isinstance(prod, ProductOfScalars) or len(prod._factors) <= 2:
-                    self._factors[i] = prod
-                    self._factors.pop(j)
-                    return True
-        return False
+        if len(factors) == 0:
+            return coefficient
+        if len(factors) == 1 and is_one(coefficient):
+            return factors[0]
+        return ProductOfScalars([coefficient] + sorted(factors, key=_sort_key))
 
     def has_variable(self, variable):
-        return any(has_variable(factor, variable) for factor in self)
+        return symbol(variable) in self.get_variables()
 
     def _key(self):
         factors_with_multi = defaultdict(int)
@@ -498,6 +596,8 @@ class ProductOfScalars(Scalar):
 
 
 class SumOfScalars(Scalar):
+    __slots__ = ("_terms", "_variables")
+
     def __init__(self, scalars=None):
         """Sum of some number of scalars.
 
@@ -507,6 +607,8 @@ class SumOfScalars(Scalar):
             The terms of the sum.
         """
         self._terms = [0]
+        # Cached as for ProductOfScalars
+        self._variables = None
         if scalars is None:
             return
         assert_list_or_tuple(scalars)
@@ -523,6 +625,13 @@ class SumOfScalars(Scalar):
             to_print += f"{scalar} + "
         return "(" + to_print[:-3] + ")"
 
+    def __copy__(self):
+        # As for ProductOfScalars
+        new_scalar = self.__class__()
+        new_scalar._terms = [_copy_mutable(term) for term in self._terms]
+        new_scalar._variables = self._variables
+        return new_scalar
+
     def __repr__(self):
         return f"{self.__class__.__name__}({repr(list(iter(self._terms)))})"
 
@@ -569,6 +678,7 @@ class SumOfScalars(Scalar):
     def __setitem__(self, i, value):
         start = self._start_index()
         self._terms[start + i] = value
+        self._variables = None
 
     def conjugate(self):
         return SumOfScalars([scalar.conjugate() for scalar in self._terms])
@@ -589,65 +699,49 @@ class SumOfScalars(Scalar):
         return self.__class__(new_terms)
 
     def get_variables(self):
-        vars = set([])
-        for term in self:
-            vars |= get_variables(term)
+        if self._variables is None:
+            self._variables = frozenset().union(*(get_variables(term) for term in self))
+        return self._variables
 
-        return vars
+    def _ordered_variables(self):
+        return _ordered_variables(self)
 
     def is_zero(self):
         return all(is_zero(s) for s in self)
 
     def expand(self):
-        return sum((expand(term) for term in self))
+        terms = []
+        for term in self:
+            term = expand(term)
+            if isinstance(term, SumOfScalars):
+                terms += term._terms
+            else:
+                terms.append(term)
+        return SumOfScalars(terms)
 
+    @memoize("simplify")
     def simplify(self, full=True):
-        new_scalar = 0
-        expanded = self.expand()
-
-        if not isinstance(expanded, SumOfScalars):
-            return simplify(expanded)
-        if is_number(expanded):
-            return expanded
-        for term in expanded:
-            if not is_zero(term):
-                new_scalar += simplify(term)
-
-        if _is_sequenced_scalar(new_scalar):
-            if len(new_scalar) == 0:
-                new_scalar = 0
-            if len(new_scalar) == 1:
-                new_scalar = simplify(new_scalar[0])
-
-        if isinstance(new_scalar, SumOfScalars):
-            if any(isinstance(s, SumOfScalars) for s in new_scalar):
-                raise RuntimeError("terms of sum should not be sum after expand")
-            if full:
-                changed = True
-                while changed:
-                    changed = new_scalar._combine_terms()
-        return new_scalar
-
-    def _combine_terms(self):
-        """Test if terms can be combined"""
-        for i, term1 in enumerate(self._terms):
-            if i == 0:
-                continue
-            if is_number(term1):
-                self._terms[0] += term1
-                self._terms.pop(i)
-                return True
-            for j in range(i + 1, len(self._terms)):
-                term2 = self._terms[j]
-                sm = term1 + term2
-                if not isinstance(sm, SumOfScalars) or len(sm._terms) <= 2:
-                    self._terms[i] = sm
-                    self._terms.pop(j)
-                    return True
-        return False
+        constant = 0
+        terms = []
+        for term in self.expand():
+            term = simplify(term)
+            if isinstance(term, SumOfScalars):
+                constant += term._terms[0]
+                terms += term._terms[1:]
+            elif is_number(term):
+                constant += term
+            else:
+                terms.append(term)
+        if full:
+            terms = _combine_terms(terms)
+        if len(terms) == 0:
+            return constant
+        if len(terms) == 1 and is_zero(constant):
+            return terms[0]
+        return SumOfScalars([constant] + sorted(terms, key=_sort_key))
 
     def has_variable(self, variable):
-        return any(has_variable(factor, variable) for factor in self)
+        return symbol(variable) in self.get_variables()
 
     def _key(self):
         terms_with_multi = defaultdict(int)
@@ -656,6 +750,68 @@ class SumOfScalars(Scalar):
         return frozenset(terms_with_multi.items())
 
 
+def sum_scalars(scalars):
+    """Sums scalars in a single pass, combining terms which are multiples of the same scalar.
+
+    Gives the same as adding the scalars one by one, which is quadratic in the number of terms.
+
+    Parameters
+    ----------
+    scalars : iterable of scalars
+        The scalars to sum.
+
+    Returns
+    -------
+    scalar
+        The sum.
+    """
+    constant = 0
+    terms = []
+    for scalar in scalars:
+        if isinstance(scalar, SumOfScalars):
+            constant += scalar._terms[0]
+            terms += scalar._terms[1:]
+        elif is_number(scalar):
+            constant += scalar
+        else:
+            terms.append(scalar)
+    terms = _combine_terms(terms)
+    if len(terms) == 0:
+        return constant
+    if len(terms) == 1 and is_zero(constant):
+        return terms[0]
+    return SumOfScalars([constant] + terms)
+
+
+def to_numbers(scalars, convert_scalars=None, **kwargs):
+    """Converts a list of scalars to numbers.
+
+    Non-number scalars are converted using `convert_scalars`, which is called once for each unique scalar.
+
+    Parameters
+    ----------
+    scalars : list
+        The scalars to convert.
+    convert_scalars (optional) : function
+        Function to convert a non-number scalar to a number.
+    **kwargs:
+        Keyword-arguments to be passed to `convert_scalars`.
+
+    Returns
+    -------
+    list
+        The numbers.
+    """
+    converted = {}
+    for scalar in scalars:
+        if is_number(scalar) or scalar in converted:
+            continue
+        if convert_scalars is None:
+            raise ValueError("If there are non-numbers, the function `convert_scalars` needs to be provided")
+        converted[scalar] = convert_scalars(scalar, **kwargs)
+    return [scalar if is_number(scalar) else converted[scalar] for scalar in scalars]
+
+
 def assert_is_scalar(n):
     """Asserts that something is a scalar"""
     if not is_scalar(n):
@@ -671,5 +827,78 @@ def _get_multiple_of_scalar(scalar):
     return 1, scalar
 
 
+def _sort_key(scalar):
+    """Key used to order the factors and terms of simplified scalars, using the hash instead of printing."""
+    return (scalar.__class__.__name__, hash(scalar))
+
+
+def _combine_factors(coefficient, factors):
+    """Combines the factors of a product in a single pass.
+
+    Two factors are combined if their product is not a :class:`~.ProductOfScalars` (with more than one factor).
+    Atomic scalars (e.g. a :class:`~.Variable`) can only be combined with their complex conjugate, so for those
+    only the conjugate is looked up among the previous atomic factors, while other factors (e.g. sympy
+    expressions) are multiplied with all previous factors.
+    Returns the new coefficient and the list of (non-number) factors.
+    """
+    atomic = defaultdict(int)
+    others = []
+    to_combine = list(reversed(factors))
+    while len(to_combine) > 0:
+        factor = to_combine.pop()
+        if is_number(factor):
+            coefficient *= factor
+            continue
+        if isinstance(factor, _AtomicScalar):
+            partner = factor.conjugate()
+            candidates = ([partner] if atomic[partner] > 0 else []) + others
+        else:
+            candidates = [previous for previous, count in atomic.items() if count > 0] + others
+        for previous in candidates:
+            prod = previous * factor
+            if isinstance(prod, ProductOfScalars):
+                if len(prod._factors) > 2:
+                    continue
+                to_combine += reversed(prod._factors)
+            else:
+                to_combine.append(prod)
+            if isinstance(previous, _AtomicScalar):
+                atomic[previous] -= 1
+            else:
+                others.remove(previous)
+            break
+        else:
+            if isinstance(factor, _AtomicScalar):
+                atomic[factor] += 1
+            else:
+                others.append(factor)
+    factors = [factor for factor, count in atomic.items() for _ in range(count)] + others
+    return coefficient, factors
+
+
+def _combine_terms(terms):
+    """Combines terms which are multiples of the same scalar in a single pass."""
+    multiples = defaultdict(int)
+    for term in terms:
+        multiple, scalar = _get_multiple_of_scalar(term)
+        multiples[scalar] += multiple
+    return [copy(scalar) * multiple for scalar, multiple in multiples.items() if not is_zero(multiple)]
+
+
+def _ordered_variables(sequenced_scalar):
+    variables = []
+    for s in sequenced_scalar:
+        if isinstance(s, Scalar):
+            variables += s._ordered_variables()
+    return variables
+
+
+def _copy_mutable(scalar):
+    """Copies a scalar unless it is a number or an atomic scalar (which are immutable)."""
+    if is_number(scalar) or isinstance(scalar, _AtomicScalar):
+        return scalar
+    return copy(scalar)
+
+
 def _is_sequenced_scalar(scalar):
     return any(isinstance(scalar, tp) for tp in [ProductOfScalars, SumOfScalars])
@@ -10,9 +10,13 @@ in the sum.
 """
 
 import abc
+import numpy as np
 from collections import defaultdict
+from scipy import sparse
 
-from qualg.scalars import is_scalar
+from qualg import arrays, parallel
+from qualg.profiling import profiled
+from qualg.scalars import is_scalar, to_numbers, sum_scalars
 from qualg.toolbox import assert_list_or_tuple, simplify, replace_var, get_variables, is_zero
 
 
@@ -22,6 +26,8 @@ class BaseState(abc.ABC):
 
     Meant to be subclassed.
     """
+    __slots__ = ()
+
     @abc.abstractmethod
     def __eq__(self, other):
         pass
@@ -31,7 +37,7 @@ class BaseState(abc.ABC):
         pass
 
     def __matmul__(self, other):
-        return self.tensor_product(other)
+        return tensor_product_base_states(self, other)
 
     @abc.abstractmethod
     def inner_product(self, other):
@@ -98,8 +104,235 @@ class BaseState(abc.ABC):
         """
         return None
 
+    def _orthogonality_key(self):
+        """Returns a key such that base states with different keys are orthogonal.
+
+        For example the digits of an orthonormal basis state or the number of excitations per mode.
+        This is used to only take inner products between base states which can be non-orthogonal.
+        `None` means that the base state can be non-orthogonal to any other base state.
+        """
+        return None
+
+    def _split_subsystems(self, subsystems):
+        """Splits the base state into the part outside and the part inside the given subsystems.
+
+        Used to take partial traces (see :meth:`~.density_matrix.DensityMatrix.partial_trace`).
+        What identifies a subsystem depends on the class, e.g. positions of qudits or modes of excitations.
+
+        Parameters
+        ----------
+        subsystems : set
+            The subsystems.
+
+        Returns
+        -------
+        tuple of :class:`~.BaseState`
+            The part outside and the part inside the subsystems.
+        """
+        raise NotImplementedError(f"splitting into subsystems is not implemented for {self.__class__.__name__}")
+
+    def _from_vector_index(self, index):
+        """Returns the base state, compatible with this one, at the given index in an actual vector.
+
+        Should only be implemented if the base states form a finite orthonormal basis, such that states
+        and operators can be represented by arrays (see :mod:`~.arrays`).
+        The vector index of a tensor product of two such base states should then be `i1 * d2 + i2`,
+        where `i1` and `i2` are the indices of the factors and `d2` the dimension of the second.
+
+        `None` means that this is not supported.
+        """
+        return None
+
+
+class CompositeBaseState(BaseState):
+    __slots__ = ("_factors", "_hash")
+
+    def __init__(self, factors):
+        """The tensor product of base states of different classes, e.g. a qubit and some excitations.
+
+        Usually constructed by :func:`~.tensor_product_base_states` (i.e. `@`), which only gives a composite
+        base state if the factors cannot be combined into a single base state.
+
+        Parameters
+        ----------
+        factors : list of :class:`~.BaseState`
+            The factors of the tensor product. Composite factors are flattened and consecutive factors
+            which can be combined (e.g. two qubit base states) are.
+        """
+        assert_list_or_tuple(factors)
+        for factor in factors:
+            if not isinstance(factor, BaseState):
+                raise TypeError(f"factors should be of class BaseState, not {type(factor)}")
+        self._factors = _combine_factors(factors)
+        self._hash = hash(self._factors)
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        return self._factors == other._factors
+
+    def __hash__(self):
+        return self._hash
+
+    def __copy__(self):
+        # Immutable
+        return self
+
+    def __reduce__(self):
+        # The hash is not pickled since hashes of strings differ between processes
+        return (self.__class__, (list(self._factors),))
+
+    def __str__(self):
+        return " @ ".join(str(factor) for factor in self._factors)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self._factors)})"
+
+    def __len__(self):
+        return len(self._factors)
+
+    @property
+    def shape(self):
+        dimension = 1
+        for factor in self._factors:
+            shape = factor.shape
+            if shape is None:
+                return None
+            dimension *= shape[0]
+        return (dimension,)
+
+    def inner_product(self, other):
+        if not isinstance(other, self.__class__):
+            raise TypeError(f"other is not of type {self.__class__}, but {type(other)}")
+        if not self._compatible(other):
+            raise ValueError(f"Can only do inner product between compatible composite states, not {self} and {other}")
+        # Check orthogonality of the factors first, before computing any inner products
+        for factor, other_factor in zip(self._factors, other._factors):
+            key = factor._orthogonality_key()
+            other_key = other_factor._orthogonality_key()
+            if key is not None and other_key is not None and key != other_key:
+                return 0
+        scalar = 1
+        for factor, other_factor in zip(self._factors, other._factors):
+            inner = factor.inner_product(other_factor)
+            if is_zero(inner):
+                return 0
+            scalar = inner if scalar == 1 else scalar * inner
+        return scalar
+
+    def tensor_product(self, other):
+        if not isinstance(other, BaseState):
+            raise TypeError(f"other should be of class BaseState, not {type(other)}")
+        return tensor_product_base_states(self, other)
+
+    def replace_var(self, old_variable, new_variable):
+        """
+        Replaces a variable with another.
+        """
+        return self.__class__([replace_var(factor, old_variable, new_variable) for factor in self._factors])
+
+    def get_variables(self):
+        """
+        Returns the variables of the factors.
+        """
+        variables = set()
+        for factor in self._factors:
+            variables |= get_variables(factor)
+        return variables
+
+    def _compatible(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+        if len(self._factors) != len(other._factors):
+            return False
+        return all(factor._compatible(other_factor) for factor, other_factor in zip(self._factors, other._factors))
+
+    def _orthogonality_key(self):
+        keys = tuple(factor._orthogonality_key() for factor in self._factors)
+        if all(key is None for key in keys):
+            return None
+        return keys
+
+    def _vector_index(self):
+        index = 0
+        for factor in self._factors:
+            shape = factor.shape
+            factor_index = factor._vector_index()
+            if shape is None or factor_index is None:
+                return None
+            index = index * shape[0] + factor_index
+        return index
+
+    def _from_vector_index(self, index):
+        factors = []
+        for factor in reversed(self._factors):
+            shape = factor.shape
+            if shape is None:
+                return None
+            index, factor_index = divmod(index, shape[0])
+            new_factor = factor._from_vector_index(factor_index)
+            if new_factor is None:
+                return None
+            factors.append(new_factor)
+        return self.__class__(factors[::-1])
+
+    def _bra_str(self):
+        return " @ ".join(factor._bra_str() for factor in self._factors)
+
+
+def tensor_product_base_states(base_state1, base_state2):
+    """Takes the tensor product of two base states of possibly different classes.
+
+    Base states which can be combined (e.g. two qubit base states) give a single base state of the same class,
+    otherwise a :class:`~.CompositeBaseState`.
+
+    Parameters
+    ----------
+    base_state1 : :class:`~.BaseState`
+        The left hand side of the tensor product.
+    base_state2 : :class:`~.BaseState`
+        The right hand side of the tensor product.
+
+    Returns
+    -------
+    :class:`~.BaseState`
+        The tensor product
+    """
+    factors = _combine_factors([base_state1, base_state2])
+    if len(factors) == 1:
+        return factors[0]
+    new_state = CompositeBaseState.__new__(CompositeBaseState)
+    new_state._factors = factors
+    new_state._hash = hash(factors)
+    return new_state
+
+
+def _combine_factors(factors):
+    """Flattens composite base states and combines consecutive base states of the same class (or where one
+    class is a subclass of the other, e.g. a qubit and a qudit) using their tensor product, if possible."""
+    combined = []
+    for factor in factors:
+        if isinstance(factor, CompositeBaseState):
+            sub_factors = factor._factors
+        else:
+            sub_factors = [factor]
+        for sub_factor in sub_factors:
+            if len(combined) > 0:
+                last = combined[-1]
+                if isinstance(sub_factor, last.__class__) or isinstance(last, sub_factor.__class__):
+                    try:
+                        combined[-1] = last.tensor_product(sub_factor)
+                        continue
+                    except (TypeError, ValueError):
+                        # E.g. qudits of different bases
+                        pass
+            combined.append(sub_factor)
+    return tuple(combined)
+
 
 class State:
+    __slots__ = ("_terms",)
+
     def __init__(self, base_states=None, scalars=None):
         """A quantum state.
         Constructed as a sum of (subclass) :class:`~.BaseState`.
@@ -133,13 +366,13 @@ class State:
                 raise TypeError(f"scalars needs to be of class Scalar, not {type(scalar)}")
             self._terms[base_state] += scalar
 
-        # Check that all states are pairwise compatible
-        base_states = list(self._terms.keys())
-        for i, bs1 in enumerate(base_states):
-            for j in range(i + 1, len(base_states)):
-                bs2 = base_states[j]
-                if not bs1._compatible(bs2):
-                    raise ValueError(f"States {bs1} and {bs2} are not compatible terms")
+        # Check that all states are compatible, since compatibility is an equivalence relation
+        # (e.g. same number of qubits) it's enough to compare to the first
+        base_states = iter(self._terms.keys())
+        bs1 = next(base_states, None)
+        for bs2 in base_states:
+            if not bs1._compatible(bs2):
+                raise ValueError(f"States {bs1} and {bs2} are not compatible terms")
 
     def _key(self):
         return set((base_state, scalar) for base_state, scalar in self._terms.items())
@@ -195,7 +428,7 @@ class State:
     def __rmul__(self, other):
         return self * other
 
-    def __div__(self, other):
+    def __truediv__(self, other):
         if not is_scalar(other):
             return NotImplemented
         new_state = State([])
@@ -225,10 +458,86 @@ class State:
     def __iter__(self):
         return iter(self._terms.items())
 
+    @property
+    def shape(self):
+        """Returns the shape of the state, e.q. (2,) for a qubit.
+
+        `None` means that the shape is undefined, e.g. if the state is infinite-dimensional.
+        """
+        if len(self) == 0:
+            return (0,)
+        else:
+            return next(iter(self._terms)).shape
+
     def get_scalar(self, base_state):
         """Returns the scalar of the given base_state"""
         return self._terms.get(base_state, 0)
 
+    def to_numpy_vector(self, convert_scalars=None, **kwargs):
+        """Converts the state to a (complex) numpy vector.
+
+        See :meth:`~.operators.Operator.to_numpy_matrix` for how non-number scalars are handled.
+
+        Parameters
+        ----------
+        convert_scalars : function
+            Function to convert a non-number scalar to a number.
+        **kwargs:
+            Keyword-arguments to be passed to `convert_scalars`.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            The state in numerical vector form.
+        """
+        indices, values = self._vector_entries(convert_scalars, **kwargs)
+        vector = np.zeros(self.shape, dtype=complex)
+        vector[indices] = values
+
+        return vector
+
+    def to_sparse_vector(self, convert_scalars=None, format="csr", **kwargs):
+        """Converts the state to a (complex) sparse column vector, i.e. of shape (d, 1).
+
+        See :meth:`~.operators.Operator.to_numpy_matrix` for how non-number scalars are handled.
+
+        Parameters
+        ----------
+        convert_scalars : function
+            Function to convert a non-number scalar to a number.
+        format (optional) : str
+            The sparse format of the vector, e.g. "csr" (default) or "coo".
+        **kwargs:
+            Keyword-arguments to be passed to `convert_scalars`.
+
+        Returns
+        -------
+        :class:`scipy.sparse.spmatrix`
+            The state in numerical sparse form.
+        """
+        indices, values = self._vector_entries(convert_scalars, **kwargs)
+        cols = np.zeros(len(indices), dtype=int)
+        vector = sparse.coo_matrix((np.array(values, dtype=complex), (indices, cols)), shape=self.shape + (1,))
+
+        return vector.asformat(format)
+
+    def _vector_entries(self, convert_scalars=None, **kwargs):
+        """Returns the indices and values (numbers) of the terms."""
+        if self.shape is None:
+            raise ValueError("Cannot convert a state with undefined shape to a vector")
+        base_states = list(self._terms.keys())
+        values = to_numbers([self._terms[base_state] for base_state in base_states], convert_scalars, **kwargs)
+        indices = np.array([base_state._vector_index() for base_state in base_states], dtype=int)
+
+        return indices, values
+
+    def _flat_entries(self):
+        """Returns the shape and the (index, scalar) of each term (used by :func:`~.numeric.lambdify`)."""
+        if self.shape is None:
+            raise ValueError("Cannot convert a state with undefined shape to a vector")
+        return self.shape, [(base_state._vector_index(), scalar) for base_state, scalar in self._terms.items()]
+
+    @profiled("State.inner_product")
     def inner_product(self, other, first_replace_var=True):
         """
         Takes the inner product with another :class:`~.State`.
@@ -252,23 +561,24 @@ class State:
             raise NotImplementedError(f"inner product is not implemented for {type(other)}")
         if not self._compatible(other):
             raise ValueError(f"other ({other}) is not compatible with self ({self})")
+        self_arrays = arrays.state_arrays(self)
+        if self_arrays is not None:
+            other_arrays = arrays.state_arrays(other)
+            if other_arrays is not None:
+                return arrays.inner_product(self_arrays, other_arrays)
         # NOTE if BaseState are assumed to be orthogonal be don't need to do the
         # product of base states.
         if first_replace_var:
             other = replace_var(other)
-        inner = 0
-        for self_base_state, self_scalar in self._terms.items():
-            for other_base_state, other_scalar in other._terms.items():
-                factors = [
-                    self_scalar.conjugate(),
-                    other_scalar,
-                    self_base_state.inner_product(other_base_state),
-                ]
-                if any(is_zero(factor) for factor in factors):
-                    continue
-                inner += (self_scalar.conjugate() * other_scalar) * self_base_state.inner_product(other_base_state)
+        pairs = [
+            (self_base_state, self._terms[self_base_state], other_base_state, other._terms[other_base_state])
+            for self_base_state, other_base_state in non_orthogonal_pairs(self._terms, other._terms)
+        ]
+        terms = []
+        for partial in parallel.map_chunks(_inner_product_terms, pairs):
+            terms += partial
 
-        return inner
+        return sum_scalars(terms)
 
     def tensor_product(self, other):
         """
@@ -286,19 +596,28 @@ class State:
         """
         if not isinstance(other, self.__class__):
             raise NotImplementedError(f"tensor product is not implemented for {type(other)}")
+        self_arrays = arrays.state_arrays(self)
+        if self_arrays is not None:
+            other_arrays = arrays.state_arrays(other)
+            if other_arrays is not None:
+                tensor_arrays = arrays.tensor_product(self_arrays, other_arrays)
+                if tensor_arrays is not None:
+                    return State._from_arrays(tensor_arrays)
         tensor = State()
         for self_base_state, self_scalar in self._terms.items():
             for other_base_state, other_scalar in other._terms.items():
-                tensor += State(base_states=[self_base_state.tensor_product(other_base_state)],
-                                scalars=[self_scalar * other_scalar])
+                tensor._terms[tensor_product_base_states(self_base_state, other_base_state)] += \
+                    self_scalar * other_scalar
+
+        tensor._prune_zero_terms()
 
         return tensor
 
     def simplify(self):
         """Tries to simplify the state."""
         new_state = State()
-        for base_state, scalar in self._terms.items():
-            new_state._terms[base_state] = simplify(scalar)
+        for partial in parallel.map_chunks(_simplify_terms, list(self._terms.items())):
+            new_state._terms.update(partial)
 
         new_state._prune_zero_terms()
 
@@ -338,6 +657,16 @@ class State:
         other_term = next(iter(other._terms.keys()))
         return self_term._compatible(other_term)
 
+    @classmethod
+    def _from_arrays(cls, state_arrays):
+        """Constructs a state from :class:`~.arrays.StateArrays`."""
+        new_state = cls()
+        template = state_arrays.template
+        for index, amplitude in zip(state_arrays.indices.tolist(), state_arrays.amplitudes.tolist()):
+            new_state._terms[template._from_vector_index(index)] = amplitude
+
+        return new_state
+
     def _prune_zero_terms(self):
         to_remove = []
         for base_state, scalar in list(self._terms.items()):
@@ -352,3 +681,58 @@ class State:
         for base_state, scalar in self._terms.items():
             to_return += f"{scalar.conjugate()}*{base_state._bra_str()} + "
         return to_return[:-3]
+
+
+def _inner_product_terms(pairs):
+    """Computes the terms of an inner product from pairs of base states and their scalars."""
+    terms = []
+    for self_base_state, self_scalar, other_base_state, other_scalar in pairs:
+        base_inner = self_base_state.inner_product(other_base_state)
+        if any(is_zero(factor) for factor in [self_scalar, other_scalar, base_inner]):
+            continue
+        terms.append((self_scalar.conjugate() * other_scalar) * base_inner)
+
+    return terms
+
+
+def _simplify_terms(terms):
+    """Simplifies the scalars of a list of terms, i.e. pairs of base objects and scalars."""
+    return [(base, simplify(scalar)) for base, scalar in terms]
+
+
+def non_orthogonal_pairs(left_base_states, right_base_states):
+    """Yields the pairs of base states, one from each of the given iterables, which might not be orthogonal.
+
+    The right base states are indexed by their orthogonality key (see :meth:`~.BaseState._orthogonality_key`)
+    such that each left base state is only paired with the right base states in the same bucket,
+    instead of with all of them.
+
+    Parameters
+    ----------
+    left_base_states : iterable of :class:`~.BaseState`
+        The left base states.
+    right_base_states : iterable of :class:`~.BaseState`
+        The right base states.
+
+    Yields
+    ------
+    tuple of :class:`~.BaseState`
+        A left and right base state.
+    """
+    right_base_states = list(right_base_states)
+    buckets = defaultdict(list)
+    unknown = []
+    for right in right_base_states:
+        key = right._orthogonality_key()
+        if key is None:
+            unknown.append(right)
+        else:
+            buckets[key].append(right)
+    for left in left_base_states:
+        key = left._orthogonality_key()
+        if key is None:
+            candidates = right_base_states
+        else:
+            candidates = buckets.get(key, []) + unknown
+        for right in candidates:
+            yield left, right
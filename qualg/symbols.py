@@ -0,0 +1,115 @@
+"""
+Global table of the names of variables and modes.
+
+Each name is interned as a :class:`~.Symbol`, which is a small integer (in order of first use), such that
+hashing and comparing variables and modes, as well as sets of them, only involve integers.
+Symbols print as the names they represent, and the scalars, states and integration accept names either as
+strings or symbols.
+
+A primed variable, e.g. "w''", is represented by its base name ("w") and a generation (the number of primes).
+Priming a symbol (see :func:`~.toolbox.replace_var`) looks up the symbol of the next generation in the table,
+without building a new name. The name of a symbol is only built when it is printed.
+
+Note
+----
+The table is never cleared, since symbols need to stay unique and names are few compared to the objects
+using them.
+"""
+import threading
+
+# The symbols of names as given (e.g. "w''") and of (base name, generation)
+_BY_NAME = {}
+_BY_GENERATION = {}
+# The base name, generation, printed name (when built) and primed symbol (when used) of each symbol
+_BASES = []
+_GENERATIONS = []
+_NAMES = []
+_PRIMED = []
+# Guards adding symbols, e.g. by the workers of a thread executor
+_LOCK = threading.Lock()
+
+
+class Symbol(int):
+    """An interned name of a variable or mode, see :func:`~.symbol`."""
+    __slots__ = ()
+
+    def __str__(self):
+        name = _NAMES[self]
+        if name is None:
+            name = _NAMES[self] = _BASES[self] + "'" * _GENERATIONS[self]
+        return name
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+    def __reduce__(self):
+        # Symbols are only unique within a process, so they are pickled by name
+        return symbol, (str(self),)
+
+    @property
+    def base(self):
+        """The name without primes."""
+        return _BASES[self]
+
+    @property
+    def generation(self):
+        """The number of primes."""
+        return _GENERATIONS[self]
+
+
+def symbol(name):
+    """Returns the symbol of a name, adding it to the table if new.
+
+    Parameters
+    ----------
+    name : str or :class:`~.Symbol`
+        The name of a variable or mode.
+
+    Returns
+    -------
+    :class:`~.Symbol`
+    """
+    if isinstance(name, Symbol):
+        return name
+    sym = _BY_NAME.get(name)
+    if sym is None:
+        name = str(name)
+        base = name.rstrip("'")
+        sym = _BY_NAME[name] = _symbol(base, len(name) - len(base))
+    return sym
+
+
+def prime(name):
+    """Returns the primed symbol, i.e. of the next generation, e.g. "w'" for "w".
+
+    Parameters
+    ----------
+    name : str or :class:`~.Symbol`
+
+    Returns
+    -------
+    :class:`~.Symbol`
+    """
+    sym = symbol(name)
+    primed = _PRIMED[sym]
+    if primed is None:
+        primed = _PRIMED[sym] = _symbol(_BASES[sym], _GENERATIONS[sym] + 1)
+    return primed
+
+
+def _symbol(base, generation):
+    sym = _BY_GENERATION.get((base, generation))
+    if sym is None:
+        with _LOCK:
+            sym = _BY_GENERATION.get((base, generation))
+            if sym is None:
+                sym = Symbol(len(_BASES))
+                _BASES.append(base)
+                _GENERATIONS.append(generation)
+                _NAMES.append(None)
+                _PRIMED.append(None)
+                _BY_GENERATION[(base, generation)] = sym
+    return sym
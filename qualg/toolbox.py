@@ -3,6 +3,9 @@
 import math
 from copy import copy
 
+from qualg.profiling import profiled
+from qualg.symbols import Symbol, symbol, prime
+
 
 def is_list_or_tuple(var):
     """Checks if an object is a list or a tuple"""
@@ -16,11 +19,12 @@ def assert_list_or_tuple(var):
 
 
 def assert_str(var):
-    """Asserts that an object is a str"""
-    if not isinstance(var, str):
+    """Asserts that an object is a str (or a :class:`~.symbols.Symbol`, i.e. an interned name)"""
+    if not isinstance(var, (str, Symbol)):
         raise TypeError(f"variable should be a str, not a {type(var)}")
 
 
+@profiled("simplify")
 def simplify(obj):
     """Tries to simplify an object"""
     if hasattr(obj, "simplify"):
@@ -62,8 +66,8 @@ def replace_var(obj, old_variable=None, new_variable=None):
                 new_obj = replace_var(new_obj, old_variable=old_variable)
             return new_obj
         if new_variable is None:
-            new_variable = old_variable + "'"
-        return obj.replace_var(old_variable, new_variable)
+            new_variable = prime(old_variable)
+        return obj.replace_var(symbol(old_variable), symbol(new_variable))
     return copy(obj)
 
 
@@ -77,5 +81,5 @@ def get_variables(obj):
 def has_variable(obj, variable):
     """Tries to check if an object has a variable."""
     if hasattr(obj, "has_variable"):
-        return obj.has_variable(variable)
+        return obj.has_variable(symbol(variable))
     return False
@@ -16,7 +16,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/AckslD/QuAlg",
     include_package_data=True,
-    packages=setuptools.find_packages(exclude=('tests', 'docs', 'examples')),
+    packages=setuptools.find_packages(exclude=('tests', 'docs', 'examples', 'benchmarks', 'benchmarks.*')),
     install_requires=install_requires,
     python_requires='>=3.6',
 )
@@ -0,0 +1,35 @@
+"""Builders of operators and states shared by the tests."""
+from qualg.scalars import SingleVarFunctionScalar
+from qualg.q_state import BaseQubitState
+from qualg.fock_state import BaseFockState, FockOp
+from qualg.states import State
+from qualg.operators import BaseOperator, Operator
+
+
+def fock_beam_splitter():
+    # Maps qubit states to single photons in mode 'c' or 'd' (with some amplitudes)
+    f = SingleVarFunctionScalar("f", "w")
+    c = BaseFockState([FockOp("c", "w")])
+    d = BaseFockState([FockOp("d", "w")])
+    return Operator(
+        [BaseOperator(c, BaseQubitState("0")), BaseOperator(d, BaseQubitState("0")),
+         BaseOperator(c, BaseQubitState("1")), BaseOperator(d, BaseQubitState("1"))],
+        [f, f, f, -1 * f],
+    )
+
+
+def fock_operator(num_terms):
+    # Projector onto a sum of single photons in different modes
+    base_states = [BaseFockState([FockOp(f"c{i}", "w")]) for i in range(num_terms)]
+    functions = [SingleVarFunctionScalar(f"f{i}", "w") for i in range(num_terms)]
+    return Operator(
+        [BaseOperator(bs1, bs2) for bs1 in base_states for bs2 in base_states],
+        [f1 * f2.conjugate() for f1 in functions for f2 in functions],
+    )
+
+
+def fock_state(num_terms):
+    return State(
+        [BaseFockState([FockOp(f"c{i}", "w")]) for i in range(num_terms)],
+        [SingleVarFunctionScalar(f"f{i}", "w") for i in range(num_terms)],
+    )
@@ -0,0 +1,93 @@
+import numpy as np
+
+from qualg import arrays
+from qualg.q_state import BaseQubitState, BaseQuditState
+from qualg.operators import Operator, BaseOperator
+from qualg.scalars import Variable
+
+
+def _random_operator(rng, num_qubits, num_terms):
+    base_states = [BaseQubitState(format(i, f"0{num_qubits}b")) for i in range(2 ** num_qubits)]
+    rows = rng.integers(2 ** num_qubits, size=num_terms)
+    cols = rng.integers(2 ** num_qubits, size=num_terms)
+    amplitudes = rng.normal(size=num_terms) + 1j * rng.normal(size=num_terms)
+    base_ops = [BaseOperator(base_states[r], base_states[c]) for r, c in zip(rows, cols)]
+    return Operator(base_ops, [complex(a) for a in amplitudes])
+
+
+def _random_state(rng, num_qubits, num_terms):
+    op = _random_operator(rng, num_qubits, num_terms)
+    return sum((BaseQubitState("0" * num_qubits).to_state() * 0 + bop._left.to_state() * scalar
+                for bop, scalar in op), 0)
+
+
+def test_operator_arrays():
+    rng = np.random.default_rng(1)
+    op = _random_operator(rng, 3, 10)
+    op_arrays = arrays.operator_arrays(op)
+    assert op_arrays is not None
+    assert Operator._from_arrays(op_arrays) == op
+
+
+def test_symbolic_fallback():
+    a = Variable("a")
+    s = BaseQubitState("0").to_state() * a
+    assert arrays.state_arrays(s) is None
+    assert arrays.state_arrays(BaseQubitState("0").to_state()) is not None
+    assert arrays.state_arrays(BaseQubitState("0").to_state() * 0.5) is not None
+    # Symbolic scalars still work
+    assert s.inner_product(s) == a.conjugate() * a
+
+
+def test_mul_operator():
+    rng = np.random.default_rng(2)
+    op1 = _random_operator(rng, 4, 30)
+    op2 = _random_operator(rng, 4, 30)
+    expected = op1.to_numpy_matrix() @ op2.to_numpy_matrix()
+    assert np.allclose((op1 * op2).to_numpy_matrix(), expected)
+
+
+def test_mul_state():
+    rng = np.random.default_rng(3)
+    op = _random_operator(rng, 4, 30)
+    state = _random_state(rng, 4, 10)
+    expected = op.to_numpy_matrix() @ state.to_numpy_vector()
+    assert np.allclose((op * state).to_numpy_vector(), expected)
+
+
+def test_expectation():
+    rng = np.random.default_rng(5)
+    op = _random_operator(rng, 4, 30)
+    state = _random_state(rng, 4, 10)
+    v = state.to_numpy_vector()
+    expectation = arrays.expectation(arrays.operator_arrays(op), arrays.state_arrays(state))
+    assert np.isclose(expectation, np.vdot(v, op.to_numpy_matrix() @ v))
+
+
+def test_inner_and_tensor_product():
+    rng = np.random.default_rng(4)
+    state1 = _random_state(rng, 3, 5)
+    state2 = _random_state(rng, 2, 3)
+    v1 = state1.to_numpy_vector()
+    v2 = state2.to_numpy_vector()
+    assert np.isclose(state1.inner_product(state1), np.vdot(v1, v1))
+    assert np.allclose((state1 @ state2).to_numpy_vector(), np.kron(v1, v2))
+
+
+def test_qudits():
+    s = BaseQuditState("12", base=3).to_state() + BaseQuditState("02", base=3).to_state()
+    t = BaseQuditState("2", base=3).to_state()
+    tensor = s @ t
+    assert tensor == BaseQuditState("122", base=3).to_state() + BaseQuditState("022", base=3).to_state()
+    assert tensor.inner_product(tensor) == 2
+
+
+def test_many_qubits():
+    # The size of the arrays should not depend on the dimension
+    n = 40
+    zeros = BaseQubitState("0" * n).to_state()
+    ones = BaseQubitState("1" * n).to_state()
+    op = Operator([BaseOperator(BaseQubitState("1" * n), BaseQubitState("0" * n))], [0.5])
+    assert op * (zeros + ones) == ones * 0.5
+    assert op * op.dagger() == Operator([BaseOperator(BaseQubitState("1" * n), BaseQubitState("1" * n))], [0.25])
+    assert len(op.dagger() * op * ones) == 0
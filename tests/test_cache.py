@@ -0,0 +1,89 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from qualg.cache import LRUCache, cached, cache_stats, clear_cache, enable_cache, disable_cache
+from qualg.toolbox import simplify, replace_var
+from qualg.integrate import integrate
+from qualg.scalars import SingleVarFunctionScalar, DeltaFunction, InnerProductFunction
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    clear_cache()
+    yield
+    disable_cache()
+    clear_cache()
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions, stats.size, stats.maxsize) == (3, 1, 1, 2, 2)
+
+
+def test_lru_cache_threads():
+    cache = LRUCache(maxsize=8)
+
+    def use(offset):
+        for i in range(2000):
+            key = (i + offset) % 16
+            if cache.get(key) is None:
+                cache.put(key, key)
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(use, range(4)))
+    stats = cache.stats()
+    assert stats.hits + stats.misses == 4 * 2000
+    assert stats.size == 8
+    cache.resize(2)
+    assert len(cache) == 2
+    assert cache.stats().evictions == stats.evictions + 6
+
+
+def test_disabled():
+    f = SingleVarFunctionScalar("f", "x")
+    simplify(f * f + f * f)
+    assert all(stats.hits + stats.misses == 0 for stats in cache_stats().values())
+
+
+def test_integrate_alpha_renamed():
+    f = SingleVarFunctionScalar("f", "x")
+    g = SingleVarFunctionScalar("g", "y").conjugate()
+    expr = f * g * DeltaFunction("x", "y")
+    with cached():
+        assert integrate(expr) == InnerProductFunction("f", "g")
+        misses = cache_stats()["integrate"].misses
+        # The same integrand with primed variables should be found in the cache
+        assert integrate(replace_var(expr)) == InnerProductFunction("f", "g")
+        assert cache_stats()["integrate"].misses == misses
+        assert cache_stats()["integrate"].hits > 0
+
+
+def test_integrate_partial_renamed_back():
+    f = SingleVarFunctionScalar("f", "x")
+    g = SingleVarFunctionScalar("g", "y")
+    expr = f * g * DeltaFunction("x", "y")
+    expected = integrate(expr, "x")
+    with cached():
+        assert integrate(expr, "x") == expected
+        renamed = integrate(replace_var(replace_var(expr, "x", "u"), "y", "v"), "u")
+        assert cache_stats()["integrate"].hits > 0
+        assert renamed == replace_var(expected, "y", "v")
+
+
+def test_simplify_eviction():
+    enable_cache(maxsize=1)
+    a = SingleVarFunctionScalar("a", "x")
+    b = SingleVarFunctionScalar("b", "x")
+    assert simplify(a * b + b * a) == 2 * a * b
+    assert simplify(a * a + a * a) == 2 * a * a
+    stats = cache_stats()["simplify"]
+    assert stats.size == 1
+    assert stats.evictions > 0
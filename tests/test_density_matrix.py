@@ -0,0 +1,96 @@
+import pytest
+import numpy as np
+
+from qualg.density_matrix import DensityMatrix
+from qualg.q_state import BaseQubitState
+from qualg.fock_state import BaseFockState, FockOp
+from qualg.scalars import SingleVarFunctionScalar
+from qualg.operators import outer_product, Operator
+
+
+def _qubits(digits):
+    return BaseQubitState(digits).to_state()
+
+
+def _bell_state():
+    return (_qubits("00") + _qubits("11")) * (1 / np.sqrt(2))
+
+
+def test_from_state():
+    rho = DensityMatrix.from_state(_bell_state())
+    assert isinstance(rho, DensityMatrix)
+    assert isinstance(rho, Operator)
+    assert np.allclose(rho.to_numpy_matrix(), np.outer([1, 0, 0, 1], [1, 0, 0, 1]) / 2)
+    assert np.isclose(rho.trace(), 1)
+    assert DensityMatrix.from_operator(rho) == rho
+    with pytest.raises(TypeError):
+        DensityMatrix.from_state(BaseQubitState("0"))
+
+
+def test_mix():
+    rho = DensityMatrix.mix([_qubits("0"), DensityMatrix.from_state(_qubits("1"))], [0.25, 0.75])
+    assert isinstance(rho, DensityMatrix)
+    assert np.allclose(rho.to_numpy_matrix(), np.diag([0.25, 0.75]))
+    with pytest.raises(ValueError):
+        DensityMatrix.mix([_qubits("0"), _qubits("00")], [0.5, 0.5])
+    with pytest.raises(ValueError):
+        DensityMatrix.mix([_qubits("0")], [0.5, 0.5])
+
+
+def test_apply_channel():
+    rho = DensityMatrix.from_state(_bell_state())
+    # Dephasing of the parity
+    kraus_ops = [
+        outer_product(_qubits("00"), _qubits("00")) + outer_product(_qubits("11"), _qubits("11")),
+        outer_product(_qubits("01"), _qubits("01")) + outer_product(_qubits("10"), _qubits("10")),
+    ]
+    assert rho.apply_channel(kraus_ops) == rho
+    flip = outer_product(_qubits("0"), _qubits("1")) + outer_product(_qubits("1"), _qubits("0"))
+    kraus_ops = {0: flip * np.sqrt(0.5), 1: flip * flip * np.sqrt(0.5)}
+    bit_flip = DensityMatrix.from_state(_qubits("0")).apply_channel(kraus_ops)
+    assert isinstance(bit_flip, DensityMatrix)
+    assert np.allclose(bit_flip.to_numpy_matrix(), np.eye(2) / 2)
+
+
+def test_expectation():
+    z = outer_product(_qubits("0"), _qubits("0")) + outer_product(_qubits("1"), _qubits("1")) * -1
+    rho = DensityMatrix.mix([_qubits("0"), _qubits("1")], [0.25, 0.75])
+    assert np.isclose(rho.expectation(z), -0.5)
+    with pytest.raises(TypeError):
+        rho.expectation(_qubits("0"))
+
+
+def test_partial_trace_qubits():
+    rho = DensityMatrix.from_state(_bell_state() @ _qubits("1"))
+    reduced = rho.partial_trace([1, 2])
+    assert isinstance(reduced, DensityMatrix)
+    assert np.allclose(reduced.to_numpy_matrix(), np.eye(2) / 2)
+    reduced = rho.partial_trace(0)
+    assert np.allclose(reduced.to_numpy_matrix(), np.kron(np.eye(2) / 2, np.diag([0, 1])))
+    with pytest.raises(ValueError):
+        rho.partial_trace(3)
+    with pytest.raises(ValueError):
+        rho.partial_trace([0, 1, 2])
+
+
+def test_partial_trace_fock():
+    f = SingleVarFunctionScalar("f", "w")
+    g = SingleVarFunctionScalar("g", "v")
+    state = BaseFockState([FockOp("a", "w"), FockOp("b", "v")]).to_state() * (f * g)
+    rho = DensityMatrix.from_state(state)
+    assert rho.trace() == 1
+    reduced = rho.partial_trace("b")
+    expected = DensityMatrix.from_state(BaseFockState([FockOp("a", "w")]).to_state() * f)
+    assert reduced == expected
+    vacuum = BaseFockState().to_state()
+    assert rho.partial_trace(["a", "b"]) == outer_product(vacuum, vacuum)
+
+
+def test_split_subsystems():
+    left, right = BaseQubitState("0110")._split_subsystems({0, 3})
+    assert left == BaseQubitState("11")
+    assert right == BaseQubitState("00")
+    fock = BaseFockState([FockOp("a", "w"), FockOp("b", "v"), FockOp("a", "u")])
+    left, right = fock._split_subsystems({"a"})
+    assert left == BaseFockState([FockOp("b", "v")])
+    assert right == BaseFockState([FockOp("a", "w"), FockOp("a", "u")])
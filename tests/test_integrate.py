@@ -1,7 +1,9 @@
 import pytest
 
-from qualg.toolbox import has_variable
-from qualg.integrate import integrate
+from qualg.symbols import symbol
+from qualg.toolbox import has_variable, get_variables
+from qualg import integrate as integrate_module
+from qualg.integrate import integrate, register_integration_rule, _dispatch, _index_factors, _Integration
 from qualg.scalars import SingleVarFunctionScalar, DeltaFunction, InnerProductFunction,\
     ProductOfScalars, SumOfScalars
 
@@ -94,3 +96,85 @@ def test_has_variable():
     print(res)
     assert not has_variable(res, "x")
     assert has_variable(res, "y")
+
+
+def test_integrate_delta_chain():
+    # f(x0) * D[x0-x1] * ... * D[x4-y] integrated over x0, ..., x4
+    num = 5
+    variables = [f"x{i}" for i in range(num)] + ["y"]
+    deltas = [DeltaFunction(v1, v2) for v1, v2 in zip(variables[:-1], variables[1:])]
+    expr = ProductOfScalars([SingleVarFunctionScalar("f", "x0")] + deltas)
+    assert integrate(expr, set(variables[:-1])) == SingleVarFunctionScalar("f", "y")
+    # Also integrating over y gives the integral of f
+    res = integrate(expr, set(variables))
+    assert get_variables(res) == set()
+    assert isinstance(res, _Integration)
+
+
+def test_integrate_delta_free_variables():
+    f = SingleVarFunctionScalar("f", "x")
+    expr = ProductOfScalars([f, DeltaFunction("x", "y"), DeltaFunction("x", "z")])
+    res = integrate(expr, {"x"})
+    assert set(res) == {SingleVarFunctionScalar("f", "y"), DeltaFunction("y", "z")}
+
+
+def test_integrate_delta_cycle():
+    f = SingleVarFunctionScalar("f", "x")
+    g = SingleVarFunctionScalar("g", "y")
+    expr = ProductOfScalars([f, g, DeltaFunction("x", "y"), DeltaFunction("y", "x")])
+    with pytest.raises(ValueError):
+        integrate(expr, {"x", "y"})
+
+
+@pytest.fixture
+def restore_rules():
+    rules = {key: list(entries) for key, entries in integrate_module._RULES.items()}
+    yield
+    integrate_module._RULES.clear()
+    integrate_module._RULES.update(rules)
+    integrate_module._DISPATCH.clear()
+
+
+def test_register_integration_rule(restore_rules):
+    @register_integration_rule(SingleVarFunctionScalar, exact=True)
+    def _integrate_unit(integral, factors):
+        if factors[SingleVarFunctionScalar][0]._func_name == symbol("unit"):
+            return 1
+        return integral
+
+    assert integrate(SingleVarFunctionScalar("unit", "x"), "x") == 1
+    g = SingleVarFunctionScalar("g", "x")
+    assert integrate(g, "x") == _Integration(ProductOfScalars([g]), "x")
+    with pytest.raises(TypeError):
+        register_integration_rule("SingleVarFunctionScalar")
+
+
+def test_dispatch():
+    f = SingleVarFunctionScalar("f", "x")
+    g = SingleVarFunctionScalar("g", "x")
+    d = DeltaFunction("x", "y")
+    names = [rule.__name__ for rule in _dispatch(_index_factors(ProductOfScalars([f, g.conjugate()])))]
+    assert names == ["_find_norm_identities", "_find_function_inner_products"]
+    names = [rule.__name__ for rule in _dispatch(_index_factors(ProductOfScalars([f, g, d])))]
+    assert names == ["_evaluate_delta_function"]
+    assert _dispatch(_index_factors(ProductOfScalars([f]))) == []
+
+
+class _UnitFunction(SingleVarFunctionScalar):
+    __slots__ = ()
+
+
+def test_register_integration_rule_subclass(restore_rules):
+    @register_integration_rule(SingleVarFunctionScalar, exact=True)
+    def _integrate_unit(integral, factors):
+        if isinstance(factors[SingleVarFunctionScalar][0], _UnitFunction):
+            return 1
+        return integral
+
+    unit = _UnitFunction("u", "x")
+    assert type(unit) is _UnitFunction
+    assert integrate(unit, "x") == 1
+    # Built-in rules for the base class also apply to subclasses
+    names = [rule.__name__ for rule in _dispatch(_index_factors(ProductOfScalars([unit, DeltaFunction("x", "y")])))]
+    assert names == ["_evaluate_delta_function"]
+    assert integrate(ProductOfScalars([unit, DeltaFunction("x", "y")]), "x") == _UnitFunction("u", "y")
@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+
+from qualg.lazy import lazy, LazyExpression, _chain_order
+from qualg.profiling import track
+from qualg.toolbox import simplify, replace_var
+from qualg.q_state import BaseQubitState
+from qualg.fock_state import BaseFockState, FockOp
+from qualg.operators import outer_product
+
+from builders import fock_beam_splitter
+
+
+def _qubit_projectors():
+    states = [BaseQubitState(label).to_state() for label in ["00", "01", "10", "11"]]
+    return [outer_product(s1, s2) for s1 in states for s2 in states]
+
+
+def test_lazy():
+    op = _qubit_projectors()[0]
+    expr = lazy(op)
+    assert isinstance(expr, LazyExpression)
+    assert lazy(expr) is expr
+    assert expr.evaluate() is op
+    with pytest.raises(TypeError):
+        lazy(BaseQubitState("0"))
+
+
+def test_sandwich():
+    u = fock_beam_splitter()
+    c = BaseFockState([FockOp("c", "p")])
+    p = outer_product(c.to_state(), c.to_state())
+    expected = simplify(u.dagger() * p * replace_var(u))
+    assert (lazy(u).dagger() * lazy(p) * lazy(replace_var(u))).simplify() == expected
+    assert (lazy(u).dagger() * p * replace_var(u)).simplify() == expected
+
+
+def test_fused_sum():
+    ops = _qubit_projectors()
+    expected = ops[0]
+    for op in ops[1:]:
+        expected = expected + op
+    expr = sum(lazy(op) for op in ops)
+    assert expr.evaluate() == expected
+    assert np.allclose(expr.to_numpy_matrix(), np.ones((4, 4)))
+    # Deep sums should not hit the recursion limit
+    assert sum(lazy(op) for op in ops * 200).evaluate() == expected * 200
+
+
+def test_scale_and_subtract():
+    op = _qubit_projectors()[1]
+    assert (2 * lazy(op) - lazy(op)).evaluate() == op
+    assert (lazy(op) / 2 + lazy(op) * 0.5).evaluate() == op
+    assert len((lazy(op) - op).evaluate()) == 0
+    assert (op - lazy(op) * 2).evaluate() == op * -1
+
+
+def test_dagger_and_states():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    op = outer_product(s1, s0)
+    assert lazy(op).dagger().evaluate() == op.dagger()
+    assert (lazy(op) * lazy(s0)).evaluate() == s1
+    assert (lazy(s0) + s1).evaluate() == s0 + s1
+    assert (lazy(s0) @ s1 @ lazy(s0)).evaluate() == s0 @ s1 @ s0
+    assert np.allclose((lazy(op) * s0).to_numpy_vector(), [0, 1])
+    with pytest.raises(TypeError):
+        (lazy(s0) + op).evaluate()
+    with pytest.raises(ValueError):
+        (lazy(s0) + BaseQubitState("00").to_state()).evaluate()
+
+
+def test_shared_subexpression():
+    ops = _qubit_projectors()
+    shared = lazy(ops[0]) * lazy(ops[1])
+    expr = shared + shared * 2 + shared.dagger()
+    with track() as tracker:
+        result = expr.evaluate()
+    assert tracker.calls["Operator._mul_operator"].calls == 1
+    product = ops[0] * ops[1]
+    assert result == product * 3 + product.dagger()
+
+
+def test_chain_order():
+    # Classic example where (A * B) * C is cheaper than A * (B * C)
+    split = _chain_order([(10, 100), (100, 5), (5, 50)])
+    assert split[0][2] == 1
+    assert split[0][1] == 0
+    split = _chain_order([(50, 5), (5, 100), (100, 10)])
+    assert split[0][2] == 0
@@ -1,7 +1,8 @@
 import pytest
 import numpy as np
 
-from qualg.measure import measure
+from qualg.measure import measure, measure_many, measurement_distribution, sweep_probabilities, POVM
+from qualg.scalars import Variable, InnerProductFunction
 from qualg.q_state import BaseQubitState
 from qualg.operators import outer_product
 
@@ -46,3 +47,119 @@ def test_non_complete_kraus():
     op = outer_product(s0, s0)
     with pytest.raises(ValueError):
         measure(s1, {"0": op})
+
+
+def test_povm():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    povm = POVM({0: outer_product(s0, s0), 1: outer_product(s1, s1)})
+    assert list(povm) == [0, 1]
+    assert povm[1] == outer_product(s1, s1)
+    assert povm.effects[0] == outer_product(s0, s0)
+    assert povm.effects is povm.effects
+    assert povm.is_valid()
+    povm.validate()
+    assert measure(s1, povm).outcome == 1
+
+    incomplete = POVM({0: outer_product(s0, s0)})
+    assert not incomplete.is_valid()
+    with pytest.raises(ValueError):
+        incomplete.validate()
+    with pytest.raises(TypeError):
+        POVM([outer_product(s0, s0)])
+    with pytest.raises(NotImplementedError):
+        POVM({0: outer_product(s0, s0) * Variable("a")}).is_valid()
+
+
+def test_povm_cached():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    povm = POVM({0: outer_product(s0, s0), 1: outer_product(s1, s1)})
+    assert povm.is_valid()
+    # The result is cached on the object
+    povm._effects = {}
+    assert povm.is_valid()
+
+
+def test_probabilities_from_effects():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    h0 = (s0 + s1) * (1 / np.sqrt(2))
+    povm = POVM({0: outer_product(s0, s0), 1: outer_product(s1, s1)})
+    # The probabilities are computed from the cached effects <psi|E|psi>
+    povm._effects = {0: outer_product(s0, s0) * 0.25, 1: outer_product(s1, s1) * 0.75}
+    distribution = measurement_distribution(h0, povm)
+    assert np.isclose(distribution[0].probability, 0.125)
+    assert np.isclose(distribution[1].probability, 0.375)
+    # Also when the scalars are not numbers
+    a = Variable("a")
+    state = s0 * a + s1 * np.sqrt(0.5)
+    table = sweep_probabilities(state, povm, {"a": [np.sqrt(0.5)]})
+    assert np.allclose(table, [[0.125, 0.375]])
+
+
+def test_measurement_distribution():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    h0 = (s0 + s1) * (1 / np.sqrt(2))
+    kraus_ops = {0: outer_product(s0, s0), 1: outer_product(s1, s1)}
+    distribution = measurement_distribution(h0, kraus_ops, validate=True)
+    assert set(distribution) == {0, 1}
+    for outcome, state in [(0, s0), (1, s1)]:
+        assert distribution[outcome].outcome == outcome
+        assert np.isclose(distribution[outcome].probability, 1 / 2)
+        assert np.allclose(distribution[outcome].post_meas_state.to_numpy_vector(), state.to_numpy_vector())
+    distribution = measurement_distribution(s0, POVM(kraus_ops))
+    assert distribution[1].probability == 0
+    assert distribution[1].post_meas_state is None
+    with pytest.raises(ValueError):
+        measurement_distribution(s0, {0: kraus_ops[0]}, validate=True)
+
+
+def test_measure_many():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    state = s0 * np.sqrt(0.2) + s1 * np.sqrt(0.8)
+    kraus_ops = {"zero": outer_product(s0, s0), "one": outer_product(s1, s1)}
+    shots = 10000
+    result = measure_many(state, kraus_ops, shots, rng=np.random.default_rng(42))
+    assert len(result.samples) == shots
+    assert set(result.samples) == {"zero", "one"}
+    assert sum(result.counts.values()) == shots
+    assert result.counts["zero"] == np.sum(result.samples == "zero")
+    assert abs(result.counts["zero"] / shots - 0.2) < 0.02
+    assert np.isclose(result.probabilities["one"], 0.8)
+    assert result.post_meas_states["one"] == s1
+    assert result.post_meas_states["one"] is result.post_meas_states["one"]
+    # Same generator gives the same samples
+    again = measure_many(state, kraus_ops, shots, rng=np.random.default_rng(42))
+    assert np.all(result.samples == again.samples)
+
+
+def test_measure_many_zero_probability():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    kraus_ops = {0: outer_product(s0, s0), 1: outer_product(s1, s1)}
+    result = measure_many(s0, kraus_ops, 100)
+    assert result.counts == {0: 100, 1: 0}
+    assert list(result.post_meas_states) == [0]
+    with pytest.raises(ValueError):
+        measure_many(s1, {0: kraus_ops[0]}, 10)
+    with pytest.raises(ValueError):
+        measure_many(s0, kraus_ops, -1)
+
+
+def test_sweep_probabilities():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    a = Variable("a")
+    state = s0 * a + s1 * InnerProductFunction("f", "g")
+    kraus_ops = {0: outer_product(s0, s0), 1: outer_product(s1, s1)}
+    amplitudes = np.linspace(0, 1, 11)
+    table = sweep_probabilities(state, kraus_ops, {"a": amplitudes, "v": [0.5]},
+                                bindings={InnerProductFunction("f", "g"): "v"}, chunk_size=3)
+    assert table.shape == (11, 2)
+    assert np.allclose(table[:, 0], amplitudes ** 2)
+    assert np.allclose(table[:, 1], 0.25)
+    with pytest.raises(TypeError):
+        sweep_probabilities(state, [kraus_ops[0]], {"a": amplitudes})
@@ -0,0 +1,117 @@
+import pytest
+import numpy as np
+
+import qualg
+from qualg.numeric import lambdify
+from qualg.scalars import Variable, AbsoluteVariable, InnerProductFunction, SingleVarFunctionScalar,\
+    DeltaFunction, ProductOfScalars, SumOfScalars
+from qualg.q_state import BaseQubitState
+from qualg.fock_state import BaseFockState, FockOp
+from qualg.operators import outer_product
+
+
+def test_lambdify():
+    assert qualg.lambdify is lambdify
+
+
+def test_lambdify_scalar():
+    x = Variable("x")
+    ip = InnerProductFunction("f", "g")
+    scalar = SumOfScalars([
+        1, ProductOfScalars([2, x, x]), ProductOfScalars([x.conjugate(), ip]), AbsoluteVariable("y"),
+    ])
+    f = lambdify(scalar, {ip: "v"})
+    assert f.parameters == ("v", "x", "y")
+    assert f.shape == ()
+    xs = np.array([1, 1j, 2 + 1j])
+    out = f(x=xs, v=0.5, y=np.array([[1], [2]]))
+    assert out.shape == (2, 3)
+    expected = 1 + 2 * xs ** 2 + np.conj(xs) * 0.5 + np.array([[1], [4]])
+    assert np.allclose(out, expected)
+    assert np.isclose(lambdify(scalar, {ip: 0.5})(x=1, y=1), 4.5)
+    assert lambdify(3)() == 3
+
+
+def test_lambdify_integrate():
+    f = SingleVarFunctionScalar("f", "x")
+    g = SingleVarFunctionScalar("g", "y").conjugate()
+    scalar = ProductOfScalars([f, g, DeltaFunction("x", "y"), Variable("a")])
+    out = lambdify(scalar, {InnerProductFunction("f", "g"): "v"})(a=2, v=np.linspace(0, 1, 5))
+    assert np.allclose(out, 2 * np.linspace(0, 1, 5))
+
+
+def test_lambdify_operator():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    x = Variable("x")
+    op = outer_product(s0, s0) + outer_product(s0, s1) * x + outer_product(s1, s0) * x.conjugate()
+    f = lambdify(op)
+    xs = np.linspace(0, 1, 7) * 1j
+    out = f(x=xs)
+    assert out.shape == (7, 2, 2)
+    for x_value, matrix in zip(xs, out):
+        assert np.allclose(matrix, [[1, x_value], [np.conj(x_value), 0]])
+    state = lambdify((s0 + s1) * x)
+    assert np.allclose(state(x=[1, 2]), [[1, 1], [2, 2]])
+
+
+def test_lambdify_errors():
+    with pytest.raises(ValueError):
+        lambdify(InnerProductFunction("f", "g"))
+    with pytest.raises(ValueError):
+        lambdify(BaseFockState([FockOp("c", "x")]).to_state())
+    with pytest.raises(TypeError):
+        lambdify("x")
+    f = lambdify(Variable("x"))
+    with pytest.raises(TypeError):
+        f()
+    with pytest.raises(TypeError):
+        f(x=1, y=2)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_sweep(chunk_size):
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    x = Variable("x")
+    y = Variable("y")
+    op = outer_product(s0, s1) * x + outer_product(s1, s0) * y
+    param_grid = {"x": np.linspace(0, 1, 5), "y": [1, 2, 3]}
+    out = op.sweep(param_grid, chunk_size=chunk_size)
+    assert out.shape == (15, 2, 2)
+    f = lambdify(op)
+    for i, (x_value, y_value) in enumerate((x_value, y_value) for x_value in param_grid["x"]
+                                           for y_value in param_grid["y"]):
+        assert np.allclose(out[i], f(x=x_value, y=y_value))
+    with pytest.raises(ValueError):
+        op.sweep(param_grid, chunk_size=0)
+
+
+def test_sweep_chunked():
+    x = Variable("x")
+    y = Variable("y")
+    z = Variable("z")
+    f = lambdify([x * y, x + z.conjugate(), y * z])
+    param_grid = {"x": np.linspace(0, 1, 11), "y": np.arange(7), "z": [1j, 2, -3]}
+    unchunked = f.sweep(param_grid, chunk_size=11 * 7 * 3)
+    chunked = f.sweep(param_grid, chunk_size=10)
+    assert chunked.shape == (231, 3)
+    assert np.allclose(chunked, unchunked)
+
+
+def test_lambdify_bound_variable():
+    x = Variable("x")
+    y = Variable("y")
+    scalar = SumOfScalars([ProductOfScalars([x, x.conjugate()]), y])
+    f = lambdify(scalar, {x: 2})
+    assert f.parameters == ("y",)
+    assert np.isclose(f(y=1), 5)
+    f = lambdify(SumOfScalars([x.conjugate(), AbsoluteVariable("x")]), {x: 1j})
+    assert f.parameters == ()
+    assert np.isclose(f(), -1j + 1)
+    f = lambdify(SumOfScalars([x.conjugate(), AbsoluteVariable("x")]), {x: "p"})
+    assert f.parameters == ("p",)
+    assert np.isclose(f(p=1j), -1j + 1)
+    # A binding of the conjugate itself takes precedence
+    f = lambdify(SumOfScalars([x, x.conjugate()]), {x: 2, x.conjugate(): 3})
+    assert np.isclose(f(), 5)
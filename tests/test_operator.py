@@ -1,11 +1,18 @@
+import os
+import sys
+import pickle
+import subprocess
 import pytest
 import numpy as np
 
+from qualg.symbols import symbol
 from qualg.toolbox import get_variables, replace_var, simplify
-from qualg.q_state import BaseQubitState
-from qualg.operators import outer_product, BaseOperator, Operator
+from qualg.q_state import BaseQubitState, BaseQuditState
+from qualg.operators import outer_product, sandwich, BaseOperator, Operator, LocalOperator
 from qualg.fock_state import BaseFockState, FockOp
-from qualg.scalars import InnerProductFunction
+from qualg.scalars import InnerProductFunction, SingleVarFunctionScalar, Variable
+
+from builders import fock_beam_splitter
 
 
 def test_faulty_init_base_operator():
@@ -92,8 +99,8 @@ def test_fock_base_op():
     bsav = BaseFockState([FockOp("a", "v")])
     bopaw = BaseOperator(bsaw, bsaw)
     bopav = BaseOperator(bsav, bsav)
-    assert get_variables(bopaw) == set(["w"])
-    assert get_variables(bopav) == set(["v"])
+    assert get_variables(bopaw) == set([symbol("w")])
+    assert get_variables(bopav) == set([symbol("v")])
     new = replace_var(bopaw, "w", "v")
     assert bopav == new
 
@@ -174,7 +181,227 @@ def test_operator_variables():
     bsav = BaseFockState([FockOp("a", "v")])
     opaw = BaseOperator(bsaw, bsaw).to_operator()
     opav = BaseOperator(bsav, bsav).to_operator()
-    assert get_variables(opaw) == set(["w"])
-    assert get_variables(opav) == set(["v"])
+    assert get_variables(opaw) == set([symbol("w")])
+    assert get_variables(opav) == set([symbol("v")])
     new = replace_var(opaw, "w", "v")
     assert opav == new
+
+
+def test_to_numpy_matrix_complex():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    Y = outer_product(s1, s0) * 1j + outer_product(s0, s1) * (-1j)
+    expected = np.array([[0, -1j], [1j, 0]])
+    assert np.all(np.isclose(Y.to_numpy_matrix(), expected))
+
+
+def test_to_sparse_matrix():
+    phi = (BaseQubitState("00").to_state() + BaseQubitState("11").to_state() * 1j) * (1 / np.sqrt(2))
+    op = outer_product(phi, phi)
+    m = op.to_sparse_matrix()
+    assert m.format == "csr"
+    assert m.nnz == 4
+    assert np.all(np.isclose(m.toarray(), op.to_numpy_matrix()))
+    assert op.to_sparse_matrix(format="coo").format == "coo"
+
+
+def test_to_matrix_convert_unique_scalars():
+    xy = InnerProductFunction("x", "y")
+    phi = xy * (BaseQubitState("00").to_state() + BaseQubitState("11").to_state())
+    op = outer_product(phi, phi)
+    converted = []
+
+    def convert_scalars(scalar, value):
+        converted.append(scalar)
+        return value
+
+    m = op.to_sparse_matrix(convert_scalars=convert_scalars, value=0.5)
+    assert len(converted) == 1
+    assert np.all(np.isclose(m.toarray(), np.array([[1, 0, 0, 1], [0, 0, 0, 0], [0, 0, 0, 0], [1, 0, 0, 1]]) / 2))
+
+
+def test_to_matrix_undefined_shape():
+    bsaw = BaseFockState([FockOp("a", "w")])
+    op = BaseOperator(bsaw, bsaw).to_operator()
+    assert op.shape is None
+    with pytest.raises(ValueError):
+        op.to_numpy_matrix()
+    with pytest.raises(ValueError):
+        op.to_sparse_matrix()
+
+
+def test_mul_operator_symbolic_accumulate():
+    a, b, c, d = (Variable(name) for name in "abcd")
+    bs0 = BaseQubitState("0")
+    bs1 = BaseQubitState("1")
+    A = Operator([BaseOperator(bs0, bs0), BaseOperator(bs0, bs1)], [a, b])
+    B = Operator([BaseOperator(bs0, bs0), BaseOperator(bs1, bs0)], [c, d])
+    prod = A * B
+    assert len(prod) == 1
+    assert simplify(prod.get_scalar(BaseOperator(bs0, bs0))) == simplify(a * c + b * d)
+
+
+def test_mul_operator_fock_orthogonal_modes():
+    f = SingleVarFunctionScalar("f", "w")
+    g = SingleVarFunctionScalar("g", "v")
+    sa = BaseFockState([FockOp("a", "w")]).to_state() * f
+    sb = BaseFockState([FockOp("b", "v")]).to_state() * g
+    op = outer_product(sa, sa) + outer_product(sb, sb)
+    prod = op * replace_var(op)
+    assert len(prod) == 2
+    for base_op, scalar in prod:
+        assert base_op._left._compatible(base_op._right)
+        assert get_variables(scalar) <= get_variables(base_op)
+
+
+def test_slots():
+    bs = BaseQubitState("0")
+    objs = [bs, BaseOperator(bs, bs), bs.to_state(), outer_product(bs.to_state(), bs.to_state())]
+    for obj in objs:
+        assert not hasattr(obj, "__dict__")
+
+
+def test_pickle_other_process():
+    # The cached hashes depend on the hashes of strings, which are different in another process
+    code = (
+        "import pickle, sys\n"
+        "from qualg.operators import BaseOperator\n"
+        "from qualg.fock_state import BaseFockState, FockOp\n"
+        "bs = BaseFockState([FockOp('a', 'w'), FockOp('b', 'v')])\n"
+        "sys.stdout.buffer.write(pickle.dumps(BaseOperator(bs, bs)))\n"
+    )
+    env = dict(os.environ, PYTHONHASHSEED="1")
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, check=True).stdout
+    base_op = pickle.loads(output)
+    bs = BaseFockState([FockOp('a', 'w'), FockOp('b', 'v')])
+    assert hash(base_op) == hash(BaseOperator(bs, bs))
+    assert base_op in {BaseOperator(bs, bs): 1}
+
+
+def test_sandwich():
+    u = fock_beam_splitter()
+    c = BaseFockState([FockOp("c", "p")])
+    d = BaseFockState([FockOp("d", "p")])
+    projectors = [
+        outer_product(c.to_state(), c.to_state()),
+        outer_product(d.to_state(), d.to_state()),
+        outer_product(c.to_state() + d.to_state(), c.to_state()),
+    ]
+    expected = [simplify(u.dagger() * p * replace_var(u)) for p in projectors]
+    outputs = sandwich(u, projectors)
+    assert len(outputs) == len(projectors)
+    for output, p, exp in zip(outputs, projectors, expected):
+        assert simplify(output) == exp
+        assert simplify(p.conjugate_by(u)) == exp
+    assert simplify(sandwich(u, projectors[0])) == expected[0]
+
+
+def test_sandwich_numeric():
+    u = Operator([BaseOperator(BaseQubitState("0"), BaseQubitState("1")),
+                  BaseOperator(BaseQubitState("1"), BaseQubitState("0"))])
+    p = outer_product(BaseQubitState("0").to_state(), BaseQubitState("0").to_state())
+    assert p.conjugate_by(u) == outer_product(BaseQubitState("1").to_state(), BaseQubitState("1").to_state())
+    with pytest.raises(TypeError):
+        sandwich(u, [BaseQubitState("0")])
+    with pytest.raises(ValueError):
+        sandwich(u, [outer_product(BaseQubitState("00").to_state(), BaseQubitState("00").to_state())])
+
+
+def _hadamard():
+    s0 = BaseQubitState("0").to_state()
+    s1 = BaseQubitState("1").to_state()
+    return (outer_product(s0 + s1, s0) + outer_product(s0 + s1 * -1, s1)) * (2 ** -0.5)
+
+
+def _cnot():
+    s = {label: BaseQubitState(label).to_state() for label in ["00", "01", "10", "11"]}
+    return (outer_product(s["00"], s["00"]) + outer_product(s["01"], s["01"])
+            + outer_product(s["11"], s["10"]) + outer_product(s["10"], s["11"]))
+
+
+def test_local_operator_ghz():
+    n = 30
+    state = _hadamard().on(0, n) * BaseQubitState("0" * n).to_state()
+    for i in range(n - 1):
+        state = _cnot().on([i, i + 1], n) * state
+    expected = (BaseQubitState("0" * n).to_state() + BaseQubitState("1" * n).to_state()) * (2 ** -0.5)
+    assert state == expected
+
+
+@pytest.mark.parametrize("targets", [[2], [3, 1], [0, 3]])
+def test_local_operator_expansion(targets):
+    op = _hadamard() if len(targets) == 1 else _cnot()
+    local = LocalOperator(op, targets, num_qudits=4)
+    full = local.to_operator()
+    assert full.shape == local.shape == (16, 16)
+    assert np.allclose(local.to_numpy_matrix(), full.to_numpy_matrix())
+    assert local.to_sparse_matrix(format="coo").format == "coo"
+    for digits in ["0000", "0110", "1011"]:
+        state = BaseQubitState(digits).to_state()
+        assert np.allclose((local * state).to_numpy_vector(), (full * state).to_numpy_vector())
+
+
+def test_local_operator_kronecker():
+    h = np.array([[1, 1], [1, -1]]) / np.sqrt(2)
+    identity = np.eye(2)
+    local = _hadamard().on(1, 3)
+    assert np.allclose(local.to_numpy_matrix(), np.kron(np.kron(identity, h), identity))
+
+
+def test_local_operator_composition():
+    h = _hadamard().on(2, 4)
+    cnot = _cnot().on([3, 1], 4)
+    for composed, expected in [
+        (h * cnot, h.to_operator() * cnot.to_operator()),
+        (cnot * h, cnot.to_operator() * h.to_operator()),
+        (h + cnot, h.to_operator() + cnot.to_operator()),
+        (h @ _cnot().on([0, 1]), h.to_operator() * _cnot().on([0, 1], 4).to_operator()),
+        (cnot.dagger(), cnot.to_operator().dagger()),
+        (h * 2, h.to_operator() * 2),
+        (2 * h, h.to_operator() * 2),
+    ]:
+        assert isinstance(composed, LocalOperator)
+        assert np.allclose(composed.to_numpy_matrix(), expected.to_numpy_matrix())
+    assert (Variable("x") * h).to_operator() == (h * Variable("x")).to_operator()
+    assert (h * h).targets == (2,)
+    assert np.allclose((h * h).to_numpy_matrix(), np.eye(16))
+    assert h + 0 is h
+
+
+def test_local_operator_qutrit():
+    ket = {d: BaseQuditState(d, base=3).to_state() for d in "012"}
+    shift = outer_product(ket["1"], ket["0"]) + outer_product(ket["2"], ket["1"]) + outer_product(ket["0"], ket["2"])
+    state = BaseQuditState("0120", base=3).to_state()
+    assert shift.on(1) * state == BaseQuditState("0220", base=3).to_state()
+    assert shift.on(3, 4) * state == BaseQuditState("0121", base=3).to_state()
+
+
+def test_local_operator_errors():
+    h = _hadamard()
+    with pytest.raises(TypeError):
+        LocalOperator(None, [0])
+    with pytest.raises(ValueError):
+        h.on([0, 0])
+    with pytest.raises(ValueError):
+        h.on([0, 1])
+    with pytest.raises(ValueError):
+        h.on(3, 3)
+    with pytest.raises(ValueError):
+        h.on(0).to_sparse_matrix()
+    with pytest.raises(ValueError):
+        h.on(0).to_operator()
+    with pytest.raises(ValueError):
+        h.on(3) * BaseQubitState("01").to_state()
+    with pytest.raises(ValueError):
+        h.on(0, 3) * BaseQubitState("01").to_state()
+    with pytest.raises(ValueError):
+        h.on(0) * BaseQuditState("01", base=3).to_state()
+    with pytest.raises(TypeError):
+        h.on(0) * BaseFockState([FockOp("c", "w")]).to_state()
+    with pytest.raises(ValueError):
+        h.on(0) @ h.on([0])
+    with pytest.raises(ValueError):
+        h.on(0, 2) * h.on(1, 3)
+    with pytest.raises(TypeError):
+        c = BaseFockState([FockOp("c", "w")]).to_state()
+        outer_product(c, c).on(0)
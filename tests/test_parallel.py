@@ -0,0 +1,58 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import qualg
+from qualg.parallel import get_executor, set_executor, using_executor, map_chunks
+from qualg.scalars import SingleVarFunctionScalar, ProductOfScalars, SumOfScalars
+from qualg.toolbox import replace_var
+
+from builders import fock_operator, fock_state
+
+
+@pytest.fixture(autouse=True)
+def reset_executor():
+    yield
+    set_executor(None)
+
+
+def _sum(items):
+    return sum(items)
+
+
+def test_set_executor():
+    assert qualg.set_executor is set_executor
+    assert get_executor() is None
+    with ThreadPoolExecutor(2) as executor:
+        with using_executor(executor):
+            assert get_executor() is executor
+        assert get_executor() is None
+    with pytest.raises(ValueError):
+        set_executor(None, num_chunks=0)
+
+
+def test_map_chunks():
+    items = list(range(10))
+    assert map_chunks(_sum, items) == [45]
+    with ThreadPoolExecutor(2) as executor:
+        with using_executor(executor, num_chunks=3, min_items=1):
+            assert map_chunks(_sum, items) == [0 + 1 + 2 + 3, 4 + 5 + 6 + 7, 8 + 9]
+        with using_executor(executor, num_chunks=3, min_items=11):
+            assert map_chunks(_sum, items) == [45]
+
+
+@pytest.mark.parametrize("executor_class", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_same_as_serial(executor_class):
+    op = fock_operator(3)
+    other = replace_var(op)
+    state = fock_state(3)
+    expected_product = op * other
+    expected_inner = state.inner_product(state)
+    scalar = SumOfScalars([ProductOfScalars([SingleVarFunctionScalar("f", "x")] * 2)])
+    expected_simplify = (op * scalar).simplify()
+    expected_state_simplify = (state * scalar).simplify()
+    with executor_class(2) as executor:
+        with using_executor(executor, num_chunks=4, min_items=1):
+            assert op * other == expected_product
+            assert state.inner_product(state) == expected_inner
+            assert (op * scalar).simplify() == expected_simplify
+            assert (state * scalar).simplify() == expected_state_simplify
@@ -0,0 +1,87 @@
+from qualg import profiling
+from qualg.profiling import track, expression_size, apply_rule
+from qualg.toolbox import simplify, replace_var
+from qualg.integrate import integrate
+from qualg.scalars import SingleVarFunctionScalar, DeltaFunction, ProductOfScalars
+from qualg.states import State
+from qualg.fock_state import BaseFockState, FockOp
+from qualg.operators import BaseOperator, Operator
+
+
+def test_not_tracking():
+    assert profiling._TRACKER is None
+    simplify(SingleVarFunctionScalar("f", "x") * 2)
+    assert profiling._TRACKER is None
+
+
+def test_nested():
+    with track() as outer:
+        with track() as inner:
+            simplify(2)
+        assert profiling._TRACKER is outer
+        simplify(2)
+    assert profiling._TRACKER is None
+    assert inner.calls["simplify"].calls == 1
+    assert outer.calls["simplify"].calls == 1
+
+
+def test_integrate_rules():
+    f = SingleVarFunctionScalar("f", "x")
+    scalar = ProductOfScalars([f, DeltaFunction("x", "y")])
+    with track() as tracker:
+        assert integrate(scalar, "x") == SingleVarFunctionScalar("f", "y")
+    stats = tracker.calls["integrate"]
+    assert stats.calls == 1
+    assert stats.size_in == 2
+    assert stats.size_out == 1
+    rule = tracker.rules["qualg.integrate._evaluate_delta_function"]
+    assert rule.calls == 1
+    assert rule.fired == 1
+    assert rule.size_in > rule.size_out
+    assert tracker.rules["qualg.integrate._find_norm_identities"].fired == 0
+    assert "qualg.integrate._evaluate_delta_function" in tracker.report()
+
+
+def _identity_rule():
+    def _rule(integral, factors):
+        return integral
+    return _rule
+
+
+def _constant_rule():
+    def _rule(integral, factors):
+        return 1
+    return _rule
+
+
+def test_rules_with_same_name():
+    integral = SingleVarFunctionScalar("f", "x")
+    with track() as tracker:
+        apply_rule(_identity_rule(), integral, {})
+        apply_rule(_constant_rule(), integral, {})
+    assert len(tracker.rules) == 2
+    assert tracker.rules[f"{__name__}._identity_rule.<locals>._rule"].fired == 0
+    assert tracker.rules[f"{__name__}._constant_rule.<locals>._rule"].fired == 1
+
+
+def test_products():
+    base_state = BaseFockState([FockOp("a", "x")])
+    state = State([base_state], [SingleVarFunctionScalar("f", "x")])
+    op = Operator([BaseOperator(base_state, base_state)], [SingleVarFunctionScalar("g", "x")])
+    with track() as tracker:
+        state.inner_product(state)
+        op * replace_var(op)
+    for name in ["State.inner_product", "BaseFockState.inner_product", "Operator._mul_operator"]:
+        assert tracker.calls[name].calls >= 1
+        assert name in tracker.report()
+    assert tracker.calls["Operator._mul_operator"].size_in == 2
+
+
+def test_expression_size():
+    f = SingleVarFunctionScalar("f", "x")
+    assert expression_size(1) == 1
+    assert expression_size(f) == 1
+    assert expression_size(f * DeltaFunction("x", "y") + 2) == 3
+    assert expression_size({"x"}) == 0
+    assert expression_size(State([BaseFockState(), BaseFockState([FockOp("a", "x")])])) == 2
+    assert expression_size(BaseFockState()) == 1
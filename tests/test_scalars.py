@@ -1,7 +1,14 @@
+import pickle
+import random
 import pytest
+from copy import copy
+from collections import Counter
+from itertools import combinations
 
+from qualg.symbols import symbol
 from qualg.toolbox import simplify, replace_var, get_variables, has_variable, is_zero, expand
-from qualg.scalars import SingleVarFunctionScalar, DeltaFunction, SumOfScalars, Variable
+from qualg.scalars import SingleVarFunctionScalar, DeltaFunction, SumOfScalars, Variable, AbsoluteVariable,\
+    InnerProductFunction, ProductOfScalars, Scalar
 
 
 def test_product_of_scalars():
@@ -54,6 +61,74 @@ def test_combine_factors():
     assert prod == 10 * b
 
 
+class _Phase(Scalar):
+    # A scalar which is not atomic and combines with other phases (as for example sympy expressions)
+    __slots__ = ("_angle",)
+
+    def __init__(self, angle):
+        self._angle = angle
+
+    def __copy__(self):
+        return _Phase(self._angle)
+
+    def __str__(self):
+        return f"e^({self._angle}i)"
+
+    def __mul__(self, other):
+        if isinstance(other, _Phase):
+            return _Phase(self._angle + other._angle)
+        return super().__mul__(other)
+
+    def conjugate(self):
+        return _Phase(-self._angle)
+
+    def _key(self):
+        return self._angle
+
+
+def _combine_pairwise(factors):
+    # Combines any two factors whose product is not a product (with more than one factor), as done before
+    # simplifying in a single pass
+    factors = list(factors)
+    changed = True
+    while changed:
+        changed = False
+        for i, j in combinations(range(len(factors)), 2):
+            prod = factors[i] * factors[j]
+            if not isinstance(prod, ProductOfScalars) or len(prod._factors) <= 2:
+                factors[i] = prod
+                factors.pop(j)
+                changed = True
+                break
+    return factors
+
+
+def _coefficient_and_factors(scalar):
+    if isinstance(scalar, ProductOfScalars):
+        return scalar._factors[0], Counter(scalar._factors[1:])
+    return 1, Counter([scalar])
+
+
+def test_combine_any_factors():
+    x = Variable("x")
+    f = SingleVarFunctionScalar("f", "w")
+    pool = [x, x.conjugate(), f, f.conjugate(), _Phase(1), _Phase(-2), _Phase(3)]
+    rng = random.Random(0)
+    for _ in range(100):
+        factors = [rng.choice(pool) for _ in range(rng.randint(2, 8))]
+        expected = _coefficient_and_factors(ProductOfScalars(_combine_pairwise(factors)))
+        assert _coefficient_and_factors(simplify(ProductOfScalars(factors))) == expected
+    assert simplify(_Phase(1) * x * _Phase(2) * x.conjugate()) == _Phase(3) * AbsoluteVariable("x")
+
+
+def test_simplify_order():
+    a = SingleVarFunctionScalar('a', 'x')
+    b = Variable('b')
+    c = SingleVarFunctionScalar('c', 'y')
+    assert simplify(a * b * c)._factors == simplify(c * b * a)._factors
+    assert simplify(a + b + c)._terms == simplify(c + a + b)._terms
+
+
 def test_replace_var_delta():
     d1 = DeltaFunction('x', 'y')
     d1 = replace_var(d1, 'y', 'z')
@@ -128,9 +203,9 @@ def test_sum_vars():
     c = SingleVarFunctionScalar('c', 'y')
 
     sm = a + b + c
-    assert get_variables(sm) == set(['x', 'y'])
+    assert get_variables(sm) == set([symbol('x'), symbol('y')])
     sm = replace_var(sm, 'y', 'x')
-    assert get_variables(sm) == set(['x'])
+    assert get_variables(sm) == set([symbol('x')])
     assert not has_variable(sm, 'y')
 
 
@@ -193,3 +268,112 @@ def test_expand_variable():
     expr = simplify(expr)
     assert len(expr) == 4
     assert isinstance(expr, SumOfScalars)
+
+
+@pytest.mark.parametrize("scalar1, scalar2", [
+    (Variable('a'), Variable('a', False)),
+    (AbsoluteVariable('a'), Variable('a') * Variable('a', True)),
+    (SingleVarFunctionScalar('f', 'x'), SingleVarFunctionScalar('f', 'x', True).conjugate()),
+    (InnerProductFunction('f', 'g'), InnerProductFunction('g', 'f')),
+    (DeltaFunction('x', 'y'), replace_var(DeltaFunction('x', 'z'), 'z', 'y')),
+])
+def test_interned(scalar1, scalar2):
+    assert scalar1 is scalar2
+    assert copy(scalar1) is scalar1
+    assert pickle.loads(pickle.dumps(scalar1)) is scalar1
+
+
+def test_copy_sequenced():
+    a = SingleVarFunctionScalar('a', 'x')
+    b = SingleVarFunctionScalar('b', 'x')
+
+    prod = 2 * a * b
+    prod_copy = copy(prod)
+    assert prod_copy == prod
+    assert prod_copy._factors is not prod._factors
+    assert all(f1 is f2 for f1, f2 in zip(prod_copy, prod))
+
+    sm = 2 + a + b
+    sm_copy = copy(sm)
+    assert sm_copy == sm
+    sm_copy[0] = 3
+    assert sm_copy != sm
+
+
+def test_copy_nested():
+    a = SingleVarFunctionScalar('a', 'x')
+    b = SingleVarFunctionScalar('b', 'y')
+    prod = ProductOfScalars([SumOfScalars([a, b]), a])
+    assert prod.get_variables() == {symbol('x'), symbol('y')}
+    prod_copy = copy(prod)
+    prod_copy[0][0] = Variable('z')
+    assert prod[0][0] is a
+    assert prod.get_variables() == {symbol('x'), symbol('y')}
+    assert prod_copy[1] is a
+
+
+def test_interned_lookup(monkeypatch):
+    f = SingleVarFunctionScalar('f', 'x')
+    calls = []
+    init = SingleVarFunctionScalar.__init__
+    monkeypatch.setattr(SingleVarFunctionScalar, "__init__", lambda *args: calls.append(args) or init(*args))
+    # Existing scalars are looked up before constructing
+    assert SingleVarFunctionScalar('f', 'x') is f
+    assert calls == []
+    # Equal scalars constructed with other arguments are still the same object
+    assert SingleVarFunctionScalar('f', 'x', False) is f
+    assert len(calls) == 1
+    with pytest.raises(TypeError):
+        SingleVarFunctionScalar('f', ['x'])
+
+
+def test_simplify_canonical():
+    a = SingleVarFunctionScalar('a', 'x')
+    b = SingleVarFunctionScalar('b', 'x')
+    c = SingleVarFunctionScalar('c', 'y')
+
+    expr1 = simplify(c * b * a + b * c + 2 * (c * b))
+    expr2 = simplify(3 * (b * c) + a * b * c)
+    assert str(expr1) == str(expr2)
+    assert expr1 == expr2
+
+
+def test_simplify_many_terms():
+    a = Variable('a')
+    terms = [SingleVarFunctionScalar(f"f{i % 100}", "x") * a * a.conjugate() for i in range(1000)]
+    expr = simplify(SumOfScalars(terms))
+    assert isinstance(expr, SumOfScalars)
+    assert len(expr) == 100
+    for term in expr:
+        assert set(term) == set([10, AbsoluteVariable('a'), term[2]])
+
+
+def test_simplify_cancel_terms():
+    a = Variable('a')
+    b = Variable('b')
+    expr = simplify(a * b + 1 + (-1) * b * a)
+    assert expr == 1
+
+
+def test_slots():
+    a = SingleVarFunctionScalar('a', 'x')
+    for scalar in [a, DeltaFunction('x', 'y'), 2 * a, 2 + a]:
+        assert not hasattr(scalar, "__dict__")
+
+
+def test_cached_variables():
+    f = SingleVarFunctionScalar('f', 'x')
+    g = SingleVarFunctionScalar('g', 'y')
+    prod = 2 * f * DeltaFunction('y', 'z')
+    assert prod.get_variables() == {symbol('x'), symbol('y'), symbol('z')}
+    assert prod.get_variables() is prod.get_variables()
+    assert prod.has_variable('z')
+    prod[2] = g
+    assert prod.get_variables() == {symbol('x'), symbol('y')}
+    assert not prod.has_variable('z')
+
+    sm = 1 + prod + f
+    assert sm.get_variables() == {symbol('x'), symbol('y')}
+    sm[2] = SingleVarFunctionScalar('h', 'w')
+    assert sm.get_variables() == {symbol('w'), symbol('x'), symbol('y')}
+    assert copy(sm).get_variables() == {symbol('w'), symbol('x'), symbol('y')}
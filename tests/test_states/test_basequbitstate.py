@@ -1,6 +1,6 @@
 import pytest
 
-from qualg.q_state import BaseQubitState
+from qualg.q_state import BaseQubitState, BaseQuditState
 
 
 @pytest.mark.parametrize("input, error", [
@@ -63,3 +63,15 @@ def test_inner_product(state1, state2, expected, error):
 ])
 def test_compatible(state1, state2, expected):
     assert state1._compatible(state2) == expected
+
+
+@pytest.mark.parametrize("state, index", [
+    (BaseQubitState("0"), 0),
+    (BaseQubitState("0110"), 6),
+    (BaseQuditState("021", base=3), 7),
+])
+def test_from_vector_index(state, index):
+    assert state._vector_index() == index
+    new_state = state._from_vector_index(index)
+    assert new_state == state
+    assert new_state._base == state._base
@@ -0,0 +1,90 @@
+import pickle
+import pytest
+import numpy as np
+
+from qualg.integrate import integrate
+from qualg.profiling import track
+from qualg.scalars import SingleVarFunctionScalar
+from qualg.states import CompositeBaseState, tensor_product_base_states
+from qualg.q_state import BaseQubitState, BaseQuditState
+from qualg.fock_state import FockOp, BaseFockState
+from qualg.operators import outer_product
+
+
+def test_tensor_product():
+    q0 = BaseQubitState("0")
+    fa = BaseFockState([FockOp("a", "w")])
+    fb = BaseFockState([FockOp("b", "v")])
+    composite = q0 @ fa
+    assert isinstance(composite, CompositeBaseState)
+    assert len(composite) == 2
+    assert composite == CompositeBaseState([q0, fa])
+    assert hash(composite) == hash(CompositeBaseState([q0, fa]))
+    # Consecutive factors of the same class are combined
+    assert (composite @ fb) == CompositeBaseState([q0, BaseFockState([FockOp("a", "w"), FockOp("b", "v")])])
+    assert (q0 @ (fa @ BaseQubitState("1"))) == ((q0 @ fa) @ BaseQubitState("1"))
+    assert len(composite @ BaseQubitState("1")) == 3
+    assert tensor_product_base_states(q0, BaseQubitState("1")) == BaseQubitState("01")
+    with pytest.raises(TypeError):
+        CompositeBaseState([q0, "0"])
+
+
+@pytest.mark.parametrize("factors", [
+    [BaseQuditState("0", base=2), BaseQubitState("1")],
+    [BaseQubitState("0"), BaseQuditState("1", base=2)],
+])
+def test_tensor_product_subclass(factors):
+    # A qubit and a qudit (of base 2) are combined in both orders
+    combined = factors[0] @ factors[1]
+    assert type(combined) is BaseQuditState
+    assert combined == BaseQuditState("01", base=2)
+    assert hash(combined) == hash(BaseQuditState("01", base=2))
+    assert combined._orthogonality_key() == "01"
+    composite = CompositeBaseState([BaseFockState(), *factors])
+    assert composite == BaseFockState() @ BaseQuditState("01", base=2)
+    assert hash(composite) == hash(BaseFockState() @ BaseQuditState("01", base=2))
+    # Qudits of different bases are not combined
+    assert isinstance(factors[0] @ BaseQuditState("2", base=3), CompositeBaseState)
+    assert isinstance(BaseQuditState("2", base=3) @ factors[1], CompositeBaseState)
+
+
+def test_inner_product():
+    f = SingleVarFunctionScalar("f", "w")
+    q0 = BaseQubitState("0").to_state()
+    q1 = BaseQubitState("1").to_state()
+    photon = BaseFockState([FockOp("a", "w")]).to_state() * f
+    state = (q0 + q1) @ photon
+    assert len(state) == 2
+    assert integrate(state.inner_product(state)) == 2
+    assert (q0 @ photon).inner_product(q1 @ photon) == 0
+    with pytest.raises(ValueError):
+        (q0 @ photon).inner_product(photon @ q0)
+
+
+def test_orthogonal_factors():
+    # Orthogonal qubit factors are skipped without computing inner products of the photons
+    left = [BaseQubitState(format(i, "03b")) @ BaseFockState([FockOp("a", "w")]) for i in range(8)]
+    right = [BaseQubitState(format(i, "03b")) @ BaseFockState([FockOp("a", "v")]) for i in range(8)]
+    with track() as tracker:
+        for c1 in left:
+            for c2 in right:
+                c1.inner_product(c2)
+    assert tracker.calls["BaseFockState.inner_product"].calls == 8
+
+
+def test_vector_index():
+    composite = BaseQubitState("01") @ BaseQuditState("2", base=3)
+    assert composite.shape == (12,)
+    assert composite._vector_index() == 5
+    assert composite._from_vector_index(5) == composite
+    state = BaseQubitState("1").to_state() @ BaseQuditState("2", base=3).to_state()
+    assert np.allclose(state.to_numpy_vector(), np.eye(6)[5])
+    op = outer_product(state, state)
+    assert op * state == state
+    assert (BaseQubitState("0") @ BaseFockState()).shape is None
+    assert (BaseQubitState("0") @ BaseFockState())._vector_index() is None
+
+
+def test_pickle():
+    composite = BaseQubitState("0") @ BaseFockState([FockOp("a", "w")])
+    assert pickle.loads(pickle.dumps(composite)) == composite
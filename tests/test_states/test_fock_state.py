@@ -1,7 +1,10 @@
 import pytest
+from copy import copy
+from itertools import permutations
 
+from qualg.symbols import symbol
 from qualg.toolbox import simplify
-from qualg.scalars import DeltaFunction
+from qualg.scalars import DeltaFunction, ProductOfScalars
 from qualg.fock_state import FockOp, FockOpProduct, BaseFockState
 
 
@@ -122,11 +125,11 @@ def test_fock_op_product_variables_in_mode():
         FockOp("a", "v"),
         FockOp("b", "x"),
     ])
-    assert set(op.variables_in_mode("a")) == set(["w", "v"])
-    assert set(op.variables_in_mode("b")) == set(["x"])
+    assert set(op.variables_in_mode("a")) == set([symbol("w"), symbol("v")])
+    assert set(op.variables_in_mode("b")) == set([symbol("x")])
 
     output_dict = op.variables_by_modes()
-    expected_dict = {"a": ["w", "v"], "b": ["x"]}
+    expected_dict = {symbol("a"): [symbol("w"), symbol("v")], symbol("b"): [symbol("x")]}
     assert len(output_dict) == len(expected_dict)
     for key in output_dict.keys():
         assert set(output_dict[key]) == set(expected_dict[key])
@@ -144,3 +147,57 @@ def test_fock_state_tensor_product():
     bs2 = BaseFockState(fock_prod2)
 
     assert bs1 @ bs2 == BaseFockState(fock_prod1 * fock_prod2)
+
+
+def _inner_product_from_permutations(l_vars, r_vars):
+    inner = 0
+    for perm_r_vars in permutations(r_vars):
+        term = 1
+        for l_var, r_var in zip(l_vars, perm_r_vars):
+            term *= DeltaFunction(l_var, r_var)
+        inner += term
+    return inner
+
+
+@pytest.mark.parametrize("l_vars, r_vars", [
+    (["x"], ["u"]),
+    (["x", "y", "z"], ["u", "v", "w"]),
+    (["x", "x", "y"], ["u", "v", "v"]),
+    (["x", "x", "x"], ["u", "u", "v"]),
+    (["x", "y", "y", "z"], ["u", "u", "v", "v"]),
+])
+def test_inner_product_repeated_variables(l_vars, r_vars):
+    left = BaseFockState([FockOp("a", v) for v in l_vars])
+    right = BaseFockState([FockOp("a", v) for v in r_vars])
+    expected = simplify(_inner_product_from_permutations(l_vars, r_vars))
+    assert simplify(left.inner_product(right)) == expected
+
+
+def test_inner_product_same_variable_many_photons():
+    left = BaseFockState([FockOp("a", "w")] * 6)
+    right = BaseFockState([FockOp("a", "v")] * 6)
+    inner = left.inner_product(right)
+    # 6! permutations which all give the same term
+    assert inner == ProductOfScalars([720] + [DeltaFunction("w", "v")] * 6)
+
+
+def test_orthogonality_key():
+    bs1 = BaseFockState([FockOp("a", "w"), FockOp("b", "v"), FockOp("a", "u")])
+    bs2 = BaseFockState([FockOp("b", "x"), FockOp("a", "y"), FockOp("a", "y")])
+    bs3 = BaseFockState([FockOp("a", "w"), FockOp("b", "v")])
+    assert bs1._orthogonality_key() == bs2._orthogonality_key()
+    assert bs1._orthogonality_key() != bs3._orthogonality_key()
+    assert bs1.inner_product(bs3) == 0
+
+
+def test_fock_op_product_replace_var_merges():
+    prod = FockOpProduct([FockOp("a", "w"), FockOp("a", "v")])
+    new_prod = prod.replace_var("v", "w")
+    assert new_prod == FockOpProduct([FockOp("a", "w"), FockOp("a", "w")])
+    assert new_prod.variables_in_mode("a") == [symbol("w"), symbol("w")]
+
+
+def test_fock_slots():
+    for obj in [FockOp("a", "w"), FockOpProduct([FockOp("a", "w")]), BaseFockState([FockOp("a", "w")])]:
+        assert not hasattr(obj, "__dict__")
+        assert copy(obj) is obj
@@ -1,10 +1,10 @@
 import pytest
 import numpy as np
 
-from qualg.states import State
+from qualg.states import State, non_orthogonal_pairs
 from qualg.q_state import BaseQubitState
 from qualg.toolbox import simplify
-from qualg.scalars import ProductOfScalars
+from qualg.scalars import ProductOfScalars, SumOfScalars, Variable, AbsoluteVariable
 
 
 @pytest.mark.parametrize("input, scalars, num_terms, error", [
@@ -74,3 +74,32 @@ def test_simplify():
     assert s.get_scalar(bs) != 30
     s = simplify(s)
     assert s.get_scalar(bs) == 30
+
+
+def test_to_vector():
+    s = BaseQubitState("01").to_state() * 1j + BaseQubitState("10").to_state() * 2
+    assert s.shape == (4,)
+    expected = np.array([0, 1j, 2, 0])
+    assert np.all(np.isclose(s.to_numpy_vector(), expected))
+    v = s.to_sparse_vector()
+    assert v.shape == (4, 1)
+    assert v.nnz == 2
+    assert np.all(np.isclose(v.toarray()[:, 0], expected))
+
+
+def test_non_orthogonal_pairs():
+    left = [BaseQubitState("00"), BaseQubitState("01")]
+    right = [BaseQubitState("01"), BaseQubitState("10"), BaseQubitState("00")]
+    pairs = set(non_orthogonal_pairs(left, right))
+    assert pairs == set([(left[0], right[2]), (left[1], right[0])])
+
+
+def test_inner_product_symbolic_many_terms():
+    n = 6
+    base_states = [BaseQubitState(format(i, f"0{n}b")) for i in range(2 ** n)]
+    variables = [Variable(f"a{i}") for i in range(2 ** n)]
+    s = State(base_states, variables)
+    inner = s.inner_product(s)
+    assert isinstance(inner, SumOfScalars)
+    assert set(inner) == set(AbsoluteVariable(f"a{i}") for i in range(2 ** n))
+    assert simplify(s.inner_product(State(base_states[:1], variables[:1]) * 2)) == 2 * AbsoluteVariable("a0")
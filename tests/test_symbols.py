@@ -0,0 +1,40 @@
+import pickle
+
+from qualg.symbols import Symbol, symbol, prime
+from qualg.scalars import DeltaFunction, SingleVarFunctionScalar
+from qualg.fock_state import FockOp
+from qualg.toolbox import replace_var, get_variables
+
+
+def test_symbol():
+    name = "".join(["sym", "bol"])
+    sym = symbol(name)
+    assert isinstance(sym, Symbol)
+    assert isinstance(sym, int)
+    assert sym is symbol("symbol")
+    assert symbol(sym) is sym
+    assert symbol("other symbol") != sym
+    assert str(sym) == "symbol"
+    assert repr(sym) == "'symbol'"
+    assert f"<{sym}>" == "<symbol>"
+    assert pickle.loads(pickle.dumps(sym)) is sym
+
+
+def test_prime():
+    w = symbol("w")
+    assert (w.base, w.generation) == ("w", 0)
+    assert prime("w") is prime(w)
+    assert prime(prime(w)) is symbol("w''")
+    assert (prime(prime(w)).base, prime(prime(w)).generation) == ("w", 2)
+    assert str(prime(prime(w))) == "w''"
+    assert prime("v'") is symbol("v''")
+
+
+def test_shared_names():
+    variable = "".join(["x", "1"])
+    f = SingleVarFunctionScalar("f", variable)
+    fock_op = FockOp("".join(["c"]), "x1")
+    assert f._variable is fock_op._variable
+    assert DeltaFunction("x1", "y")._vars[0] is fock_op._variable
+    assert replace_var(f)._variable is replace_var(fock_op)._variable
+    assert get_variables(replace_var(f)) == {symbol("x1'")}